@@ -2,9 +2,14 @@
 import streamlit as st
 from app.utils.styles import apply_styles  # Estilos CSS
 from app.utils.handlers import validate_user, register_new_user, handle_student, handle_professor  # Importa las funciones desde handlers
+from app.utils.warmup import start_warm_up, WARM_UP_ON_START  # Precarga del modelo y la base de datos
 
 def main():
 
+    # Una vez por proceso: el modelo y las consultas en caché se cargan mientras se muestra la página
+    if WARM_UP_ON_START:
+        start_warm_up()
+
     apply_styles()
 
     st.title("Bienvenido al sistema de Registro de Asistencias")
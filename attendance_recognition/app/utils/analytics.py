@@ -0,0 +1,111 @@
+#analytics.py
+from utils import *
+from database import Session
+from rollup import MARKED_SESSIONS_CTE, DAILY_COUNTS_SELECT, marked_sessions_params, local_today
+
+
+def _execute(select, start_date, end_date, materia_id=None, grupo_id=None):
+    filters, params = marked_sessions_params(start_date, end_date, materia_id, grupo_id)
+    with Session() as session:
+        return session.execute(text(MARKED_SESSIONS_CTE.format(filters=filters) + select), params).fetchall()
+
+def get_student_attendance_stats(start_date, end_date, materia_id=None, grupo_id=None):
+    """Por estudiante y materia: sesiones esperadas, asistencias, faltas, tasa, retardos, minutos de
+    retardo promedio y la racha más larga de faltas consecutivas."""
+    return _execute("""
+        , islas AS (
+            SELECT estudiante_id, materia_id, asistio,
+                   ROW_NUMBER() OVER (PARTITION BY estudiante_id, materia_id ORDER BY fecha)
+                 - ROW_NUMBER() OVER (PARTITION BY estudiante_id, materia_id, asistio ORDER BY fecha) AS isla
+            FROM marcadas
+        ),
+        rachas AS (
+            SELECT estudiante_id, materia_id, MAX(faltas) AS racha_faltas
+            FROM (
+                SELECT estudiante_id, materia_id, isla, COUNT(*) AS faltas
+                FROM islas
+                WHERE asistio = 0
+                GROUP BY estudiante_id, materia_id, isla
+            ) faltas_por_isla
+            GROUP BY estudiante_id, materia_id
+        )
+        SELECT marcadas.estudiante_id, Usuarios.nombre AS estudiante_nombre, marcadas.grupo_id,
+               marcadas.materia_id,
+               COUNT(*) AS esperadas,
+               SUM(marcadas.asistio) AS asistencias,
+               COUNT(*) - SUM(marcadas.asistio) AS faltas,
+               ROUND(100 * SUM(marcadas.asistio) / COUNT(*), 2) AS tasa_asistencia,
+               SUM(marcadas.retardo) AS retardos,
+               ROUND(AVG(CASE WHEN marcadas.asistio = 1 THEN
+                   GREATEST(TIME_TO_SEC(marcadas.hora_registro) - TIME_TO_SEC(marcadas.hora_inicio), 0) END) / 60, 1)
+                   AS minutos_retardo_promedio,
+               COALESCE(MAX(rachas.racha_faltas), 0) AS racha_faltas
+        FROM marcadas
+        JOIN Usuarios ON Usuarios.id = marcadas.estudiante_id
+        LEFT JOIN rachas ON rachas.estudiante_id = marcadas.estudiante_id AND rachas.materia_id = marcadas.materia_id
+        GROUP BY marcadas.estudiante_id, Usuarios.nombre, marcadas.grupo_id, marcadas.materia_id
+        ORDER BY tasa_asistencia, Usuarios.nombre
+    """, start_date, end_date, materia_id, grupo_id)
+
+def get_weekly_attendance_trend(start_date, end_date, materia_id=None, grupo_id=None):
+    """Por semana ISO, grupo y materia: sesiones esperadas, asistencias, tasa y retardos."""
+    return _execute("""
+        SELECT YEARWEEK(fecha, 3) AS semana, MIN(fecha) AS desde, grupo_id, materia_id,
+               COUNT(*) AS esperadas,
+               SUM(asistio) AS asistencias,
+               ROUND(100 * SUM(asistio) / COUNT(*), 2) AS tasa_asistencia,
+               SUM(retardo) AS retardos
+        FROM marcadas
+        GROUP BY YEARWEEK(fecha, 3), grupo_id, materia_id
+        ORDER BY semana, grupo_id, materia_id
+    """, start_date, end_date, materia_id, grupo_id)
+
+def get_group_subject_overview(start_date, end_date, materia_id=None, grupo_id=None):
+    """Por grupo y materia: estudiantes, sesiones esperadas, asistencias, faltas, tasa y retardos."""
+    return _execute("""
+        SELECT marcadas.grupo_id, Grupos.nombre AS grupo_nombre, marcadas.materia_id,
+               Materias.nombre AS materia_nombre,
+               COUNT(DISTINCT marcadas.estudiante_id) AS estudiantes,
+               COUNT(*) AS esperadas,
+               SUM(marcadas.asistio) AS asistencias,
+               COUNT(*) - SUM(marcadas.asistio) AS faltas,
+               ROUND(100 * SUM(marcadas.asistio) / COUNT(*), 2) AS tasa_asistencia,
+               SUM(marcadas.retardo) AS retardos
+        FROM marcadas
+        JOIN Grupos ON Grupos.id = marcadas.grupo_id
+        JOIN Materias ON Materias.id = marcadas.materia_id
+        GROUP BY marcadas.grupo_id, Grupos.nombre, marcadas.materia_id, Materias.nombre
+        ORDER BY Grupos.nombre, Materias.nombre
+    """, start_date, end_date, materia_id, grupo_id)
+
+def get_daily_attendance_totals(start_date, end_date, materia_id, grupo_id=None, today=None):
+    """Por fecha: presentes, retardos, ausentes y esperados de una materia.
+
+    Los días cerrados salen de ResumenAsistenciaDiaria; sólo el día en curso se calcula sobre los
+    registros de Asistencias.
+    """
+    today = today or local_today()
+    group_filter = "AND grupo_id = :grupo_id" if grupo_id is not None else ""
+    with Session() as session:
+        rows = session.execute(
+            text(f"""
+                SELECT fecha, SUM(presentes) AS presentes, SUM(retardos) AS retardos,
+                       SUM(ausentes) AS ausentes, SUM(esperados) AS esperados
+                FROM ResumenAsistenciaDiaria
+                WHERE materia_id = :materia_id AND fecha BETWEEN :start_date AND :end_date
+                  AND fecha < :today {group_filter}
+                GROUP BY fecha
+                ORDER BY fecha
+            """),
+            {'materia_id': materia_id, 'grupo_id': grupo_id, 'start_date': start_date, 'end_date': end_date,
+             'today': today}
+        ).fetchall()
+    if start_date <= today <= end_date:
+        hoy = _execute(f"""
+            SELECT fecha, SUM(presentes) AS presentes, SUM(retardos) AS retardos,
+                   SUM(ausentes) AS ausentes, SUM(esperados) AS esperados
+            FROM ({DAILY_COUNTS_SELECT}) conteos
+            GROUP BY fecha
+        """, today, today, materia_id, grupo_id)
+        rows = list(rows) + list(hoy)
+    return rows
@@ -0,0 +1,128 @@
+#checkin_queue.py
+from utils import *
+import queue
+from sqlalchemy.exc import DBAPIError
+from database import ingest_attendance
+from metrics import timer, increment, observe
+
+# Registros en espera como máximo; con la cola llena submit() rechaza el registro (contrapresión)
+CHECKIN_QUEUE_SIZE = int(os.environ.get("CHECKIN_QUEUE_SIZE", "1000"))
+# Registros por transacción y ventana (segundos) para juntar los que llegan casi al mismo tiempo
+CHECKIN_BATCH_SIZE = int(os.environ.get("CHECKIN_BATCH_SIZE", "200"))
+CHECKIN_BATCH_WINDOW = float(os.environ.get("CHECKIN_BATCH_WINDOW", "0.05"))
+# Reintentos de un lote cuando la base de datos falla, con espera exponencial desde CHECKIN_RETRY_DELAY
+CHECKIN_MAX_RETRIES = int(os.environ.get("CHECKIN_MAX_RETRIES", "5"))
+CHECKIN_RETRY_DELAY = float(os.environ.get("CHECKIN_RETRY_DELAY", "0.5"))
+
+# Estados de un registro
+PENDING, REGISTERED, DUPLICATE, REJECTED, FAILED = "pendiente", "registrada", "duplicada", "rechazada", "error"
+
+
+class CheckInTicket:
+    """Registro de asistencia en la cola; el escritor cambia su estado y avisa cuando termina."""
+
+    def __init__(self, user_id, date, time):
+        self.user_id = user_id
+        self.date = date
+        self.time = time
+        self.status = PENDING
+        self.reason = None
+        self.submitted = time_module.monotonic()
+        self.completed = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Espera a que el registro se confirme; devuelve True si ya terminó."""
+        return self._done.wait(timeout)
+
+    def _finish(self, status, reason=None):
+        self.status = status
+        self.reason = reason
+        self.completed = time_module.monotonic()
+        self._done.set()
+        increment(f"checkin.{status}")
+        observe("checkin.confirm", (self.completed - self.submitted) * 1000)
+
+
+class CheckInWriter:
+    """Escribe en segundo plano los registros de asistencia de la cola, por lotes (ingest_attendance).
+
+    El lote entero es una transacción y la carga masiva deduplica contra Asistencias, así que un lote
+    que falla se puede reintentar completo sin duplicar registros.
+    """
+
+    def __init__(self, ingest=ingest_attendance, maxsize=CHECKIN_QUEUE_SIZE, batch_size=CHECKIN_BATCH_SIZE,
+                 window=CHECKIN_BATCH_WINDOW, max_retries=CHECKIN_MAX_RETRIES, retry_delay=CHECKIN_RETRY_DELAY):
+        self.ingest = ingest
+        self.batch_size = batch_size
+        self.window = window
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(maxsize=maxsize)
+        threading.Thread(target=self._run, name="checkin-writer", daemon=True).start()
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def submit(self, user_id, date, time, timeout=0.2):
+        """Encola un registro y devuelve su ticket, o None si la cola sigue llena después de timeout."""
+        ticket = CheckInTicket(user_id, date, time)
+        try:
+            self.queue.put(ticket, timeout=timeout)
+        except queue.Full:
+            increment("checkin.queue_full")
+            return None
+        return ticket
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time_module.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time_module.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                with timer("checkin.write_batch"):
+                    self._write(batch)
+            except Exception as e:
+                for ticket in batch:
+                    if not ticket.done():
+                        ticket._finish(FAILED, str(e))
+
+    def _write(self, batch):
+        records = [(ticket.user_id, None, ticket.date, ticket.time) for ticket in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = self.ingest(records)
+                break
+            except DBAPIError:
+                if attempt == self.max_retries:
+                    raise
+                increment("checkin.retries")
+                time_module.sleep(self.retry_delay * 2 ** attempt)
+
+        rejected = dict(result.rejected)
+        inserted = set(result.inserted)
+        for position, ticket in enumerate(batch):
+            if position in rejected:
+                ticket._finish(REJECTED, rejected[position])
+            elif position in inserted:
+                ticket._finish(REGISTERED)
+            else:
+                ticket._finish(DUPLICATE)
+
+
+# Escritor compartido por todas las sesiones del proceso
+checkin_writer = CheckInWriter()
@@ -1,11 +1,31 @@
 # database.py
 from utils import *
+from schedule_index import ScheduleIndex, to_seconds
+from rollup import LATE_TOLERANCE_MINUTES, rollup_upsert_sql
+from metrics import timer, timed, increment
 
 # Configuración de la URL de conexión
-DATABASE_URL = "mysql+pymysql://"
+DATABASE_URL = os.environ.get("DATABASE_URL", "mysql+pymysql://")
 
-# Crear el motor de conexión
-engine = create_engine(DATABASE_URL)
+# Tamaño del pool de conexiones por proceso; en un cambio de clase cientos de registros llegan en minutos
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    """Motor de conexión del proceso, compartido por todas las sesiones de Streamlit: las conexiones se
+    reutilizan, se validan antes de usarse (pre-ping) y se renuevan antes del wait_timeout de MySQL."""
+    return create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_timeout=10,
+    )
+
+engine = get_engine()
 
 # Crear la clase de sesión
 Session = sessionmaker(bind=engine)
@@ -14,6 +34,94 @@ Session = sessionmaker(bind=engine)
 def get_session():
     return Session()
 
+def _insert_ignore():
+    """INSERT que omite filas duplicadas según la restricción única, en el dialecto del motor."""
+    return "INSERT OR IGNORE" if engine.dialect.name == "sqlite" else "INSERT IGNORE"
+
+
+# Caché en proceso para horarios, calendario, grupos y materias: estos datos cambian pocas veces por
+# semestre, así que se comparten entre todas las sesiones de Streamlit del proceso.
+SCHEDULE_CACHE_TTL = int(os.environ.get("SCHEDULE_CACHE_TTL", "600"))
+SCHEDULE_CACHE_SIZE = int(os.environ.get("SCHEDULE_CACHE_SIZE", "2048"))
+# Archivo cuya fecha de modificación invalida la caché en todos los procesos (scripts/invalidate_cache.py)
+SCHEDULE_CACHE_STAMP = os.environ.get("SCHEDULE_CACHE_STAMP", "schedule_cache.stamp")
+
+class TTLCache:
+    """Caché en memoria con expiración por TTL y desalojo LRU al superar maxsize."""
+
+    def __init__(self, ttl, maxsize, stamp_path=None, stamp_check_interval=5.0):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stamp_path = stamp_path
+        self.stamp_check_interval = stamp_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+        self._last_stamp_check = time_module.monotonic()
+
+    def _read_stamp(self):
+        try:
+            return os.stat(self.stamp_path).st_mtime if self.stamp_path else None
+        except OSError:
+            return None
+
+    def _check_stamp(self, now):
+        # Se revisa la marca de invalidación como máximo cada stamp_check_interval segundos
+        if not self.stamp_path or now - self._last_stamp_check < self.stamp_check_interval:
+            return
+        self._last_stamp_check = now
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._entries.clear()
+
+    def get(self, key):
+        """Devuelve (encontrado, valor)."""
+        now = time_module.monotonic()
+        with self._lock:
+            self._check_stamp(now)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                self._entries.pop(key, None)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time_module.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+schedule_cache = TTLCache(SCHEDULE_CACHE_TTL, SCHEDULE_CACHE_SIZE, stamp_path=SCHEDULE_CACHE_STAMP)
+
+def cached_query(func):
+    """Guarda en schedule_cache el resultado de la consulta según sus argumentos."""
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__name__,) + args
+        found, value = schedule_cache.get(key)
+        if not found:
+            increment("cache.miss")
+            with timer(f"db.{func.__name__}"):
+                value = func(*args)
+            schedule_cache.set(key, value)
+        else:
+            increment("cache.hit")
+        return value
+    return wrapper
+
+def invalidate_schedule_cache():
+    """Vacía la caché de horarios de este proceso y marca la invalidación para los demás procesos."""
+    schedule_cache.clear()
+    with open(SCHEDULE_CACHE_STAMP, 'a'):
+        os.utime(SCHEDULE_CACHE_STAMP)
+
 def get_user_info(name, email):
     """Consulta a la base de datos para obtener el ID y el rol del usuario por nombre y correo."""
     with Session() as session:
@@ -52,21 +160,25 @@ def check_group_exists(group_name):
 def insert_group(group_name):
     """Inserta un nuevo grupo en la base de datos si no existe."""
     with Session() as session:
-        session.execute(
+        result = session.execute(
             text("INSERT INTO Grupos (nombre) VALUES (:group_name)"),
             {'group_name': group_name}
         )
+        # El ID se toma del mismo INSERT: tras el commit la sesión puede recibir otra conexión del pool
+        group_id = result.lastrowid
         session.commit()
-        return session.execute(text("SELECT LAST_INSERT_ID()")).fetchone()[0]
+    invalidate_schedule_cache()
+    return group_id
 
-def insert_student(user_id, matricula, group_name):
+def insert_student(user_id, matricula, group_id):
     """Inserta los datos del estudiante en la base de datos."""
     with Session() as session:
         session.execute(
-            text("INSERT INTO Estudiantes (id_usuario, matricula, grupo_id) VALUES (:user_id, :matricula, :group_name)"),
-            {'user_id': user_id, 'matricula': matricula, 'group_name': group_name}
+            text("INSERT INTO Estudiantes (id_usuario, matricula, grupo_id) VALUES (:user_id, :matricula, :group_id)"),
+            {'user_id': user_id, 'matricula': matricula, 'group_id': group_id}
         )
         session.commit()
+    invalidate_schedule_cache()
 
 def save_photos(student_id, img_data1, img_data2, img_data3):
     """Guarda las fotografías del estudiante en la base de datos."""
@@ -77,13 +189,52 @@ def save_photos(student_id, img_data1, img_data2, img_data3):
         )
         session.commit()
 
-def get_day_of_week(date):
-    """Obtiene el día de la semana a partir de la fecha."""
+def save_photo_refs(student_id, photos):
+    """Guarda las referencias (hash, tamaño, tipo) de las fotografías del estudiante."""
     with Session() as session:
-        return session.execute(
-            text("SELECT dia FROM FechaDias WHERE fecha = :date"),
-            {'date': date}
-        ).fetchone()
+        session.execute(
+            text(f"""
+                {_insert_ignore()} INTO FotografiasObjetos (estudiante_id, hash, tamano, tipo)
+                VALUES (:student_id, :hash, :size, :mime)
+            """),
+            [{'student_id': student_id, 'hash': digest, 'size': size, 'mime': mime} for digest, size, mime in photos]
+        )
+        session.commit()
+
+DiaSemana = namedtuple('DiaSemana', ['dia'])
+
+# Nombres de los días (lunes = 0) si FechaDias todavía no tiene registros
+DEFAULT_DAY_NAMES = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+@cached_query
+def get_calendar():
+    """Obtiene el calendario de FechaDias como diccionario fecha (YYYY-MM-DD) -> día."""
+    with Session() as session:
+        rows = session.execute(text("SELECT fecha, dia FROM FechaDias")).fetchall()
+    return {str(row.fecha): row.dia for row in rows}
+
+@cached_query
+def get_day_names():
+    """Nombre usado en FechaDias para cada día natural de la semana (el más frecuente por día)."""
+    votes = {}
+    for date, dia in get_calendar().items():
+        weekday = datetime.strptime(date, '%Y-%m-%d').weekday()
+        votes.setdefault(weekday, {}).setdefault(dia, 0)
+        votes[weekday][dia] += 1
+    return [max(votes[d], key=votes[d].get) if d in votes else DEFAULT_DAY_NAMES[d] for d in range(7)]
+
+@timed("db.get_day_of_week")
+def get_day_of_week(date):
+    """Obtiene el día de la semana a partir de la fecha.
+
+    Las excepciones registradas en FechaDias (días que se recorren) tienen prioridad; si la fecha no
+    aparece, el día se calcula localmente sin consultar la base de datos.
+    """
+    date = str(date)
+    dia = get_calendar().get(date)
+    if dia is None:
+        dia = get_day_names()[datetime.strptime(date, '%Y-%m-%d').weekday()]
+    return DiaSemana(dia)
 
 def get_user_id_by_name(name):
     """Obtiene el ID del usuario basado en su nombre."""
@@ -101,6 +252,7 @@ def get_student_group(user_id):
             {'user_id': user_id}
         ).fetchone()
 
+@cached_query
 def get_group_id_by_name(group_name):
     """Obtiene el ID del grupo basado en el nombre del grupo."""
     with Session() as session:
@@ -109,6 +261,7 @@ def get_group_id_by_name(group_name):
             {'grupo_nombre': group_name}
         ).fetchone()
 
+@cached_query
 def get_schedule_for_day(group_id, day_of_week):
     """Obtiene los horarios de clase para un grupo en un día específico."""
     with Session() as session:
@@ -122,6 +275,72 @@ def get_schedule_for_day(group_id, day_of_week):
             {'grupo_id': group_id, 'day': day_of_week}
         ).fetchall()
 
+# Tolerancias (minutos) para registrar asistencia antes del inicio y después del fin de la clase
+CHECKIN_EARLY_GRACE = int(os.environ.get("CHECKIN_EARLY_GRACE", "0"))
+CHECKIN_LATE_GRACE = int(os.environ.get("CHECKIN_LATE_GRACE", "0"))
+
+@cached_query
+def get_all_schedules():
+    """Obtiene todos los horarios con el nombre de su materia."""
+    with Session() as session:
+        return session.execute(
+            text("""
+                SELECT Horarios.grupo_id, Horarios.dia, Horarios.materia_id, Materias.nombre AS materia_nombre,
+                       Horarios.hora_inicio, Horarios.hora_fin
+                FROM Horarios
+                JOIN Materias ON Horarios.materia_id = Materias.id
+            """)
+        ).fetchall()
+
+@cached_query
+def get_schedule_index():
+    """Índice de intervalos de todos los horarios (se reconstruye cuando expira la caché)."""
+    return ScheduleIndex(get_all_schedules(), CHECKIN_EARLY_GRACE * 60, CHECKIN_LATE_GRACE * 60)
+
+@cached_query
+def get_students_by_group():
+    """Obtiene los estudiantes de cada grupo como diccionario grupo_id -> conjunto de IDs de usuario."""
+    with Session() as session:
+        rows = session.execute(text("SELECT grupo_id, id_usuario FROM Estudiantes")).fetchall()
+    students = {}
+    for row in rows:
+        students.setdefault(row.grupo_id, set()).add(row.id_usuario)
+    return students
+
+@cached_query
+def get_student_directory():
+    """Nombre y grupo de cada estudiante como diccionario id_usuario -> (nombre, grupo_id, grupo_nombre)."""
+    with Session() as session:
+        rows = session.execute(
+            text("""
+                SELECT Estudiantes.id_usuario AS user_id, Usuarios.nombre, Estudiantes.grupo_id,
+                       Grupos.nombre AS grupo_nombre
+                FROM Estudiantes
+                JOIN Usuarios ON Usuarios.id = Estudiantes.id_usuario
+                JOIN Grupos ON Grupos.id = Estudiantes.grupo_id
+            """)
+        ).fetchall()
+    return {row.user_id: row for row in rows}
+
+@timed("db.get_students_in_session")
+def get_students_in_session(day_of_week, current_time):
+    """Obtiene los IDs de usuario de los estudiantes cuyos grupos tienen clase en el día y la hora indicados."""
+    students = get_students_by_group()
+    user_ids = set()
+    for group_id in get_schedule_index().groups_in_session(day_of_week, current_time):
+        user_ids |= students.get(group_id, set())
+    return user_ids
+
+def warm_up_database():
+    """Abre una conexión del pool y carga las consultas en caché que usa el registro de asistencia."""
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    get_calendar()
+    get_schedule_index()
+    get_students_by_group()
+    get_student_directory()
+
+@timed("db.check_attendance_exists")
 def check_attendance_exists(student_id, materia_id, date):
     """Verifica si ya existe un registro de asistencia para un estudiante en una materia en una fecha específica."""
     with Session() as session:
@@ -133,18 +352,202 @@ def check_attendance_exists(student_id, materia_id, date):
             {'estudiante_id': student_id, 'materia_id': materia_id, 'fecha': date}
         ).fetchone()
 
-def register_attendance(student_id, materia_id, date, time):
-    """Registra la asistencia de un estudiante en una materia."""
+def _update_daily_rollup(session, grupo_id, materia_id, date, presentes=1, retardos=0):
+    """Suma registros nuevos al resumen diario (ResumenAsistenciaDiaria) dentro de la misma transacción."""
+    session.execute(
+        text(rollup_upsert_sql(engine.dialect.name)),
+        {'grupo_id': grupo_id, 'materia_id': materia_id, 'fecha': date, 'presentes': presentes,
+         'retardos': retardos}
+    )
+
+@timed("db.register_attendance")
+def register_attendance(student_id, materia_id, date, time, late=False):
+    """Registra la asistencia de un estudiante en una materia; devuelve False si ya estaba registrada."""
     with Session() as session:
-        session.execute(
-            text("""
-                INSERT INTO Asistencias (estudiante_id, materia_id, fecha, hora_registro, estado)
+        result = session.execute(
+            text(f"""
+                {_insert_ignore()} INTO Asistencias (estudiante_id, materia_id, fecha, hora_registro, estado)
                 VALUES (:estudiante_id, :materia_id, :fecha, :hora_registro, 'Presente')
             """),
             {'estudiante_id': student_id, 'materia_id': materia_id, 'fecha': date, 'hora_registro': time}
         )
+        if result.rowcount == 1:
+            group = session.execute(
+                text("SELECT grupo_id FROM Estudiantes WHERE id_usuario = :estudiante_id"),
+                {'estudiante_id': student_id}
+            ).fetchone()
+            if group is not None:
+                _update_daily_rollup(session, group.grupo_id, materia_id, date, 1, 1 if late else 0)
+        session.commit()
+        return result.rowcount == 1
+
+@timed("db.check_in")
+def check_in(user_id, day_of_week, date, time):
+    """Registra la asistencia de un estudiante reconocido en una sola sesión.
+
+    Una consulta por clave primaria resuelve estudiante -> grupo, la clase en curso sale del índice de horarios en memoria y
+    un INSERT IGNORE sobre la restricción única (estudiante_id, materia_id, fecha) de Asistencias evita
+    duplicados de forma atómica; si el registro es nuevo se suma al resumen diario en la misma
+    transacción. Devuelve (estudiante, clase, registrada): estudiante es None si no
+    existe y clase es None si su grupo no tiene clase en este momento.
+
+    La app registra por la cola (checkin_queue); esta ruta síncrona se conserva como referencia para
+    scripts/load_test_checkin.py --sync y scripts/bench_suite.py.
+    """
+    with Session() as session:
+        student = session.execute(
+            text("""
+                SELECT Usuarios.id AS user_id, Usuarios.nombre, Grupos.id AS grupo_id, Grupos.nombre AS grupo_nombre
+                FROM Estudiantes
+                JOIN Usuarios ON Usuarios.id = Estudiantes.id_usuario
+                JOIN Grupos ON Grupos.id = Estudiantes.grupo_id
+                WHERE Estudiantes.id_usuario = :user_id
+            """),
+            {'user_id': user_id}
+        ).fetchone()
+        if student is None:
+            return None, None, False
+        current_class = get_schedule_index().current_class(student.grupo_id, day_of_week, time)
+        if current_class is None:
+            return student, None, False
+
+        result = session.execute(
+            text(f"""
+                {_insert_ignore()} INTO Asistencias (estudiante_id, materia_id, fecha, hora_registro, estado)
+                VALUES (:estudiante_id, :materia_id, :fecha, :hora_registro, 'Presente')
+            """),
+            {'estudiante_id': student.user_id, 'materia_id': current_class.materia_id,
+             'fecha': date, 'hora_registro': time}
+        )
+        if result.rowcount == 1:
+            late = to_seconds(time) > current_class.inicio + LATE_TOLERANCE_MINUTES * 60
+            _update_daily_rollup(session, student.grupo_id, current_class.materia_id, date, 1, 1 if late else 0)
+        session.commit()
+        return student, current_class, result.rowcount == 1
+
+# Resultado de una carga masiva: filas insertadas, duplicadas (en el lote o ya registradas), rechazadas
+# como lista de (posición, motivo) y posiciones de las filas que se insertaron
+IngestResult = namedtuple('IngestResult', ['accepted', 'duplicates', 'rejected', 'inserted'])
+
+# Filas por sentencia en las consultas IN y en los INSERT de varias filas
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "1000"))
+
+def _chunks(items, size=INGEST_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+@timed("db.ingest_attendance")
+def ingest_attendance(records, classes=None):
+    """Registra en bloque asistencias (estudiante_id, materia_id, fecha, hora) en una sola transacción.
+
+    Cada fila se valida contra el índice de horarios (el grupo del estudiante debe tener clase a esa
+    hora; si materia_id viene vacío se toma de la clase en curso), se deduplica dentro del lote y
+    contra Asistencias con una consulta por bloque, y se inserta con INSERT de varias filas. Si se
+    indica classes (pares (materia_id, grupo_id)), sólo se aceptan esas clases: una misma materia puede
+    impartirse a otros grupos con otro profesor.
+    """
+    rejected, parsed = [], []
+    for position, record in enumerate(records):
+        try:
+            student_id, materia_id, date, hora = record
+            student_id = int(student_id)
+            materia_id = int(materia_id) if materia_id not in (None, '') else None
+            date = datetime.strptime(str(date).strip()[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+            seconds = to_seconds(str(hora).strip())
+        except (TypeError, ValueError, IndexError):
+            rejected.append((position, "formato inválido"))
+            continue
+        hora = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+        parsed.append((position, student_id, materia_id, date, hora, seconds))
+
+    with Session() as session:
+        groups = {}
+        student_ids = sorted({row[1] for row in parsed})
+        for ids in _chunks(student_ids):
+            groups.update(session.execute(
+                text("SELECT id_usuario, grupo_id FROM Estudiantes WHERE id_usuario IN :ids").bindparams(bindparam('ids', expanding=True)),
+                {'ids': ids}
+            ).fetchall())
+
+        schedule_index, days = get_schedule_index(), {}
+        pending, duplicates = {}, 0
+        for position, student_id, materia_id, date, hora, seconds in parsed:
+            grupo_id = groups.get(student_id)
+            if grupo_id is None:
+                rejected.append((position, "estudiante desconocido"))
+                continue
+            if date not in days:
+                days[date] = get_day_of_week(date).dia
+            current_class = schedule_index.current_class(grupo_id, days[date], hora)
+            if current_class is None or materia_id not in (None, current_class.materia_id):
+                rejected.append((position, "fuera de horario"))
+                continue
+            if classes is not None and (current_class.materia_id, grupo_id) not in classes:
+                rejected.append((position, "clase no permitida"))
+                continue
+            key = (student_id, current_class.materia_id, date)
+            if key in pending:
+                duplicates += 1
+                continue
+            late = seconds > current_class.inicio + LATE_TOLERANCE_MINUTES * 60
+            pending[key] = (grupo_id, hora, late, position)
+
+        # Registros ya existentes: una consulta por bloque de estudiantes dentro del rango de fechas
+        if pending:
+            dates = [key[2] for key in pending]
+            for ids in _chunks(sorted({key[0] for key in pending})):
+                existing = session.execute(
+                    text("""
+                        SELECT estudiante_id, materia_id, fecha FROM Asistencias
+                        WHERE estudiante_id IN :ids AND fecha BETWEEN :start_date AND :end_date
+                    """).bindparams(bindparam('ids', expanding=True)),
+                    {'ids': ids, 'start_date': min(dates), 'end_date': max(dates)}
+                ).fetchall()
+                for row in existing:
+                    if pending.pop((row.estudiante_id, row.materia_id, str(row.fecha)), None) is not None:
+                        duplicates += 1
+
+        # INSERT IGNORE por si otro proceso registró la misma fila entre la consulta y la inserción. Cada
+        # bloque se inserta con una sola sentencia dentro de un punto de guardado; si el conteo indica que
+        # alguna fila se omitió, el bloque se deshace y se repite fila por fila para saber cuáles entraron
+        insert = text(f"""
+            {_insert_ignore()} INTO Asistencias (estudiante_id, materia_id, fecha, hora_registro, estado)
+            VALUES (:estudiante_id, :materia_id, :fecha, :hora_registro, 'Presente')
+        """)
+        inserted = []
+        for keys in _chunks(list(pending)):
+            rows = [{'estudiante_id': student_id, 'materia_id': materia_id, 'fecha': date,
+                     'hora_registro': pending[(student_id, materia_id, date)][1]}
+                    for student_id, materia_id, date in keys]
+            savepoint = session.begin_nested()
+            if session.execute(insert, rows).rowcount == len(rows):
+                savepoint.commit()
+                inserted += keys
+                continue
+            savepoint.rollback()
+            increment("ingest.race_retries")
+            inserted += [key for key, row in zip(keys, rows) if session.execute(insert, row).rowcount == 1]
+        accepted = len(inserted)
+        duplicates += len(pending) - accepted
+
+        # El resumen diario sólo suma las filas que realmente se insertaron
+        rollup = {}
+        for student_id, materia_id, date in inserted:
+            grupo_id, _, late, _ = pending[(student_id, materia_id, date)]
+            counts = rollup.setdefault((grupo_id, materia_id, date), [0, 0])
+            counts[0] += 1
+            counts[1] += 1 if late else 0
+        if rollup:
+            session.execute(
+                text(rollup_upsert_sql(engine.dialect.name)),
+                [{'grupo_id': grupo_id, 'materia_id': materia_id, 'fecha': date, 'presentes': presentes,
+                  'retardos': retardos}
+                 for (grupo_id, materia_id, date), (presentes, retardos) in rollup.items()]
+            )
         session.commit()
+    return IngestResult(accepted, duplicates, sorted(rejected), sorted(pending[key][3] for key in inserted))
 
+@cached_query
 def get_classes_by_professor(professor_id):
     """Obtiene las clases y grupos que un profesor enseña."""
     with Session() as session:
@@ -191,3 +594,60 @@ def get_attendance_by_date(professor_id, materia_id, date):
             'date': date,
             'materia_id': materia_id
         }).fetchall()
+
+
+# Reportes de asistencia por rango de fechas: la lista se lee por páginas o en flujo con un cursor del
+# lado del servidor y las métricas se calculan en SQL, así que la memoria no depende del tamaño del rango.
+# Una materia puede impartirse a varios grupos: con grupo_id sólo se incluyen los estudiantes de ese grupo.
+ATTENDANCE_REPORT_QUERY = """
+    SELECT Asistencias.id, Usuarios.nombre AS estudiante_nombre, Asistencias.fecha, Asistencias.hora_registro, Asistencias.estado
+    FROM Asistencias
+    JOIN Estudiantes ON Asistencias.estudiante_id = Estudiantes.id_usuario
+    JOIN Usuarios ON Estudiantes.id_usuario = Usuarios.id
+    WHERE Asistencias.fecha BETWEEN :start_date AND :end_date
+      AND Asistencias.materia_id = :materia_id
+      {group_filter}
+    ORDER BY Asistencias.fecha, Asistencias.id
+"""
+
+def _group_filter(grupo_id):
+    """Condición adicional de los reportes cuando se limitan a un grupo."""
+    return "AND Estudiantes.grupo_id = :grupo_id" if grupo_id is not None else ""
+
+def get_attendance_page(materia_id, start_date, end_date, page, page_size=50, grupo_id=None):
+    """Obtiene una página (desde 0) de la lista de asistencias de una materia (y grupo) en un rango de fechas."""
+    with Session() as session:
+        return session.execute(
+            text(ATTENDANCE_REPORT_QUERY.format(group_filter=_group_filter(grupo_id)) + " LIMIT :limit OFFSET :offset"),
+            {'materia_id': materia_id, 'grupo_id': grupo_id, 'start_date': start_date, 'end_date': end_date,
+             'limit': page_size, 'offset': page * page_size}
+        ).fetchall()
+
+def iter_attendance_by_date_range(materia_id, start_date, end_date, chunk_size=1000, grupo_id=None):
+    """Recorre la lista de asistencias en bloques de chunk_size filas con un cursor del lado del servidor."""
+    with Session() as session:
+        result = session.execute(
+            text(ATTENDANCE_REPORT_QUERY.format(group_filter=_group_filter(grupo_id)))
+            .execution_options(stream_results=True, yield_per=chunk_size),
+            {'materia_id': materia_id, 'grupo_id': grupo_id, 'start_date': start_date, 'end_date': end_date}
+        )
+        for chunk in result.partitions(chunk_size):
+            yield chunk
+
+def get_attendance_summary(materia_id, start_date, end_date, grupo_id=None):
+    """Calcula en SQL las métricas de asistencia de una materia (y grupo) en un rango de fechas."""
+    with Session() as session:
+        return session.execute(
+            text(f"""
+                SELECT COUNT(*) AS total,
+                       COALESCE(SUM(CASE WHEN Asistencias.estado = 'Presente' THEN 1 ELSE 0 END), 0) AS presentes,
+                       COUNT(DISTINCT Asistencias.estudiante_id) AS estudiantes,
+                       COUNT(DISTINCT Asistencias.fecha) AS dias
+                FROM Asistencias
+                JOIN Estudiantes ON Asistencias.estudiante_id = Estudiantes.id_usuario
+                WHERE Asistencias.fecha BETWEEN :start_date AND :end_date
+                  AND Asistencias.materia_id = :materia_id
+                  {_group_filter(grupo_id)}
+            """),
+            {'materia_id': materia_id, 'grupo_id': grupo_id, 'start_date': start_date, 'end_date': end_date}
+        ).fetchone()
@@ -0,0 +1,112 @@
+#detection.py
+import os
+
+import numpy as np
+from PIL import Image
+
+from lazy_imports import LazyImport
+from metrics import timed
+
+# dlib se carga en la primera detección
+face_recognition = LazyImport('face_recognition')
+
+# Configuración del detector por despliegue (variables de entorno)
+DETECTION_MODEL = os.environ.get('DETECTION_MODEL', 'hog')
+DETECTION_UPSAMPLE = int(os.environ.get('DETECTION_UPSAMPLE', '1'))
+DETECTION_MAX_SIDE = int(os.environ.get('DETECTION_MAX_SIDE', '640'))
+DETECTION_LARGEST_ONLY = os.environ.get('DETECTION_LARGEST_ONLY', '0') == '1'
+
+# Margen alrededor de la cara al recortar antes de codificar (fracción del tamaño de la caja)
+CROP_MARGIN = 0.25
+
+
+class FaceDetector:
+    """Detección de caras sobre una copia reducida del cuadro, con las cajas en coordenadas del original.
+
+    El costo de HOG crece con el número de píxeles, así que se detecta con el lado mayor limitado a
+    max_side (0 = sin reducir) y la codificación se hace sobre la imagen original. Con largest_only sólo
+    se conserva la cara más grande y se codifica sobre un recorte a su alrededor.
+    """
+
+    def __init__(self, model=DETECTION_MODEL, upsample=DETECTION_UPSAMPLE, max_side=DETECTION_MAX_SIDE,
+                 largest_only=DETECTION_LARGEST_ONLY):
+        self.model = model
+        self.upsample = upsample
+        self.max_side = max_side
+        self.largest_only = largest_only
+
+    @property
+    def settings(self):
+        """Cadena que identifica la configuración (se usa como parte de la clave de caché)."""
+        return f"{self.model}:{self.upsample}:{self.max_side}:{int(self.largest_only)}"
+
+    def _downscale(self, image_array):
+        height, width = image_array.shape[:2]
+        longest = max(height, width)
+        if not self.max_side or longest <= self.max_side:
+            return image_array, 1.0
+        scale = self.max_side / longest
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return np.asarray(Image.fromarray(image_array).resize(size, Image.BILINEAR)), scale
+
+    def _to_original(self, locations, scale, shape):
+        height, width = shape[:2]
+        boxes = []
+        for top, right, bottom, left in locations:
+            boxes.append((
+                max(0, int(round(top / scale))),
+                min(width, int(round(right / scale))),
+                min(height, int(round(bottom / scale))),
+                max(0, int(round(left / scale))),
+            ))
+        if self.largest_only and boxes:
+            boxes = [max(boxes, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))]
+        return boxes
+
+    @timed("detection.locate")
+    def locate(self, image_array):
+        """Ubicaciones (top, right, bottom, left) de las caras en coordenadas del cuadro original."""
+        small, scale = self._downscale(image_array)
+        locations = face_recognition.face_locations(small, number_of_times_to_upsample=self.upsample,
+                                                    model=self.model)
+        return self._to_original(locations, scale, image_array.shape)
+
+    @timed("detection.locate_batch")
+    def locate_batch(self, image_arrays, batch_size=32):
+        """Como locate para varios cuadros; con CNN y cuadros del mismo tamaño la detección va por lotes."""
+        reduced = [self._downscale(array) for array in image_arrays]
+        if self.model == "cnn" and len({small.shape for small, _ in reduced}) == 1:
+            all_locations = face_recognition.batch_face_locations(
+                [small for small, _ in reduced], number_of_times_to_upsample=self.upsample, batch_size=batch_size)
+        else:
+            all_locations = [face_recognition.face_locations(small, number_of_times_to_upsample=self.upsample,
+                                                             model=self.model)
+                             for small, _ in reduced]
+        return [self._to_original(locations, scale, array.shape)
+                for array, (_, scale), locations in zip(image_arrays, reduced, all_locations)]
+
+    @timed("detection.encode")
+    def encode(self, image_array, locations):
+        """Codificaciones de las caras indicadas; con largest_only se codifica sobre un recorte."""
+        if not locations:
+            return []
+        if not self.largest_only:
+            return face_recognition.face_encodings(image_array, locations)
+
+        top, right, bottom, left = locations[0]
+        margin_y, margin_x = int((bottom - top) * CROP_MARGIN), int((right - left) * CROP_MARGIN)
+        y0, x0 = max(0, top - margin_y), max(0, left - margin_x)
+        y1, x1 = min(image_array.shape[0], bottom + margin_y), min(image_array.shape[1], right + margin_x)
+        crop = np.ascontiguousarray(image_array[y0:y1, x0:x1])
+        return face_recognition.face_encodings(crop, [(top - y0, right - x0, bottom - y0, left - x0)])
+
+    def detect_and_encode(self, image_array):
+        """Devuelve (ubicaciones, codificaciones) de las caras de un cuadro."""
+        locations = self.locate(image_array)
+        return locations, self.encode(image_array, locations)
+
+    def detect_and_encode_batch(self, image_arrays, batch_size=32):
+        """Devuelve (ubicaciones, codificaciones) por cuadro."""
+        all_locations = self.locate_batch(image_arrays, batch_size)
+        return [(locations, self.encode(array, locations))
+                for array, locations in zip(image_arrays, all_locations)]
@@ -0,0 +1,366 @@
+#embedding_index.py
+import numpy as np
+
+# Dimensión de las codificaciones que genera face_recognition (dlib)
+EMBEDDING_DIM = 128
+
+# Umbral máximo de distancia para aceptar una coincidencia (el de face_recognition)
+DEFAULT_TOLERANCE = 0.6
+# Umbral por identidad: 2 x radio medio de sus muestras alrededor del centroide + margen, sin bajar
+# de MIN_TOLERANCE; las identidades con una sola muestra usan el umbral máximo
+MIN_TOLERANCE = 0.45
+THRESHOLD_MARGIN = 0.15
+# Identidades más cercanas por centroide que se comparan contra todas sus muestras
+SHORTLIST_SIZE = 8
+# Representaciones de la matriz en memoria: float32, float16 o int8 (cuantización escalar simétrica por
+# dimensión). Con float16/int8 y una matriz exacta (el .emb mapeado en memoria) los RERANK_SIZE mejores
+# candidatos se recalculan con las codificaciones exactas
+INDEX_DTYPES = ('float32', 'float16', 'int8')
+RERANK_SIZE = 4
+# Filas por bloque al convertir a float32 una matriz cuantizada
+SCAN_CHUNK_ROWS = 8192
+
+
+class IdentityTable:
+    """Etiquetas distintas de un índice y el código int32 de cada fila, con las filas agrupadas por código.
+
+    Con IDs de usuario enteros la tabla es un arreglo int64 ordenado y las búsquedas son binarias; las
+    etiquetas heredadas (texto) se guardan una sola vez cada una.
+    """
+
+    def __init__(self, labels):
+        values = np.asarray(labels) if len(labels) else np.empty(0, dtype=np.int64)
+        if values.dtype.kind in 'iu':
+            self.labels, codes = np.unique(values.astype(np.int64), return_inverse=True)
+            self._codes_by_label = None
+        else:
+            table = {}
+            codes = [table.setdefault(label, len(table)) for label in labels]
+            self.labels = list(table)
+            self._codes_by_label = table
+        self.row_codes = np.asarray(codes, dtype=np.int32).reshape(-1)
+        self.counts = np.bincount(self.row_codes, minlength=len(self.labels))
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)))
+        self.order = np.argsort(self.row_codes, kind='stable').astype(np.int32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def label(self, code):
+        """Etiqueta de un código (int de Python para los IDs enteros)."""
+        label = self.labels[code]
+        return label.item() if self._codes_by_label is None else label
+
+    def codes_for(self, labels):
+        """Códigos de las etiquetas indicadas que están en la tabla."""
+        if self._codes_by_label is not None:
+            return np.array([self._codes_by_label[label] for label in labels if label in self._codes_by_label],
+                            dtype=np.intp)
+        wanted = np.fromiter((label for label in labels if isinstance(label, (int, np.integer))), dtype=np.int64)
+        if not len(self.labels) or not len(wanted):
+            return np.empty(0, dtype=np.intp)
+        positions = np.minimum(np.searchsorted(self.labels, wanted), len(self.labels) - 1)
+        return positions[self.labels[positions] == wanted].astype(np.intp)
+
+    def rows(self, code):
+        """Filas de la matriz con el código indicado."""
+        return self.order[self.starts[code]:self.starts[code + 1]]
+
+
+class EmbeddingIndex:
+    """Índice de codificaciones faciales sobre una matriz contigua con normas precalculadas.
+
+    La matriz se guarda en float32 o, con dtype float16/int8, cuantizada; las distancias se calculan
+    convirtiendo a float32 por bloques. Con exact (la matriz de precisión completa, normalmente mapeada
+    en memoria) los mejores candidatos se recalculan con las codificaciones exactas. Las etiquetas se
+    guardan en una IdentityTable.
+
+    Con n_lists > 0 se construye además un índice particionado (IVF): las filas se agrupan
+    con k-means y cada búsqueda sólo compara contra las n_probe particiones más cercanas.
+
+    match() busca por identidad: primero contra el centroide de cada identidad y después contra las
+    muestras de las SHORTLIST_SIZE identidades más cercanas, con un umbral propio por identidad.
+    """
+
+    def __init__(self, encodings, labels, n_lists=0, n_probe=4, seed=0, sq_norms=None, dtype='float32',
+                 exact=None, rerank=RERANK_SIZE):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"dtype no soportado: {dtype} (opciones: {', '.join(INDEX_DTYPES)})")
+        self.table = IdentityTable(labels)
+        self.count = len(self.table.row_codes)
+        source = encodings if isinstance(encodings, np.ndarray) else np.asarray(encodings, dtype=np.float32)
+        source = source.reshape(self.count, EMBEDDING_DIM)
+        self.scale = None
+        if dtype == 'float32':
+            # Una matriz float32 mapeada en memoria (embedding_store) se usa tal cual, sin copiarla
+            self.matrix = np.ascontiguousarray(np.asarray(source, dtype=np.float32))
+        elif dtype == 'float16' and source.dtype == np.float16:
+            self.matrix = source
+        else:
+            self.matrix, self.scale = _quantize(source, np.dtype(dtype))
+            sq_norms = None
+        if sq_norms is None:
+            sq_norms = np.concatenate([_sq_norms(self._as_float(self.matrix[start:start + SCAN_CHUNK_ROWS]))
+                                       for start in range(0, self.count, SCAN_CHUNK_ROWS)] or [np.empty(0)])
+        self.sq_norms = np.asarray(sq_norms, dtype=np.float32)
+        self.exact = exact if dtype != 'float32' else None
+        self.rerank = rerank
+        self.n_probe = n_probe
+        self.centroids = None
+        self.lists = None
+        self.identity_centroids = None
+        if n_lists and self.count > n_lists:
+            self._build_ivf(n_lists, seed)
+
+    def __len__(self):
+        return self.count
+
+    def _as_float(self, block):
+        """Filas de la matriz (o de los centroides) en float32."""
+        block = np.asarray(block, dtype=np.float32)
+        return block * self.scale if self.scale is not None else block
+
+    def _scan(self, queries, matrix, sq_norms):
+        """Distancias al cuadrado (Q x N) contra una matriz en la representación del índice."""
+        if matrix.dtype == np.float32:
+            return _sq_distances(queries, None, matrix, sq_norms)
+        query_norms = _sq_norms(queries)
+        result = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), SCAN_CHUNK_ROWS):
+            end = start + SCAN_CHUNK_ROWS
+            result[:, start:end] = _sq_distances(queries, query_norms, self._as_float(matrix[start:end]),
+                                                 sq_norms[start:end])
+        return result
+
+    def _exact_distances(self, query, rows):
+        """Distancias euclidianas de una consulta a las filas indicadas, con las codificaciones exactas."""
+        return np.linalg.norm(np.asarray(self.exact[rows], dtype=np.float32) - query, axis=1)
+
+    def _build_ivf(self, n_lists, seed, iterations=10):
+        """Agrupa las filas en n_lists particiones con k-means (Lloyd)."""
+        matrix = self._as_float(self.matrix)
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(len(matrix), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmin(_sq_distances(matrix, self.sq_norms, centroids), axis=1)
+            for i in range(n_lists):
+                members = matrix[assignment == i]
+                if len(members):
+                    centroids[i] = members.mean(axis=0)
+        assignment = np.argmin(_sq_distances(matrix, self.sq_norms, centroids), axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == i) for i in range(n_lists)]
+
+    def _build_identities(self):
+        """Centroide y umbral de cada identidad (en la primera búsqueda por identidad).
+
+        Las filas se recorren por bloques en el orden de la tabla, sin convertir toda la matriz.
+        """
+        table = self.table
+        sums = np.zeros((len(table), EMBEDDING_DIM), dtype=np.float64)
+        for start in range(0, self.count, SCAN_CHUNK_ROWS):
+            rows = table.order[start:start + SCAN_CHUNK_ROWS]
+            codes, first = np.unique(table.row_codes[rows], return_index=True)
+            sums[codes] += np.add.reduceat(self._as_float(self.matrix[rows]), first, axis=0)
+        centroids = (sums / table.counts[:, None]).astype(np.float32)
+
+        spread = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SCAN_CHUNK_ROWS):
+            end = start + SCAN_CHUNK_ROWS
+            diff = self._as_float(self.matrix[start:end]) - centroids[table.row_codes[start:end]]
+            spread[start:end] = np.sqrt(_sq_norms(diff))
+        mean_spread = np.bincount(table.row_codes, weights=spread, minlength=len(table)) / table.counts
+        thresholds = np.maximum(2 * mean_spread + THRESHOLD_MARGIN, MIN_TOLERANCE)
+        thresholds[table.counts < 2] = np.inf
+
+        # Los centroides se quedan en float32 aunque la matriz esté cuantizada: se recorren en cada
+        # consulta y ocupan una fila por identidad, no una por muestra
+        self.identity_sq_norms = _sq_norms(centroids)
+        self.identity_thresholds = thresholds
+        self.identity_centroids = centroids
+
+    def rows_for(self, labels):
+        """Filas de la matriz que pertenecen a las etiquetas indicadas."""
+        rows = [self.table.rows(code) for code in self.table.codes_for(labels)]
+        return np.concatenate(rows).astype(np.intp) if rows else np.empty(0, dtype=np.intp)
+
+    def distances(self, queries, rows=None):
+        """Distancias euclidianas (Q x N) entre las consultas y las filas indicadas (todas por defecto)."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if rows is None:
+            sq_distances = self._scan(queries, self.matrix, self.sq_norms)
+        else:
+            sq_distances = _sq_distances(queries, None, self._as_float(self.matrix[rows]), self.sq_norms[rows])
+        return np.sqrt(np.maximum(sq_distances, 0)).reshape(len(queries), -1)
+
+    def _candidate_rows(self, query):
+        """Filas de las n_probe particiones más cercanas a la consulta."""
+        probe = min(self.n_probe, len(self.lists))
+        nearest = np.argpartition(_sq_distances(query[None, :], None, self.centroids)[0], probe - 1)[:probe]
+        return np.concatenate([self.lists[i] for i in nearest])
+
+    def search(self, queries, k=1, candidates=None):
+        """Devuelve, para cada consulta, la lista de los k pares (etiqueta, distancia) más cercanos.
+
+        Si se indican candidatos, la búsqueda (exacta) se limita a las filas de esas etiquetas.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if not self.count or not len(queries):
+            return [[] for _ in range(len(queries))]
+
+        if candidates is not None:
+            rows = self.rows_for(candidates)
+            if not len(rows):
+                return [[] for _ in range(len(queries))]
+            return [self._top_k(query, row, rows, k) for query, row in zip(queries, self.distances(queries, rows))]
+
+        if self.centroids is None:
+            # Un solo producto matricial para todas las caras del cuadro
+            distances = self.distances(queries)
+            return [self._top_k(query, row, np.arange(len(row)), k) for query, row in zip(queries, distances)]
+
+        results = []
+        for query in queries:
+            rows = self._candidate_rows(query)
+            results.append(self._top_k(query, self.distances(query, rows)[0], rows, k))
+        return results
+
+    def match(self, queries, k=1, candidates=None, tolerance=DEFAULT_TOLERANCE, shortlist=SHORTLIST_SIZE):
+        """Devuelve, para cada consulta, las k tripletas (etiqueta, distancia, umbral) más cercanas.
+
+        La distancia es la mínima contra las muestras de la identidad y el umbral es el de la identidad,
+        acotado por tolerance. Si se indican candidatos sólo se consideran esas identidades.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if not self.count or not len(queries):
+            return [[] for _ in range(len(queries))]
+        if self.identity_centroids is None:
+            self._build_identities()
+
+        if candidates is not None:
+            codes = self.table.codes_for(candidates)
+            if not len(codes):
+                return [[] for _ in range(len(queries))]
+            centroid_distances = self._scan(queries, self.identity_centroids[codes], self.identity_sq_norms[codes])
+        else:
+            codes = np.arange(len(self.table))
+            # Primera etapa: un producto matricial contra los centroides
+            centroid_distances = self._scan(queries, self.identity_centroids, self.identity_sq_norms)
+
+        size = min(max(shortlist, k), len(codes))
+        results = []
+        for query, row in zip(queries, centroid_distances):
+            nearest = codes[np.argpartition(row, size - 1)[:size]]
+            # Segunda etapa: distancia mínima contra las muestras de cada identidad preseleccionada
+            groups = [self.table.rows(code) for code in nearest]
+            best = _group_minimum(self.distances(query, np.concatenate(groups))[0], groups)
+            if self.exact is not None:
+                # Las mejores identidades se recalculan con las codificaciones exactas
+                keep = np.argsort(best)[:max(k, self.rerank)]
+                nearest, groups = nearest[keep], [groups[i] for i in keep]
+                best = _group_minimum(self._exact_distances(query, np.concatenate(groups)), groups)
+            top = np.argsort(best)[:k]
+            results.append([
+                (self.table.label(nearest[i]), float(best[i]),
+                 float(min(self.identity_thresholds[nearest[i]], tolerance)))
+                for i in top
+            ])
+        return results
+
+    def _top_k(self, query, distances, rows, k):
+        if self.exact is not None:
+            # Se preseleccionan con la matriz cuantizada y se ordenan con las distancias exactas
+            size = min(max(k, self.rerank), len(distances))
+            if size == 0:
+                return []
+            keep = np.argpartition(distances, size - 1)[:size]
+            rows, distances = rows[keep], self._exact_distances(query, rows[keep])
+        k = min(k, len(distances))
+        if k == 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(self.table.label(self.table.row_codes[rows[i]]), float(distances[i])) for i in top]
+
+
+class SegmentedIndex:
+    """Combina un índice base con índices delta (inscripciones incrementales) y fusiona sus top-k.
+
+    Los deltas se buscan por separado para no copiar la matriz base mapeada en memoria.
+    """
+
+    def __init__(self, segments=()):
+        self.segments = list(segments)
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def with_segment(self, segment):
+        """Devuelve un índice nuevo con el segmento agregado (el actual no se modifica)."""
+        return SegmentedIndex(self.segments + [segment])
+
+    def search(self, queries, k=1, candidates=None):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        merged = [[] for _ in range(len(queries))]
+        for segment in self.segments:
+            results = segment.search(queries, k, candidates)
+            merged = [sorted(a + b, key=lambda match: match[1])[:k] for a, b in zip(merged, results)]
+        return merged
+
+    def match(self, queries, k=1, candidates=None, tolerance=DEFAULT_TOLERANCE, shortlist=SHORTLIST_SIZE):
+        """Igual que EmbeddingIndex.match; una identidad presente en varios segmentos conserva su mejor distancia."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        merged = [{} for _ in range(len(queries))]
+        for segment in self.segments:
+            for best, results in zip(merged, segment.match(queries, k, candidates, tolerance, shortlist)):
+                for label, distance, threshold in results:
+                    if label not in best or distance < best[label][1]:
+                        best[label] = (label, distance, threshold)
+        return [sorted(best.values(), key=lambda match: match[1])[:k] for best in merged]
+
+
+def is_match(distance, threshold):
+    """Regla de aceptación común a todas las rutas de reconocimiento: la distancia debe quedar por debajo
+    del umbral (una distancia igual al umbral se rechaza)."""
+    return distance < threshold
+
+
+def _sq_distances(a, a_sq_norms, b, b_sq_norms=None):
+    """Distancias euclidianas al cuadrado (len(a) x len(b)) usando |a|² + |b|² - 2ab."""
+    if a_sq_norms is None:
+        a_sq_norms = np.einsum('ij,ij->i', a, a)
+    if b_sq_norms is None:
+        b_sq_norms = np.einsum('ij,ij->i', b, b)
+    return a_sq_norms[:, None] + b_sq_norms[None, :] - 2 * (a @ b.T)
+
+
+def _sq_norms(matrix):
+    return np.einsum('ij,ij->i', matrix, matrix)
+
+
+def _group_minimum(distances, groups):
+    """Distancia mínima de cada grupo de filas consecutivas."""
+    starts = np.concatenate(([0], np.cumsum([len(group) for group in groups])[:-1]))
+    return np.minimum.reduceat(distances, starts)
+
+
+def _quantize_block(block, dtype, scale):
+    block = np.asarray(block, dtype=np.float32)
+    if dtype == np.int8:
+        return np.clip(np.rint(block / scale), -127, 127).astype(np.int8)
+    return block.astype(dtype)
+
+
+def _quantize(source, dtype):
+    """Convierte las codificaciones a dtype por bloques; con int8 devuelve también la escala por dimensión."""
+    scale = None
+    if dtype == np.int8:
+        max_abs = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for start in range(0, len(source), SCAN_CHUNK_ROWS):
+            block = np.abs(np.asarray(source[start:start + SCAN_CHUNK_ROWS], dtype=np.float32))
+            max_abs = np.maximum(max_abs, block.max(axis=0))
+        scale = np.where(max_abs > 0, max_abs / 127, 1).astype(np.float32)
+    matrix = np.empty(source.shape, dtype=dtype)
+    for start in range(0, len(source), SCAN_CHUNK_ROWS):
+        matrix[start:start + SCAN_CHUNK_ROWS] = _quantize_block(source[start:start + SCAN_CHUNK_ROWS], dtype, scale)
+    return matrix, scale
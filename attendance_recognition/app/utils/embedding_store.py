@@ -0,0 +1,157 @@
+#embedding_store.py
+import fcntl
+import json
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+# Formato del archivo .emb:
+#   cabecera de 64 bytes | matriz (count x dim) | normas al cuadrado float32 (count) | tabla de etiquetas JSON
+# La matriz queda alineada a 64 bytes para poder mapearla directamente con np.memmap, de modo que
+# todos los procesos que cargan el mismo archivo comparten una sola copia en la caché de páginas.
+MAGIC = b'FEMB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHBxQQIQ')
+HEADER_SIZE = 64
+DTYPES = {0: np.float32, 1: np.float16}
+# Permisos de los archivos publicados: NamedTemporaryFile los crea con 0600 y el servicio de inferencia
+# u otras cuentas del despliegue deben poder leerlos
+FILE_MODE = 0o644
+
+
+def write_store(path, encodings, labels, version=1, dtype=np.float32):
+    """Escribe las codificaciones y etiquetas en el formato .emb de forma atómica."""
+    dtype = np.dtype(dtype)
+    dtype_code = next(code for code, value in DTYPES.items() if np.dtype(value) == dtype)
+    labels = list(labels)
+    matrix = np.asarray(encodings, dtype=np.float32).reshape(len(labels), -1) if labels else np.empty((0, 128), np.float32)
+    sq_norms = np.einsum('ij,ij->i', matrix, matrix).astype(np.float32)
+    labels_blob = json.dumps(labels, ensure_ascii=False).encode('utf-8')
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, dtype_code, version, matrix.shape[0], matrix.shape[1], len(labels_blob))
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp_file:
+        tmp_file.write(header.ljust(HEADER_SIZE, b'\0'))
+        tmp_file.write(np.ascontiguousarray(matrix, dtype=dtype).tobytes())
+        tmp_file.write(sq_norms.tobytes())
+        tmp_file.write(labels_blob)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.chmod(tmp_file.name, FILE_MODE)
+    # Reemplazo atómico: los lectores ven el archivo anterior o el nuevo, nunca uno a medias
+    os.replace(tmp_file.name, path)
+
+
+def read_header(path):
+    """Lee la cabecera de un archivo .emb y devuelve un diccionario con sus campos."""
+    with open(path, 'rb') as f:
+        magic, format_version, dtype_code, version, count, dim, labels_size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} no es un archivo de codificaciones .emb")
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Versión de formato no soportada: {format_version}")
+    return {
+        'version': version,
+        'dtype': np.dtype(DTYPES[dtype_code]),
+        'count': count,
+        'dim': dim,
+        'labels_size': labels_size,
+    }
+
+
+def load_store(path):
+    """Carga un archivo .emb sin copiar la matriz: devuelve (matriz, normas, etiquetas, versión)."""
+    header = read_header(path)
+    count, dim, dtype = header['count'], header['dim'], header['dtype']
+    matrix_size = count * dim * dtype.itemsize
+
+    if count:
+        matrix = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count, dim))
+        sq_norms = np.memmap(path, dtype=np.float32, mode='r', offset=HEADER_SIZE + matrix_size, shape=(count,))
+    else:
+        matrix, sq_norms = np.empty((0, dim), dtype), np.empty(0, np.float32)
+
+    with open(path, 'rb') as f:
+        f.seek(HEADER_SIZE + matrix_size + count * 4)
+        labels = json.loads(f.read(header['labels_size']).decode('utf-8'))
+    return matrix, sq_norms, labels, header['version']
+
+
+# Inscripción incremental: cada alta se escribe como un delta <archivo>.d/<versión>.emb con una versión
+# mayor que la de la base y la de los deltas anteriores. Los lectores aplican sólo los deltas con versión
+# mayor que la de la base; al compactar (o al instalar una base reconstruida, que ya los incluye) quedan
+# obsoletos.
+
+def delta_dir(path):
+    return path + '.d'
+
+
+def list_deltas(path, after_version=0):
+    """Lista los deltas (versión, ruta) con versión mayor que after_version, en orden."""
+    directory = delta_dir(path)
+    if not os.path.isdir(directory):
+        return []
+    deltas = []
+    for file_name in os.listdir(directory):
+        stem, ext = os.path.splitext(file_name)
+        if ext == '.emb' and stem.isdigit() and int(stem) > after_version:
+            deltas.append((int(stem), os.path.join(directory, file_name)))
+    return sorted(deltas)
+
+
+def current_version(path):
+    """Versión más reciente del almacén, considerando la base y sus deltas."""
+    version = read_header(path)['version'] if os.path.exists(path) else 0
+    deltas = list_deltas(path, version)
+    return deltas[-1][0] if deltas else version
+
+
+@contextmanager
+def _store_lock(path):
+    """Bloqueo exclusivo entre procesos para asignar versiones y compactar."""
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_delta(path, encodings, labels):
+    """Agrega codificaciones nuevas como un delta versionado y devuelve su versión."""
+    os.makedirs(delta_dir(path), exist_ok=True)
+    with _store_lock(path):
+        version = current_version(path) + 1
+        write_store(os.path.join(delta_dir(path), f'{version:020d}.emb'), encodings, labels, version=version)
+    return version
+
+
+def compact_store(path, transform=None):
+    """Integra los deltas pendientes en la base y elimina los que quedaron obsoletos.
+
+    transform(encodings, labels) -> (encodings, labels), si se indica, reescribe el contenido dentro del
+    mismo bloqueo y la base queda con una versión nueva, para que ningún delta escrito entre la lectura y
+    la escritura quede con una versión menor y se pierda.
+    """
+    with _store_lock(path):
+        base_version = read_header(path)['version'] if os.path.exists(path) else 0
+        deltas = list_deltas(path, base_version)
+        if deltas or transform is not None:
+            parts = [load_store(path)] if os.path.exists(path) else []
+            parts += [load_store(delta_path) for _, delta_path in deltas]
+            encodings = (np.concatenate([np.asarray(matrix, dtype=np.float32) for matrix, _, _, _ in parts])
+                         if parts else np.empty((0, 128), np.float32))
+            labels = [label for _, _, part_labels, _ in parts for label in part_labels]
+            new_version = deltas[-1][0] if deltas else base_version
+            if transform is not None:
+                encodings, labels = transform(encodings, labels)
+                new_version += 1
+            write_store(path, encodings, labels, version=new_version)
+            base_version = new_version
+        for version, delta_path in list_deltas(path):
+            if version <= base_version:
+                os.remove(delta_path)
+    return base_version
@@ -0,0 +1,128 @@
+#encoding_cache.py
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Tamaño máximo por defecto de la caché en disco (bytes de codificaciones y ubicaciones)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Los accesos (last_access) se acumulan en memoria y se escriben juntos como máximo cada tantos segundos
+ACCESS_FLUSH_INTERVAL = 30.0
+
+
+class EncodingCache:
+    """Caché persistente de ubicaciones y codificaciones faciales, direccionada por contenido.
+
+    La clave es el hash SHA-256 de los bytes de la imagen más la configuración del detector, así que una
+    foto idéntica no vuelve a pasar por dlib aunque cambie su nombre o su ubicación en S3. Se guarda en
+    SQLite con desalojo LRU cuando se supera max_bytes; también se guardan los resultados sin caras.
+    """
+
+    def __init__(self, path="encoding_cache.db", max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS encodings ("
+            "key TEXT PRIMARY KEY, locations BLOB NOT NULL, encodings BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS encodings_last_access ON encodings (last_access)")
+        # Tamaño total en una fila, mantenido por triggers en la misma transacción que cada escritura (vale
+        # para todos los procesos que comparten el archivo); se calcula con SUM una sola vez
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS encodings_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)"
+        )
+        self.connection.execute("INSERT OR IGNORE INTO encodings_size SELECT 0, COALESCE(SUM(size), 0) FROM encodings")
+        self.connection.executescript("""
+            CREATE TRIGGER IF NOT EXISTS encodings_size_insert AFTER INSERT ON encodings
+            BEGIN UPDATE encodings_size SET total = total + NEW.size; END;
+            CREATE TRIGGER IF NOT EXISTS encodings_size_update AFTER UPDATE OF size ON encodings
+            BEGIN UPDATE encodings_size SET total = total + NEW.size - OLD.size; END;
+            CREATE TRIGGER IF NOT EXISTS encodings_size_delete AFTER DELETE ON encodings
+            BEGIN UPDATE encodings_size SET total = total - OLD.size; END;
+        """)
+        self.connection.commit()
+        self._accessed = {}
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def make_key(image_bytes, settings):
+        """Clave de caché: hash del contenido de la imagen y configuración del detector."""
+        return f"{hashlib.sha256(image_bytes).hexdigest()}:{settings}"
+
+    def get(self, key):
+        """Devuelve (ubicaciones, codificaciones) o None si la clave no está en caché."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT locations, encodings FROM encodings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if time.monotonic() - self._last_flush >= ACCESS_FLUSH_INTERVAL:
+                self._flush_accesses()
+                self.connection.commit()
+        locations = np.frombuffer(row[0], dtype=np.int32).reshape(-1, 4)
+        encodings = np.frombuffer(row[1], dtype=np.float64).reshape(len(locations), 128)
+        return [tuple(int(v) for v in location) for location in locations], list(encodings)
+
+    def put(self, key, locations, encodings):
+        """Guarda el resultado de una imagen y desaloja las entradas menos usadas si se excede el límite."""
+        locations_blob = np.asarray(locations, dtype=np.int32).reshape(-1, 4).tobytes()
+        encodings_blob = np.asarray(encodings, dtype=np.float64).tobytes()
+        size = len(key) + len(locations_blob) + len(encodings_blob)
+        with self._lock:
+            # UPSERT en lugar de REPLACE: el reemplazo no dispara el trigger de borrado y descuadraría el total
+            self.connection.execute(
+                "INSERT INTO encodings (key, locations, encodings, size, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET locations = excluded.locations, encodings = excluded.encodings, "
+                "size = excluded.size, last_access = excluded.last_access",
+                (key, locations_blob, encodings_blob, size, time.time())
+            )
+            self._flush_accesses()
+            self._evict()
+            self.connection.commit()
+
+    def get_or_compute(self, image_bytes, settings, compute):
+        """Busca la imagen en caché; si no está, llama a compute() -> (ubicaciones, codificaciones) y la guarda."""
+        key = self.make_key(image_bytes, settings)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        locations, encodings = compute()
+        self.put(key, locations, encodings)
+        return list(locations), list(encodings)
+
+    def _flush_accesses(self):
+        """Escribe los accesos acumulados (el orden LRU se actualiza por lotes)."""
+        if self._accessed:
+            self.connection.executemany("UPDATE encodings SET last_access = ? WHERE key = ?",
+                                        [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+        self._last_flush = time.monotonic()
+
+    def total_size(self):
+        return self.connection.execute("SELECT total FROM encodings_size").fetchone()[0]
+
+    def _evict(self):
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self.connection.execute("SELECT key, size FROM encodings ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.connection.executemany("DELETE FROM encodings WHERE key = ?", victims)
+
+    def close(self):
+        with self._lock:
+            self._flush_accesses()
+            self.connection.commit()
+        self.connection.close()
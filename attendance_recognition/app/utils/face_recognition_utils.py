@@ -1,24 +1,215 @@
 #face_recognition_utils.py
 from utils import *
+from embedding_index import DEFAULT_TOLERANCE, is_match
+from embedding_store import append_delta
+from store_index import StoreIndex
+from encoding_cache import EncodingCache
+from detection import FaceDetector
+from metrics import timer, timed, increment
 
-# Cargar las codificaciones y nombres desde el archivo .pkl
-with open('face_recognition_encodings.pkl', 'rb') as file:
-    data = pickle.load(file)
-encodings = data['encodings']
-names = data['names']
+# Archivo de codificaciones (.emb mapeado en memoria) etiquetadas con el ID de usuario del estudiante.
+# Los archivos heredados (.pkl o etiquetas con nombres) se convierten con scripts/convert_encodings.py y
+# scripts/relabel_encodings.py
+ENCODINGS_PATH = 'face_recognition_encodings.emb'
+# Representación del índice en memoria (float32, float16 o int8); cuantizado, los mejores candidatos se
+# recalculan sobre el archivo mapeado en memoria
+INDEX_DTYPE = os.environ.get('EMBEDDING_INDEX_DTYPE', 'float32')
 
-def recognize_identity(image):
-    image_array = np.array(image)
-    face_locations = face_recognition.face_locations(image_array)
-    face_encodings = face_recognition.face_encodings(image_array, face_locations)
-    best_match = {"name": "Desconocido", "confidence": 0}
+# Caché de codificaciones por contenido de imagen (compartida con el entrenamiento)
+ENCODING_CACHE_PATH = 'encoding_cache.db'
 
-    for face_encoding in face_encodings:
-        face_distances = face_recognition.face_distance(encodings, face_encoding)
-        best_match_index = np.argmin(face_distances)
-        confidence = max(0, int((1 - face_distances[best_match_index]) * 100))
+# Servicio de inferencia (model.py serve); si no está configurado o no responde se reconoce localmente
+RECOGNITION_SERVICE_URL = os.environ.get('RECOGNITION_SERVICE_URL')
+RECOGNITION_SERVICE_TIMEOUT = 3.0
 
-        if face_distances[best_match_index] < 0.6:
-            best_match = {"name": names[best_match_index], "confidence": confidence}
+# Cada cuántos segundos se revisa si hay inscripciones nuevas en el almacén
+REFRESH_INTERVAL = 5.0
 
-    return best_match["name"], best_match["confidence"]
\ No newline at end of file
+class RecognitionModel(StoreIndex):
+    """Detectores, caché de codificaciones e índice de un proceso.
+
+    El índice se carga en el primer reconocimiento local (o en warm_up) y después sólo incorpora los
+    deltas nuevos del almacén.
+    """
+
+    def __init__(self, path=ENCODINGS_PATH):
+        super().__init__(path, dtype=INDEX_DTYPE, refresh_interval=REFRESH_INTERVAL)
+        # Detector para los cuadros de asistencia (configurable por despliegue) y para las fotografías de
+        # inscripción, donde sólo interesa la cara más grande (misma configuración que el entrenamiento)
+        self.detector = FaceDetector()
+        self.enrollment_detector = FaceDetector(largest_only=True)
+        self.encoding_cache = EncodingCache(ENCODING_CACHE_PATH)
+
+@st.cache_resource(show_spinner=False)
+def get_model():
+    """Modelo de reconocimiento del proceso, compartido por todas las sesiones de Streamlit."""
+    return RecognitionModel()
+
+def refresh_index(force=False):
+    get_model().refresh(force)
+
+def encode_image_bytes(image_bytes):
+    """Ubicaciones y codificaciones de las caras de una imagen, usando la caché por contenido."""
+    model = get_model()
+    def compute():
+        image_array = np.array(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+        return model.enrollment_detector.detect_and_encode(image_array)
+    return model.encoding_cache.get_or_compute(image_bytes, model.enrollment_detector.settings, compute)
+
+def enroll_identity(images, user_id):
+    """Codifica las fotografías (bytes) de una inscripción y las agrega al almacén como un delta versionado."""
+    new_encodings = []
+    for image_bytes in images:
+        _, face_encodings = encode_image_bytes(image_bytes)
+        if face_encodings:
+            new_encodings.append(face_encodings[0])
+    if not new_encodings:
+        return 0
+    append_delta(ENCODINGS_PATH, new_encodings, [user_id] * len(new_encodings))
+    refresh_index(force=True)
+    return len(new_encodings)
+
+# Distancia máxima para aceptar una coincidencia; cada identidad usa además su propio umbral adaptativo
+# (embedding_index), nunca mayor que éste
+TOLERANCE = float(os.environ.get('RECOGNITION_TOLERANCE', DEFAULT_TOLERANCE))
+
+@timed("recognition.match")
+def match_encodings(face_encodings, candidates=None):
+    """Busca la identidad más cercana de cada cara, primero entre los candidatos y luego en el índice global.
+
+    Devuelve por cara una lista con la tripleta (etiqueta, distancia, umbral) de la mejor identidad.
+    """
+    model = get_model()
+    with timer("recognition.refresh_index"):
+        model.refresh()
+    current_index = model.index
+    if candidates:
+        matches = current_index.match(face_encodings, k=1, candidates=candidates, tolerance=TOLERANCE)
+    else:
+        matches = [[] for _ in face_encodings]
+
+    # Las caras sin coincidencia entre los candidatos se buscan en todo el índice
+    pending = [i for i, match in enumerate(matches) if not match or not is_match(match[0][1], match[0][2])]
+    if pending:
+        global_matches = current_index.match([face_encodings[i] for i in pending], k=1, tolerance=TOLERANCE)
+        for i, match in zip(pending, global_matches):
+            matches[i] = match
+    return matches
+
+def recognize_batch(images, candidates=None, face_detector=None):
+    """Reconoce todas las caras de una lista de imágenes (PIL o arreglos RGB).
+
+    Devuelve, por imagen, una lista de diccionarios con user_id (None si no hubo coincidencia), distance,
+    confidence y box (top, right, bottom, left). Todas las caras de todas las imágenes se comparan en una sola búsqueda.
+    """
+    face_detector = face_detector or get_model().detector
+    detections = face_detector.detect_and_encode_batch([np.array(image) for image in images])
+    all_encodings = [encoding for _, face_encodings in detections for encoding in face_encodings]
+    all_matches = iter(match_encodings(all_encodings, candidates) if all_encodings else [])
+
+    results = []
+    for face_locations, face_encodings in detections:
+        faces = []
+        for location, matches in zip(face_locations, all_matches):
+            user_id, distance, threshold = matches[0] if matches else (None, 1.0, TOLERANCE)
+            if not is_match(distance, threshold):
+                user_id = None
+            faces.append({
+                "user_id": user_id,
+                "distance": distance,
+                "confidence": max(0, int((1 - distance) * 100)),
+                "box": tuple(int(v) for v in location),
+            })
+        results.append(faces)
+    return results
+
+def recognize_stream(frames, candidates=None, face_detector=None, batch_size=16):
+    """Reconoce un flujo de cuadros por lotes de batch_size; produce los resultados de cada cuadro en orden."""
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) == batch_size:
+            yield from recognize_batch(batch, candidates, face_detector)
+            batch = []
+    if batch:
+        yield from recognize_batch(batch, candidates, face_detector)
+
+@timed("recognition.remote")
+def recognize_remote(image, candidates=None):
+    """Reconoce las caras de una imagen en el servicio de inferencia, con el mismo formato que recognize_batch.
+
+    El servicio devuelve los candidatos más cercanos de cada cara como [etiqueta, distancia, umbral]; se
+    prefiere el primero que pertenezca a los candidatos (grupos en clase) y esté dentro de su umbral.
+    Devuelve (caras, includes_deltas): el segundo indica si el servicio atiende desde el almacén con las
+    inscripciones recientes o sólo con el último entrenamiento.
+    """
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    request = urllib.request.Request(
+        f"{RECOGNITION_SERVICE_URL}/predict", data=buffer.getvalue(), headers={"Content-Type": "image/jpeg"}
+    )
+    with urllib.request.urlopen(request, timeout=RECOGNITION_SERVICE_TIMEOUT) as response:
+        payload = json.loads(response.read())
+
+    faces = []
+    for face in payload["faces"]:
+        matches = [(match + [TOLERANCE])[:3] for match in
+                   face.get("matches") or [[face["person"], face["distance"]]]]
+        user_id, distance, threshold = next(
+            (match for match in matches if candidates and match[0] in candidates and is_match(match[1], match[2])),
+            matches[0]
+        )
+        faces.append({
+            "user_id": user_id if is_match(distance, min(threshold, TOLERANCE)) else None,
+            "distance": distance,
+            "confidence": max(0, int((1 - distance) * 100)),
+            "box": tuple(face["box"]),
+        })
+    return faces, bool(payload.get("includes_deltas"))
+
+@timed("recognition.identify")
+def recognize_identity(image, candidates=None):
+    """Devuelve (ID de usuario, confianza) de la persona reconocida, o (None, 0) si no hubo coincidencia."""
+    best_match = {"user_id": None, "confidence": 0}
+
+    faces = None
+    if RECOGNITION_SERVICE_URL:
+        try:
+            faces, includes_deltas = recognize_remote(image, candidates)
+        except (OSError, ValueError, KeyError):
+            # Servicio caído, lento o con respuesta inválida: se reconoce en este proceso
+            increment("recognition.remote_fallback")
+            faces = None
+        else:
+            if faces and not includes_deltas and all(face["user_id"] is None for face in faces):
+                # El servicio no conoce las inscripciones posteriores al entrenamiento: sólo están en el índice local
+                increment("recognition.remote_unknown_fallback")
+                faces = None
+    if faces is None:
+        faces = recognize_batch([image], candidates)[0]
+
+    # Se conserva la última cara reconocida del cuadro
+    for face in faces:
+        if face["user_id"] is not None:
+            best_match = {"user_id": face["user_id"], "confidence": face["confidence"]}
+
+    if not faces:
+        increment("recognition.no_face")
+    elif best_match["user_id"] is None:
+        increment("recognition.unknown")
+    else:
+        increment("recognition.matches")
+    return best_match["user_id"], best_match["confidence"]
+
+def warm_up_recognition():
+    """Prepara el reconocimiento local antes de la primera solicitud: índice, dlib y una pasada de detección,
+    codificación y búsqueda. Con servicio de inferencia sólo se carga el índice (el local es el respaldo)."""
+    model = get_model()
+    model.refresh(force=True)
+    if RECOGNITION_SERVICE_URL:
+        return
+    blank = np.zeros((96, 96, 3), dtype=np.uint8)
+    model.detector.locate(blank)
+    face_encodings = model.detector.encode(blank, [(16, 80, 80, 16)])
+    if len(model.index):
+        model.index.match(face_encodings, k=1, tolerance=TOLERANCE)
@@ -1,14 +1,19 @@
 #handlers.py
 
 from utils import *
-from database import (get_session, get_user_info, check_user_exists, insert_user, check_group_exists,
-                      insert_group, insert_student,get_day_of_week, get_user_id_by_name, 
-                      get_student_group, get_group_id_by_name, get_schedule_for_day,
-                      check_attendance_exists, register_attendance,get_classes_by_professor, 
-                      get_attendance_by_date_range, get_attendance_by_date)
+from database import (get_user_info, check_user_exists, insert_user, check_group_exists,
+                      insert_group, insert_student, get_day_of_week, get_students_in_session,
+                      get_student_directory, get_schedule_index, get_classes_by_professor, get_attendance_page,
+                      iter_attendance_by_date_range, get_attendance_summary, ingest_attendance)
 
 from face_recognition_utils import recognize_identity
+from checkin_queue import checkin_writer, PENDING, REGISTERED, DUPLICATE, REJECTED
 from preprocessing import capture_or_upload_photos
+from metrics import timer, profiled
+from reports import (ATTENDANCE_COLUMNS, ATTENDANCE_IMPORT_COLUMNS, csv_chunks, excel_chunks, write_chunks,
+                     read_attendance_csv, open_for_download, DownloadTooLarge)
+from pdf_reports import generate_attendance_pdf, submit_weekly_reports
+from analytics import get_student_attendance_stats, get_weekly_attendance_trend, get_daily_attendance_totals
 
 
 def validate_user(name, email, role):
@@ -45,13 +50,15 @@ def register_new_user(name, email, group_name):
 
     # Verificar si el grupo existe en la tabla Grupos, y si no, crearlo
     group_info = check_group_exists(group_name)
-    if not group_info:
+    if group_info:
+        group_id = group_info.id
+    else:
         # Insertar el nuevo grupo en la tabla Grupos si no existe
-        group_info = insert_group(group_name)
-        st.write(f"Nuevo grupo registrado con ID: {group_info}, Nombre: {group_name}")
+        group_id = insert_group(group_name)
+        st.write(f"Nuevo grupo registrado con ID: {group_id}, Nombre: {group_name}")
     
     # Insertar los datos del estudiante en la tabla Estudiantes
-    insert_student(user_id, matricula, group_name)
+    insert_student(user_id, matricula, group_id)
 
     st.success("Usuario y estudiante registrado exitosamente.")
 
@@ -60,79 +67,94 @@ def register_new_user(name, email, group_name):
 
 
 #def handle_student():
-
 def handle_student():
     image_predict = st.camera_input("Toma tu fotografía de asistencia", key='student_camera')
-    if image_predict is not None:
-        img = Image.open(io.BytesIO(image_predict.getvalue()))
-        img = img.convert("RGB")
-        identity, confidence = recognize_identity(img)
-        
-        if identity == "Desconocido":
-            st.error("No se detectó ningún rostro o no hubo coincidencia.")
-            return
-        else:
-            st.success(f"Identidad reconocida: {identity} (Confianza: {confidence}%)")
-            st.image(img, caption=f"{identity} - Confianza: {confidence}%", use_column_width=True)
+    # Una misma fotografía se reconoce una sola vez aunque la página se vuelva a ejecutar
+    if image_predict is not None and st.session_state.get('checkin_foto') != image_predict.file_id:
+        st.session_state['checkin_foto'] = image_predict.file_id
+        st.session_state.pop('checkin_ticket', None)
+        with profiled("checkin.request"):
+            with timer("checkin.decode"):
+                img = Image.open(io.BytesIO(image_predict.getvalue()))
+                img = img.convert("RGB")
 
             # Obtener la fecha y hora actual en la zona horaria de México
             now = datetime.now(pytz.timezone('America/Mexico_City'))
             current_time = now.time()
             current_date = now.date()
 
-            st.write(f"Hora actual para el registro: {current_time}")
-
-            # Paso 0: Obtener el día de la semana
-            day_of_week = get_day_of_week(now.strftime('%Y-%m-%d'))
-            if day_of_week:
-                st.write(f"Día de la semana: {day_of_week.dia if day_of_week else 'No encontrado'}")
-
-                # Paso 1: Obtener el ID del usuario
-                user_info = get_user_id_by_name(identity)
-                if user_info:
-                    st.write(f"Numero de lista: {user_info.id}")
-
-                    # Paso 2: Obtener el grupo del estudiante
-                    student_group_name = get_student_group(user_info.id)
-                    if student_group_name:
-                        st.write(f"Grupo: {student_group_name.grupo_id}")
-
-                        # Paso 2.5: Obtener el ID real del grupo
-                        group_id = get_group_id_by_name(student_group_name.grupo_id)
-                        if group_id:
-                            # Paso 3: Obtener el horario del grupo
-                            schedule_info = get_schedule_for_day(group_id.id, day_of_week.dia)
-                            if schedule_info:
-                                st.write("Clases del día:")
-                                for schedule in schedule_info:
-                                    st.write(f"Materia: {schedule.materia_nombre}, Desde: {schedule.hora_inicio}, Hasta: {schedule.hora_fin}")
-
-                                # Paso 4: Determinar a qué materia asistió según la hora actual
-                                current_class = next(
-                                    (s for s in schedule_info
-                                    if time.fromisoformat(str(s.hora_inicio)) <= current_time <= time.fromisoformat(str(s.hora_fin))),
-                                    None
-                                )
-
-                                if current_class:
-                                    # Verificar si ya existe un registro de asistencia
-                                    existing_attendance = check_attendance_exists(user_info.id, current_class.materia_id, current_date)
-                                    if existing_attendance:
-                                        st.info(f"El estudiante ya tiene una asistencia registrada para la materia: {current_class.materia_nombre}")
-                                    else:
-                                        # Registrar la asistencia
-                                        register_attendance(user_info.id, current_class.materia_id, current_date, current_time)
-                                        st.success(f"Asistencia registrada exitosamente para la materia: {current_class.materia_nombre}")
-                                else:
-                                    st.error("No hay clases en este momento para el estudiante según el horario actual.")
-                            else:
-                                st.error("No se encontraron materias para hoy.")
+            # Paso 0: Obtener el día de la semana y los estudiantes con clase en este momento,
+            # para comparar primero sólo contra ellos
+            with timer("checkin.candidates"):
+                day_of_week = get_day_of_week(now.strftime('%Y-%m-%d'))
+                candidates = get_students_in_session(day_of_week.dia, current_time) if day_of_week else None
+            user_id, confidence = recognize_identity(img, candidates)
+        
+            if user_id is None:
+                st.error("No se detectó ningún rostro o no hubo coincidencia.")
+                return
+            else:
+                st.write(f"Hora actual para el registro: {current_time}")
+
+                if day_of_week:
+                    st.write(f"Día de la semana: {day_of_week.dia}")
+
+                    # Paso 1: Resolver estudiante, grupo y clase en curso en memoria (directorio y horarios en caché)
+                    with timer("checkin.resolve"):
+                        student = get_student_directory().get(user_id)
+                    if not student:
+                        st.error("El estudiante reconocido no está registrado en el sistema.")
+                        return
+                    st.success(f"Identidad reconocida: {student.nombre} (Confianza: {confidence}%)")
+                    st.image(img, caption=f"{student.nombre} - Confianza: {confidence}%", use_column_width=True)
+                    with timer("checkin.schedule"):
+                        current_class = get_schedule_index().current_class(student.grupo_id, day_of_week.dia,
+                                                                           current_time)
+                    if current_class is None:
+                        st.error("No hay clases en este momento para el estudiante según el horario actual.")
+                    else:
+                        st.write(f"Numero de lista: {student.user_id}")
+                        st.write(f"Grupo: {student.grupo_nombre}")
+                        st.write(f"Materia: {current_class.materia_nombre}, Desde: {current_class.hora_inicio}, Hasta: {current_class.hora_fin}")
+
+                        # Paso 2: La escritura se encola y la confirma el escritor en segundo plano
+                        with timer("checkin.enqueue"):
+                            ticket = checkin_writer.submit(user_id, current_date, current_time)
+                        if ticket is None:
+                            st.warning("Hay muchos registros en espera. Toma la fotografía de nuevo en unos segundos.")
+                        else:
+                            st.session_state['checkin_ticket'] = (ticket, current_class.materia_nombre)
+                else:
+                    st.error("No se encontró el día de la semana para la fecha actual.")
+
+    mostrar_estado_registro()
+
+# Segundos que se espera la confirmación antes de mostrar el registro como pendiente
+CHECKIN_CONFIRM_WAIT = 0.5
+
+def mostrar_estado_registro():
+    """Muestra el estado del último registro de asistencia encolado en la sesión."""
+    if not st.session_state.get('checkin_ticket'):
+        return
+    ticket, materia_nombre = st.session_state['checkin_ticket']
+    ticket.wait(CHECKIN_CONFIRM_WAIT)
+    if ticket.status == PENDING:
+        st.info(f"Registrando asistencia para la materia: {materia_nombre}...")
+        if st.button("Actualizar estado"):
+            st.rerun()
+    elif ticket.status == REGISTERED:
+        st.success(f"Asistencia registrada exitosamente para la materia: {materia_nombre}")
+    elif ticket.status == DUPLICATE:
+        st.info(f"El estudiante ya tiene una asistencia registrada para la materia: {materia_nombre}")
+    elif ticket.status == REJECTED:
+        st.error(f"No se registró la asistencia: {ticket.reason}")
+    else:
+        st.error("No se pudo registrar la asistencia. Toma la fotografía de nuevo.")
 
 
 #def handle_professor():
 def handle_professor():
     st.header("Bienvenido, Profesor")
-    session = get_session()
 
     # Obtener el id del profesor desde la sesión
     profesor_id = st.session_state['user_id']
@@ -151,51 +173,156 @@ def handle_professor():
     # Elegir un día específico o un rango de fechas
     date_selection_type = st.radio("Selecciona el tipo de fecha", ["Día específico", "Rango de fechas"])
 
+    # La consulta seleccionada se conserva en la sesión para poder cambiar de página sin regenerarla
     if date_selection_type == "Día específico":
         selected_date = st.date_input("Selecciona la fecha")
         if st.button("Generar lista de asistencia"):
-            mostrar_asistencia_por_fecha(profesor_id, clase_options[selected_clase], selected_date, selected_date)
+            st.session_state['reporte'] = (clase_options[selected_clase], selected_date, selected_date)
+            st.session_state.pop('reporte_pdf', None)
+            descartar_archivo_reporte()
     else:
         start_date = st.date_input("Fecha de inicio")
         end_date = st.date_input("Fecha de fin")
         if st.button("Generar métricas de asistencia"):
-            mostrar_asistencia_por_fecha(profesor_id, clase_options[selected_clase], start_date, end_date)
+            st.session_state['reporte'] = (clase_options[selected_clase], start_date, end_date)
+            st.session_state.pop('reporte_pdf', None)
+            descartar_archivo_reporte()
+
+    if st.session_state.get('reporte'):
+        clase_info, start_date, end_date = st.session_state['reporte']
+        mostrar_asistencia_por_fecha(profesor_id, clase_info, start_date, end_date)
+
+    # Reportes semanales de todas sus clases, generados en segundo plano
+    with st.expander("Reportes semanales (PDF)"):
+        semana = st.date_input("Semana", key='reporte_semanal_fecha')
+        if st.button("Generar reportes de la semana"):
+            st.session_state['reportes_semanales'] = submit_weekly_reports(profesor_id, semana)
+        for class_name, future in st.session_state.get('reportes_semanales', {}).items():
+            if not future.done():
+                st.write(f"{class_name}: generando...")
+            elif future.exception() is not None:
+                st.error(f"{class_name}: {future.exception()}")
+            else:
+                f = open_for_download(future.result())
+                if f is None:
+                    st.warning(f"{class_name}: el reporte ya no está disponible o supera el límite de descarga.")
+                    continue
+                with f:
+                    st.download_button(label=f"Descargar {class_name}", data=f,
+                                       file_name=os.path.basename(future.result()), mime="application/pdf",
+                                       key=f"pdf_{class_name}")
+        if st.session_state.get('reportes_semanales') and st.button("Actualizar estado"):
+            st.rerun()
+
+    # Carga masiva de asistencias (kioscos sin conexión o listas exportadas), sólo de sus clases (materia y grupo)
+    with st.expander("Importar asistencias (CSV)"):
+        st.write("Columnas: " + ", ".join(ATTENDANCE_IMPORT_COLUMNS))
+        archivo = st.file_uploader("Archivo CSV", type=["csv"], key='importar_asistencias')
+        if archivo is not None and st.button("Importar"):
+            resultado = ingest_attendance(read_attendance_csv(archivo),
+                                          classes={(clase.materia_id, clase.grupo_id) for clase in clases})
+            st.success(f"Registradas: {resultado.accepted}. Duplicadas: {resultado.duplicates}. "
+                       f"Rechazadas: {len(resultado.rejected)}.")
+            if resultado.rejected:
+                # La fila 1 del archivo es el encabezado
+                st.dataframe(pd.DataFrame([(position + 2, reason) for position, reason in resultado.rejected],
+                                          columns=["Fila", "Motivo"]))
+
+# Filas por página en la lista de asistencia
+REPORT_PAGE_SIZE = 50
+
+def descartar_archivo_reporte():
+    """Elimina el archivo de exportación preparado en la sesión, si existe."""
+    archivo = st.session_state.pop('reporte_archivo', None)
+    if archivo and os.path.exists(archivo[0]):
+        os.remove(archivo[0])
 
 def mostrar_asistencia_por_fecha(profesor_id, clase_info, start_date, end_date):
-    materia_id = clase_info[0]
+    materia_id, grupo_id = clase_info[0], clase_info[1]
 
     # Imprimir los valores de entrada para la consulta
-    st.write(f"Valores para la consulta: Materia ID: {materia_id}, Fecha inicio: {start_date}, Fecha fin: {end_date}")
-
-    # Consultar asistencias según el rango de fechas
-    resultados = get_attendance_by_date_range(profesor_id, materia_id, start_date, end_date)
-
-    # Procesar resultados finales
-    if resultados:
-        # Convertir a DataFrame para visualizar y descargar
-        df_asistencias = pd.DataFrame(
-            resultados, 
-            columns=["ID", "Nombre del Estudiante", "Fecha", "Hora de Registro", "Estado"]
-        )
-        
-        st.write("Lista de Asistencia")
-        st.dataframe(df_asistencias)
-
-        # Agregar opción para descargar como CSV
-        csv = df_asistencias.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Descargar lista de asistencia en CSV",
-            data=csv,
-            file_name=f"asistencia_materia_{materia_id}.csv",
-            mime="text/csv"
-        )
-
-        # Generar métricas de asistencia
-        asistencia_total = df_asistencias.shape[0]
-        presentes = df_asistencias[df_asistencias["Estado"] == "Validado"].shape[0]
-        porcentaje_asistencia = (presentes / asistencia_total) * 100 if asistencia_total > 0 else 0
-        st.write(f"Total de registros: {asistencia_total}")
-        st.write(f"Presentes: {presentes}")
-        st.write(f"Porcentaje de asistencia: {porcentaje_asistencia:.2f}%")
-    else:
-        st.warning("No se encontraron registros de asistencia para la fecha o rango seleccionado.")
\ No newline at end of file
+    st.write(f"Valores para la consulta: Materia ID: {materia_id}, Grupo ID: {grupo_id}, Fecha inicio: {start_date}, Fecha fin: {end_date}")
+
+    # Métricas de asistencia calculadas en la base de datos
+    resumen = get_attendance_summary(materia_id, start_date, end_date, grupo_id=grupo_id)
+    if not resumen or not resumen.total:
+        st.warning("No se encontraron registros de asistencia para la fecha o rango seleccionado.")
+        return
+
+    # Lista de asistencia página por página
+    total_pages = (resumen.total + REPORT_PAGE_SIZE - 1) // REPORT_PAGE_SIZE
+    page = st.number_input(f"Página (de {total_pages})", min_value=1, max_value=total_pages, value=1, step=1,
+                           key='reporte_pagina')
+    resultados = get_attendance_page(materia_id, start_date, end_date, page - 1, REPORT_PAGE_SIZE,
+                                    grupo_id=grupo_id)
+    st.write("Lista de Asistencia")
+    st.dataframe(pd.DataFrame(resultados, columns=ATTENDANCE_COLUMNS))
+
+    # Exportación en flujo: el archivo se genera por bloques en disco y no en memoria
+    export_format = st.radio("Formato de descarga", ["CSV", "Excel"], horizontal=True, key='reporte_formato')
+    if st.button("Preparar descarga"):
+        descartar_archivo_reporte()
+        row_chunks = iter_attendance_by_date_range(materia_id, start_date, end_date, grupo_id=grupo_id)
+        try:
+            if export_format == "CSV":
+                path = write_chunks(csv_chunks(row_chunks), ".csv")
+                st.session_state['reporte_archivo'] = (path, f"asistencia_materia_{materia_id}.csv", "text/csv")
+            else:
+                path = write_chunks(excel_chunks(row_chunks), ".xls")
+                st.session_state['reporte_archivo'] = (path, f"asistencia_materia_{materia_id}.xls",
+                                                       "application/vnd.ms-excel")
+        except DownloadTooLarge as e:
+            st.error(f"{e}; reduce el rango de fechas.")
+
+    # El PDF queda en la caché de reportes (no se borra con la exportación) y se reutiliza sin cambios
+    if st.button("Generar PDF"):
+        clase = next((clase for clase in get_classes_by_professor(profesor_id)
+                      if (clase.materia_id, clase.grupo_id) == tuple(clase_info)), None)
+        class_name = f"{clase.materia_nombre} - {clase.grupo_nombre}" if clase else f"Materia {materia_id}"
+        st.session_state['reporte_pdf'] = generate_attendance_pdf(materia_id, grupo_id, class_name,
+                                                                  start_date, end_date)
+    if st.session_state.get('reporte_pdf'):
+        f = open_for_download(st.session_state['reporte_pdf'])
+        if f is None:
+            st.warning("El PDF ya no está disponible o supera el límite de descarga.")
+            st.session_state.pop('reporte_pdf')
+        else:
+            with f:
+                st.download_button(label="Descargar PDF", data=f, file_name=f"asistencia_materia_{materia_id}.pdf",
+                                   mime="application/pdf")
+
+    # El archivo de exportación se elimina en cuanto se descarga
+    if st.session_state.get('reporte_archivo'):
+        path, file_name, mime = st.session_state['reporte_archivo']
+        f = open_for_download(path)
+        if f is None:
+            descartar_archivo_reporte()
+        else:
+            with f:
+                st.download_button(label=f"Descargar {file_name}", data=f, file_name=file_name, mime=mime,
+                                   on_click=descartar_archivo_reporte)
+
+    # Totales del periodo desde el resumen diario (sólo el día en curso se calcula sobre Asistencias)
+    grupo_id = clase_info[1]
+    totales = get_daily_attendance_totals(start_date, end_date, materia_id, grupo_id)
+    presentes = sum(row.presentes for row in totales)
+    esperados = sum(row.esperados for row in totales)
+    porcentaje_asistencia = (presentes / esperados) * 100 if esperados > 0 else 0
+    st.write(f"Total de registros: {resumen.total}")
+    st.write(f"Presentes: {presentes}")
+    st.write(f"Retardos: {sum(row.retardos for row in totales)}")
+    st.write(f"Faltas: {sum(row.ausentes for row in totales)}")
+    st.write(f"Porcentaje de asistencia: {porcentaje_asistencia:.2f}%")
+
+    # Métricas por estudiante y tendencia semanal contra las sesiones esperadas del horario
+    estadisticas = get_student_attendance_stats(start_date, end_date, materia_id, grupo_id)
+    if estadisticas:
+        st.write("Asistencia por estudiante")
+        st.dataframe(pd.DataFrame(estadisticas, columns=[
+            "ID", "Estudiante", "Grupo", "Materia", "Sesiones", "Asistencias", "Faltas", "Asistencia (%)",
+            "Retardos", "Retardo promedio (min)", "Faltas consecutivas (máx.)"]))
+    tendencia = get_weekly_attendance_trend(start_date, end_date, materia_id, grupo_id)
+    if tendencia:
+        st.write("Asistencia por semana (%)")
+        st.line_chart(pd.DataFrame([(str(row.desde), float(row.tasa_asistencia)) for row in tendencia],
+                                   columns=["Semana", "Asistencia (%)"]).set_index("Semana"))
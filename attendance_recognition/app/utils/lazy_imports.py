@@ -0,0 +1,47 @@
+#lazy_imports.py
+import importlib
+import threading
+
+
+class LazyImport:
+    """Módulo (o atributo de un módulo) que se importa en el primer uso.
+
+    Se comporta como el objeto importado para acceso a atributos y llamadas, así que puede exportarse
+    con from utils import * sin pagar el costo de importación en los procesos o páginas que no lo usan
+    (dlib con face_recognition, pandas, fpdf).
+    """
+
+    def __init__(self, module_name, attribute=None):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    module = importlib.import_module(self._module_name)
+                    self._target = getattr(module, self._attribute) if self._attribute else module
+                target = self._target
+        return target
+
+    def __getattr__(self, name):
+        # Sólo se llama para atributos que no son del proxy
+        if name in ('_module_name', '_attribute', '_target', '_lock'):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        name = f"{self._module_name}.{self._attribute}" if self._attribute else self._module_name
+        state = "cargado" if self._target is not None else "sin cargar"
+        return f"<LazyImport {name} ({state})>"
+
+
+def is_loaded(proxy):
+    """True si el proxy ya importó su módulo."""
+    return proxy._target is not None
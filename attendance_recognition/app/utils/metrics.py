@@ -0,0 +1,226 @@
+#metrics.py
+import atexit
+import bisect
+import cProfile
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+# Instrumentación apagada por defecto; apagada, timer() devuelve un objeto vacío compartido y timed()
+# deja la función sin envolver
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+# Archivo donde se vuelcan las métricas del proceso cada METRICS_DUMP_INTERVAL segundos ({pid} = proceso)
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics-{pid}.json")
+METRICS_DUMP_INTERVAL = float(os.environ.get("METRICS_DUMP_INTERVAL", "60"))
+# Fracción de solicitudes que se perfilan con cProfile; el perfil se guarda sólo si la solicitud tardó
+# más de PROFILE_SLOW_MS
+PROFILE_SAMPLE_RATE = float(os.environ.get("METRICS_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.environ.get("METRICS_PROFILE_SLOW_MS", "1000"))
+PROFILE_DIR = os.environ.get("METRICS_PROFILE_DIR", "perfiles")
+
+# Límites superiores (ms) de las cubetas de los histogramas; la última cubeta es "más de 10 s"
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Conteo de duraciones por cubetas fijas, con suma y máximo."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        """Límite superior de la cubeta que contiene el percentil q (el máximo si es la última)."""
+        if not self.count:
+            return 0.0
+        target = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max, 3),
+            'buckets': {(f"le_{bound}" if i < len(BUCKETS_MS) else "inf"): count
+                        for i, (bound, count) in enumerate(zip(BUCKETS_MS + (None,), self.buckets))},
+        }
+
+
+class Registry:
+    """Contadores e histogramas de un proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, ms):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'since': self.started,
+                'at': time.time(),
+                'counters': dict(self.counters),
+                'timers': {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def dump(self, path):
+        """Escribe la instantánea en path de forma atómica."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+registry = Registry()
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _Profiled(_Timer):
+    """Como _Timer, pero perfila el bloque y guarda el perfil si fue lento."""
+
+    __slots__ = ('profiler',)
+
+    def __enter__(self):
+        self.profiler = cProfile.Profile()
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # Otro perfilador activo (desde Python 3.12 es uno por proceso): sólo se mide el tiempo
+            self.profiler = None
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        registry.observe(self.name, elapsed)
+        if self.profiler is None:
+            return False
+        self.profiler.disable()
+        if elapsed >= PROFILE_SLOW_MS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            self.profiler.dump_stats(os.path.join(
+                PROFILE_DIR, f"{self.name}-{int(time.time() * 1000)}-{int(elapsed)}ms.prof"))
+            registry.increment(f"{self.name}.perfiles")
+        return False
+
+
+def timer(name):
+    """Context manager que registra la duración del bloque en el histograma name."""
+    return _Timer(name) if METRICS_ENABLED else _NULL_TIMER
+
+
+def timed(name):
+    """Decorador equivalente a timer(name) alrededor de toda la función."""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profiled(name):
+    """Como timer(name), pero una fracción PROFILE_SAMPLE_RATE de las veces perfila el bloque con cProfile."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return _Profiled(name)
+    return _Timer(name)
+
+
+def increment(name, value=1):
+    if METRICS_ENABLED:
+        registry.increment(name, value)
+
+
+def observe(name, ms):
+    """Registra una duración medida por fuera (por ejemplo, entre hilos)."""
+    if METRICS_ENABLED:
+        registry.observe(name, ms)
+
+
+def metrics_path():
+    return METRICS_FILE.format(pid=os.getpid())
+
+
+def _dump_periodically():
+    while True:
+        time.sleep(METRICS_DUMP_INTERVAL)
+        try:
+            registry.dump(metrics_path())
+        except OSError:
+            pass
+
+
+if METRICS_ENABLED and METRICS_FILE:
+    threading.Thread(target=_dump_periodically, name="metrics-dump", daemon=True).start()
+    atexit.register(lambda: registry.dump(metrics_path()))
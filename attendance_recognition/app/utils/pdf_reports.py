@@ -0,0 +1,156 @@
+#pdf_reports.py
+from utils import *
+import hashlib
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from database import Session, get_classes_by_professor, iter_attendance_by_date_range
+from analytics import get_student_attendance_stats, get_daily_attendance_totals
+from reports import ATTENDANCE_COLUMNS, remove_stale_files
+
+# Directorio de los PDF generados; el nombre incluye la versión de los datos, así que se reutilizan
+# mientras no lleguen registros nuevos
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", "reportes_pdf")
+# Segundos sin usarse tras los cuales un PDF de la caché se elimina
+PDF_CACHE_MAX_AGE = int(os.environ.get("PDF_CACHE_MAX_AGE", "86400"))
+# Hilos para generar reportes en segundo plano
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "2"))
+
+# Anchos de columna (mm) de la lista de asistencia y de la tabla por estudiante
+ATTENDANCE_WIDTHS = [20, 80, 30, 30, 30]
+STATS_COLUMNS = ["Estudiante", "Sesiones", "Asist.", "Faltas", "%", "Retardos", "Racha"]
+STATS_WIDTHS = [70, 20, 20, 20, 20, 20, 20]
+ROW_HEIGHT = 6
+
+_executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf")
+
+
+def _latin1(value):
+    # Las fuentes base de fpdf sólo cubren latin-1
+    return str(value).encode('latin-1', 'replace').decode('latin-1')
+
+
+def _table_header(pdf, columns, widths):
+    pdf.set_font('Arial', 'B', 9)
+    for column, width in zip(columns, widths):
+        pdf.cell(width, ROW_HEIGHT, _latin1(column), border=1)
+    pdf.ln()
+    pdf.set_font('Arial', '', 9)
+
+
+def _table_rows(pdf, rows, columns, widths):
+    """Escribe filas y abre una página nueva (repitiendo el encabezado) cuando no caben."""
+    for row in rows:
+        if pdf.get_y() + ROW_HEIGHT > pdf.h - pdf.b_margin:
+            pdf.add_page()
+            _table_header(pdf, columns, widths)
+        for value, width in zip(row, widths):
+            pdf.cell(width, ROW_HEIGHT, _latin1(value), border=1)
+        pdf.ln()
+
+
+def render_attendance_pdf(path, title, summary_lines, student_rows, row_chunks):
+    """Genera el PDF en path: título, métricas, tabla por estudiante y la lista de asistencia.
+
+    La lista se recorre por bloques desde la base de datos y el archivo se escribe directo a disco;
+    fpdf conserva el contenido comprimible de cada página ya cerrada, no las filas.
+    """
+    pdf = FPDF(orientation='P', unit='mm', format='A4')
+    pdf.set_auto_page_break(False)
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, _latin1(title), ln=1)
+    pdf.set_font('Arial', '', 10)
+    for line in summary_lines:
+        pdf.cell(0, ROW_HEIGHT, _latin1(line), ln=1)
+    pdf.ln(4)
+
+    if student_rows:
+        pdf.set_font('Arial', 'B', 11)
+        pdf.cell(0, 8, "Asistencia por estudiante", ln=1)
+        _table_header(pdf, STATS_COLUMNS, STATS_WIDTHS)
+        _table_rows(pdf, student_rows, STATS_COLUMNS, STATS_WIDTHS)
+        pdf.ln(4)
+
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(0, 8, "Lista de asistencia", ln=1)
+    _table_header(pdf, ATTENDANCE_COLUMNS, ATTENDANCE_WIDTHS)
+    for rows in row_chunks:
+        _table_rows(pdf, rows, ATTENDANCE_COLUMNS, ATTENDANCE_WIDTHS)
+
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    pdf.output(tmp_path, 'F')
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_attendance_version(materia_id, grupo_id, start_date, end_date):
+    """Versión de los datos de una clase (materia y grupo) en un rango: (número de registros, último id)."""
+    with Session() as session:
+        row = session.execute(
+            text("""
+                SELECT COUNT(*) AS total, COALESCE(MAX(Asistencias.id), 0) AS ultimo
+                FROM Asistencias
+                JOIN Estudiantes ON Asistencias.estudiante_id = Estudiantes.id_usuario
+                WHERE Asistencias.materia_id = :materia_id AND Estudiantes.grupo_id = :grupo_id
+                  AND Asistencias.fecha BETWEEN :start_date AND :end_date
+            """),
+            {'materia_id': materia_id, 'grupo_id': grupo_id, 'start_date': start_date, 'end_date': end_date}
+        ).fetchone()
+    return row.total, row.ultimo
+
+
+def generate_attendance_pdf(materia_id, grupo_id, class_name, start_date, end_date):
+    """Ruta del PDF de asistencia de una clase y un rango de fechas, generándolo sólo si cambió."""
+    version = get_attendance_version(materia_id, grupo_id, start_date, end_date)
+    key = hashlib.sha256(repr((materia_id, grupo_id, str(start_date), str(end_date), version)).encode()).hexdigest()
+    path = os.path.join(PDF_CACHE_DIR, f"asistencia_{materia_id}_{grupo_id}_{key[:16]}.pdf")
+    if os.path.exists(path):
+        try:
+            # Marca de uso para que la limpieza conserve los reportes que se siguen pidiendo
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+    remove_stale_files(PDF_CACHE_DIR, PDF_CACHE_MAX_AGE)
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+
+    totales = get_daily_attendance_totals(start_date, end_date, materia_id, grupo_id)
+    presentes = sum(row.presentes for row in totales)
+    esperados = sum(row.esperados for row in totales)
+    summary_lines = [
+        f"Periodo: {start_date} a {end_date}",
+        f"Sesiones esperadas: {esperados}",
+        f"Presentes: {presentes}",
+        f"Retardos: {sum(row.retardos for row in totales)}",
+        f"Faltas: {sum(row.ausentes for row in totales)}",
+        f"Porcentaje de asistencia: {(presentes / esperados * 100) if esperados else 0:.2f}%",
+    ]
+    student_rows = [
+        (row.estudiante_nombre, row.esperadas, row.asistencias, row.faltas, row.tasa_asistencia, row.retardos,
+         row.racha_faltas)
+        for row in get_student_attendance_stats(start_date, end_date, materia_id, grupo_id)
+    ]
+    return render_attendance_pdf(path, f"Asistencia - {class_name}", summary_lines, student_rows,
+                                 iter_attendance_by_date_range(materia_id, start_date, end_date,
+                                                               grupo_id=grupo_id))
+
+
+def week_range(date):
+    """Lunes y domingo de la semana de la fecha indicada."""
+    start_date = date - timedelta(days=date.weekday())
+    return start_date, start_date + timedelta(days=6)
+
+
+def submit_weekly_reports(profesor_id, date):
+    """Encola en segundo plano el PDF semanal de cada clase del profesor; devuelve nombre -> Future."""
+    start_date, end_date = week_range(date)
+    futures, submitted = {}, set()
+    for clase in get_classes_by_professor(profesor_id):
+        # Hay una fila de Horarios por sesión de la semana; el reporte es uno por materia y grupo
+        if (clase.materia_id, clase.grupo_id) in submitted:
+            continue
+        submitted.add((clase.materia_id, clase.grupo_id))
+        class_name = f"{clase.materia_nombre} - {clase.grupo_nombre}"
+        futures[class_name] = _executor.submit(generate_attendance_pdf, clase.materia_id, clase.grupo_id,
+                                               class_name, start_date, end_date)
+    return futures
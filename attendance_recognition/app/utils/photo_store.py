@@ -0,0 +1,46 @@
+#photo_store.py
+import hashlib
+import os
+import tempfile
+
+# Directorio de los archivos de fotografías (puede ser un volumen compartido entre procesos)
+PHOTO_STORE_DIR = os.environ.get('PHOTO_STORE_DIR', 'photos')
+# Permisos de los archivos: NamedTemporaryFile los crea con 0600 y otros procesos del despliegue los leen
+FILE_MODE = 0o644
+
+
+class PhotoStore:
+    """Almacén de fotografías como archivos binarios direccionados por su hash SHA-256.
+
+    La base de datos sólo guarda el hash (FotografiasObjetos); el contenido se escribe una vez en
+    <raíz>/<ab>/<cd>/<hash>, sin recodificar, y las fotografías idénticas se deduplican solas.
+    """
+
+    def __init__(self, root=PHOTO_STORE_DIR):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Guarda los bytes de una fotografía y devuelve su hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp_file:
+                tmp_file.write(data)
+            os.chmod(tmp_file.name, FILE_MODE)
+            os.replace(tmp_file.name, path)
+        return digest
+
+    def open(self, digest):
+        """Abre la fotografía para lectura en flujo (el llamador debe cerrarla)."""
+        return open(self.path(digest), 'rb')
+
+    def read(self, digest):
+        with self.open(digest) as f:
+            return f.read()
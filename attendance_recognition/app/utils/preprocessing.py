@@ -1,6 +1,10 @@
 #preprocessing.py
 from utils import *
-from database import (save_photos)
+from database import (save_photo_refs)
+from face_recognition_utils import enroll_identity
+from photo_store import PhotoStore
+
+photo_store = PhotoStore()
 
 def capture_or_upload_photos(student_id):
     st.write("Sube tres fotografías para el registro.")
@@ -10,20 +14,18 @@ def capture_or_upload_photos(student_id):
     image2 = st.file_uploader("Sube la segunda imagen", type=["jpg", "jpeg", "png"], key="photo2")
     image3 = st.file_uploader("Sube la tercera imagen", type=["jpg", "jpeg", "png"], key="photo3")
 
-    # Convertir imágenes a base64 si están disponibles
     if image1 and image2 and image3:
-        img_data1 = convert_to_base64(image1)
-        img_data2 = convert_to_base64(image2)
-        img_data3 = convert_to_base64(image3)
+        images = [image_file.getvalue() for image_file in (image1, image2, image3)]
 
-        # Guardar en la base de datos
-        save_photos(student_id, img_data1, img_data2, img_data3)
+        # Guardar los bytes originales en el almacén de fotografías y sólo sus referencias en la base de datos
+        refs = []
+        for image_file, data in zip((image1, image2, image3), images):
+            refs.append((photo_store.put(data), len(data), image_file.type or "image/jpeg"))
+        save_photo_refs(student_id, refs)
         st.success("Fotografías guardadas exitosamente.")
 
-def convert_to_base64(image_file):
-    # Leer y convertir la imagen a base64
-    image = Image.open(image_file)
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG")
-    img_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
-    return img_str
\ No newline at end of file
+        # Codificar las fotografías y agregarlas al modelo en vivo, sin reentrenar
+        if enroll_identity(images, student_id):
+            st.success("Rostro registrado: ya puedes tomar asistencia.")
+        else:
+            st.warning("No se detectó un rostro en las fotografías; intenta con otras imágenes.")
@@ -0,0 +1,107 @@
+#reports.py
+from utils import *
+from xml.sax.saxutils import escape
+
+ATTENDANCE_COLUMNS = ["ID", "Nombre del Estudiante", "Fecha", "Hora de Registro", "Estado"]
+
+
+def csv_chunks(row_chunks, columns=ATTENDANCE_COLUMNS):
+    """Genera un CSV en bloques de bytes a partir de bloques de filas, sin materializar el archivo."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in row_chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def excel_chunks(row_chunks, columns=ATTENDANCE_COLUMNS, sheet_name="Asistencia"):
+    """Genera una hoja de cálculo XML de Excel (SpreadsheetML) en bloques de bytes."""
+    def cell(value):
+        kind = "Number" if isinstance(value, (int, float)) and not isinstance(value, bool) else "String"
+        return f'<Cell><Data ss:Type="{kind}">{escape(str(value))}</Data></Cell>'
+
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<?mso-application progid="Excel.Sheet"?>\n'
+        '<Workbook xmlns="urn:schemas-microsoft-com:office:spreadsheet" '
+        'xmlns:ss="urn:schemas-microsoft-com:office:spreadsheet">\n'
+        f'<Worksheet ss:Name="{escape(sheet_name)}"><Table>\n'
+        '<Row>' + ''.join(cell(column) for column in columns) + '</Row>\n'
+    ).encode('utf-8')
+    for rows in row_chunks:
+        yield ''.join('<Row>' + ''.join(cell(value) for value in row) + '</Row>\n' for row in rows).encode('utf-8')
+    yield '</Table></Worksheet></Workbook>\n'.encode('utf-8')
+
+
+# Directorio de los archivos de exportación; los que quedan de sesiones abandonadas se eliminan después
+# de EXPORT_MAX_AGE segundos
+EXPORT_DIR = os.environ.get("REPORT_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "reportes_exportados"))
+EXPORT_MAX_AGE = int(os.environ.get("REPORT_EXPORT_MAX_AGE", "3600"))
+# Tamaño máximo de un archivo que se ofrece para descarga: st.download_button lo carga completo en memoria
+DOWNLOAD_MAX_BYTES = int(os.environ.get("DOWNLOAD_MAX_MB", "50")) * 2**20
+
+
+class DownloadTooLarge(ValueError):
+    """El archivo supera DOWNLOAD_MAX_BYTES."""
+
+
+def remove_stale_files(directory, max_age):
+    """Elimina los archivos de directory modificados hace más de max_age segundos."""
+    limit = time_module.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def write_chunks(chunks, suffix, max_bytes=DOWNLOAD_MAX_BYTES):
+    """Escribe los bloques en un archivo temporal y devuelve su ruta (la memoria se mantiene constante).
+
+    Si el archivo supera max_bytes se elimina y se lanza DownloadTooLarge.
+    """
+    remove_stale_files(EXPORT_DIR, EXPORT_MAX_AGE)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    size = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=EXPORT_DIR, delete=False) as tmp_file:
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DownloadTooLarge(f"El archivo supera {max_bytes // 2**20} MB")
+                tmp_file.write(chunk)
+        except BaseException:
+            tmp_file.close()
+            os.remove(tmp_file.name)
+            raise
+    return tmp_file.name
+
+
+def open_for_download(path, max_bytes=DOWNLOAD_MAX_BYTES):
+    """Abre el archivo para st.download_button; None si no existe o supera max_bytes."""
+    try:
+        if os.path.getsize(path) > max_bytes:
+            return None
+        return open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+
+# Columnas del CSV de carga masiva de asistencias (database.ingest_attendance)
+ATTENDANCE_IMPORT_COLUMNS = ["estudiante_id", "materia_id", "fecha", "hora_registro"]
+
+
+def read_attendance_csv(file):
+    """Lee en flujo los registros (estudiante_id, materia_id, fecha, hora_registro) de un CSV con encabezado."""
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield tuple((row.get(column) or '').strip() for column in ATTENDANCE_IMPORT_COLUMNS)
@@ -0,0 +1,99 @@
+#rollup.py
+import os
+from datetime import datetime
+
+import pytz
+from sqlalchemy import text
+
+# Minutos de tolerancia después de hora_inicio antes de considerar un registro como retardo
+LATE_TOLERANCE_MINUTES = int(os.environ.get("LATE_TOLERANCE_MINUTES", "10"))
+# Zona horaria de la escuela: define qué día está en curso y cuáles ya quedaron cerrados
+TIMEZONE = 'America/Mexico_City'
+
+
+def local_today():
+    """Fecha de hoy en la zona horaria de la escuela (no la del servidor)."""
+    return datetime.now(pytz.timezone(TIMEZONE)).date()
+
+# Sesiones esperadas (días de FechaDias cuyo día coincide con el horario, una por grupo/materia/fecha)
+# cruzadas con los estudiantes de cada grupo y con sus registros de asistencia. Se apoya en los índices
+# de la migración 003 sobre Asistencias(materia_id, fecha) y (estudiante_id, materia_id, fecha).
+MARKED_SESSIONS_CTE = """
+    WITH sesiones AS (
+        SELECT Horarios.grupo_id, Horarios.materia_id, FechaDias.fecha, MIN(Horarios.hora_inicio) AS hora_inicio
+        FROM Horarios
+        JOIN FechaDias ON FechaDias.dia = Horarios.dia
+        WHERE FechaDias.fecha BETWEEN :start_date AND :end_date
+          {filters}
+        GROUP BY Horarios.grupo_id, Horarios.materia_id, FechaDias.fecha
+    ),
+    marcadas AS (
+        SELECT Estudiantes.id_usuario AS estudiante_id, sesiones.grupo_id, sesiones.materia_id, sesiones.fecha,
+               sesiones.hora_inicio, Asistencias.hora_registro,
+               CASE WHEN Asistencias.id IS NULL THEN 0 ELSE 1 END AS asistio,
+               CASE WHEN TIME_TO_SEC(Asistencias.hora_registro) > TIME_TO_SEC(sesiones.hora_inicio) + :tolerancia
+                    THEN 1 ELSE 0 END AS retardo
+        FROM sesiones
+        JOIN Estudiantes ON Estudiantes.grupo_id = sesiones.grupo_id
+        LEFT JOIN Asistencias ON Asistencias.estudiante_id = Estudiantes.id_usuario
+                             AND Asistencias.materia_id = sesiones.materia_id
+                             AND Asistencias.fecha = sesiones.fecha
+    )
+"""
+
+# Conteos por (grupo, materia, fecha) a partir de las sesiones marcadas
+DAILY_COUNTS_SELECT = """
+    SELECT grupo_id, materia_id, fecha,
+           SUM(asistio) AS presentes,
+           SUM(retardo) AS retardos,
+           COUNT(*) - SUM(asistio) AS ausentes,
+           COUNT(*) AS esperados
+    FROM marcadas
+    GROUP BY grupo_id, materia_id, fecha
+"""
+
+
+def marked_sessions_params(start_date, end_date, materia_id=None, grupo_id=None):
+    """Filtros adicionales para MARKED_SESSIONS_CTE y sus parámetros."""
+    filters, params = [], {'start_date': start_date, 'end_date': end_date, 'tolerancia': LATE_TOLERANCE_MINUTES * 60}
+    if materia_id is not None:
+        filters.append("AND Horarios.materia_id = :materia_id")
+        params['materia_id'] = materia_id
+    if grupo_id is not None:
+        filters.append("AND Horarios.grupo_id = :grupo_id")
+        params['grupo_id'] = grupo_id
+    return " ".join(filters), params
+
+
+def rollup_upsert_sql(dialect_name):
+    """Suma :presentes registros (:retardos de ellos tarde) al resumen diario; la primera vez toma el
+    total de estudiantes del grupo como sesiones esperadas."""
+    greatest = "MAX" if dialect_name == "sqlite" else "GREATEST"
+    on_duplicate = ("ON CONFLICT (grupo_id, materia_id, fecha) DO UPDATE SET"
+                    if dialect_name == "sqlite" else "ON DUPLICATE KEY UPDATE")
+    # ausentes se asigna antes que presentes: MySQL evalúa las asignaciones en orden
+    return f"""
+        INSERT INTO ResumenAsistenciaDiaria (grupo_id, materia_id, fecha, presentes, retardos, ausentes, esperados)
+        SELECT :grupo_id, :materia_id, :fecha, :presentes, :retardos,
+               {greatest}(COUNT(*) - :presentes, 0), {greatest}(COUNT(*), :presentes)
+        FROM Estudiantes
+        WHERE Estudiantes.grupo_id = :grupo_id
+        {on_duplicate}
+            ausentes = {greatest}(ausentes - :presentes, 0),
+            presentes = presentes + :presentes,
+            retardos = retardos + :retardos
+    """
+
+
+def rebuild_daily_rollup(connection, start_date, end_date):
+    """Recalcula desde Asistencias el resumen diario de un rango de fechas (incluye días sin registros)."""
+    filters, params = marked_sessions_params(start_date, end_date)
+    connection.execute(
+        text("DELETE FROM ResumenAsistenciaDiaria WHERE fecha BETWEEN :start_date AND :end_date"), params
+    )
+    result = connection.execute(
+        text("INSERT INTO ResumenAsistenciaDiaria (grupo_id, materia_id, fecha, presentes, retardos, ausentes, esperados) "
+             + MARKED_SESSIONS_CTE.format(filters=filters) + DAILY_COUNTS_SELECT),
+        params
+    )
+    return result.rowcount
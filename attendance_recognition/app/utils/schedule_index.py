@@ -0,0 +1,85 @@
+#schedule_index.py
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+from datetime import time, timedelta
+
+# Clase del horario con inicio y fin en segundos desde la medianoche (hora_inicio/hora_fin conservan el
+# valor original para mostrarlo)
+ClaseHorario = namedtuple(
+    'ClaseHorario', ['grupo_id', 'materia_id', 'materia_nombre', 'hora_inicio', 'hora_fin', 'inicio', 'fin']
+)
+
+
+def to_seconds(value):
+    """Convierte una hora de MySQL (timedelta), datetime.time o texto 'HH:MM[:SS]' a segundos."""
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    parts = [int(float(part)) for part in str(value).split(':')]
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+
+
+class ScheduleIndex:
+    """Índice de intervalos de Horarios por grupo y día, construido una sola vez.
+
+    Responde "clase en curso del grupo a la hora t" y "grupos en clase a la hora t" con búsqueda
+    binaria, sin convertir cadenas en cada consulta. early_grace y late_grace (segundos) amplían la
+    ventana de cada clase antes del inicio y después del fin.
+    """
+
+    def __init__(self, rows, early_grace=0, late_grace=0):
+        self.early_grace = early_grace
+        self.late_grace = late_grace
+        by_group = {}
+        for row in rows:
+            entry = ClaseHorario(row.grupo_id, row.materia_id, row.materia_nombre, row.hora_inicio, row.hora_fin,
+                                 to_seconds(row.hora_inicio), to_seconds(row.hora_fin))
+            by_group.setdefault((row.grupo_id, row.dia), []).append(entry)
+
+        # Por (grupo, día): inicios de ventana ordenados, el máximo acumulado de los fines de ventana (para
+        # dejar de retroceder en cuanto ninguna clase anterior puede seguir abierta) y sus clases
+        self._classes = {}
+        events_by_day = {}
+        for key, entries in by_group.items():
+            entries.sort(key=lambda entry: entry.inicio)
+            ends = list(accumulate((entry.fin + late_grace for entry in entries), max))
+            self._classes[key] = ([entry.inicio - early_grace for entry in entries], ends, entries)
+            for entry in entries:
+                events_by_day.setdefault(key[1], []).append(
+                    (entry.inicio - early_grace, entry.fin + late_grace + 1, entry.grupo_id))
+
+        # Por día: fronteras de los segmentos elementales y el conjunto de grupos activos en cada uno
+        self._segments = {}
+        for day, windows in events_by_day.items():
+            boundaries = sorted({point for start, end, _ in windows for point in (start, end)})
+            active = [frozenset(group for start, end, group in windows if start <= point < end)
+                      for point in boundaries]
+            self._segments[day] = (boundaries, active)
+
+    def current_class(self, group_id, day, current_time):
+        """Clase del grupo en curso a la hora indicada, o None.
+
+        Si por las tolerancias se traslapan dos clases, gana la que está dentro de su horario real.
+        """
+        starts, ends, entries = self._classes.get((group_id, day), ((), (), ()))
+        t = to_seconds(current_time)
+        # Todas las ventanas que empiezan antes de t, de la más reciente a la más antigua, mientras alguna
+        # anterior pueda terminar después de t
+        matches = []
+        position = bisect_right(starts, t) - 1
+        while position >= 0 and ends[position] >= t:
+            if t <= entries[position].fin + self.late_grace:
+                matches.append(entries[position])
+            position -= 1
+        for entry in matches:
+            if entry.inicio <= t <= entry.fin:
+                return entry
+        return matches[0] if matches else None
+
+    def groups_in_session(self, day, current_time):
+        """Conjunto de grupos que tienen clase (con tolerancias) a la hora indicada."""
+        boundaries, active = self._segments.get(day, ((), ()))
+        position = bisect_right(boundaries, to_seconds(current_time)) - 1
+        return active[position] if position >= 0 else frozenset()
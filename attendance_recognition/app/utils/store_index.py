@@ -0,0 +1,69 @@
+#store_index.py
+import os
+import threading
+import time
+
+from embedding_index import EmbeddingIndex, SegmentedIndex
+from embedding_store import load_store, list_deltas, read_header
+
+# Intentos de carga cuando una compactación elimina un delta entre el listado y la lectura
+LOAD_ATTEMPTS = 3
+
+
+def load_segment(path, dtype='float32'):
+    """Construye el índice de un archivo .emb; en float32 la matriz mapeada se usa sin copiarla."""
+    matrix, sq_norms, labels, version = load_store(path)
+    return EmbeddingIndex(matrix, labels, sq_norms=sq_norms, dtype=dtype, exact=matrix), version
+
+
+def load_index(path, dtype='float32'):
+    """Construye el índice a partir de la base y sus deltas; devuelve (índice, versión de la base, última versión)."""
+    for attempt in range(LOAD_ATTEMPTS):
+        try:
+            segments, base_version = [], 0
+            if os.path.exists(path):
+                base, base_version = load_segment(path, dtype)
+                segments.append(base)
+
+            version = base_version
+            for version, delta_path in list_deltas(path, base_version):
+                segments.append(load_segment(delta_path, dtype)[0])
+            return SegmentedIndex(segments), base_version, version
+        except FileNotFoundError:
+            # La base nueva ya incluye el delta eliminado: se vuelve a listar
+            if attempt == LOAD_ATTEMPTS - 1:
+                raise
+
+
+class StoreIndex:
+    """Índice de un almacén .emb (base + deltas de inscripción) que se mantiene al día.
+
+    Lo comparten la app y el servicio de inferencia: se carga en el primer refresh() y después sólo
+    incorpora los deltas nuevos, o recarga todo si la base fue reemplazada (compactación o entrenamiento).
+    """
+
+    def __init__(self, path, dtype='float32', refresh_interval=5.0):
+        self.path = path
+        self.dtype = dtype
+        self.refresh_interval = refresh_interval
+        self.index, self.base_version, self.version = None, 0, 0
+        self._lock = threading.Lock()
+        self._last_refresh = time.monotonic()
+
+    def refresh(self, force=False):
+        """Incorpora los deltas nuevos del almacén (como máximo cada refresh_interval segundos)."""
+        if self.index is not None and not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            base_version = read_header(self.path)['version'] if os.path.exists(self.path) else 0
+            if self.index is None or base_version != self.base_version:
+                self.index, self.base_version, self.version = load_index(self.path, self.dtype)
+                return
+            try:
+                for version, delta_path in list_deltas(self.path, self.version):
+                    self.index = self.index.with_segment(load_segment(delta_path, self.dtype)[0])
+                    self.version = version
+            except FileNotFoundError:
+                # Una compactación eliminó el delta después de listarlo: la base cambió, se recarga todo
+                self.index, self.base_version, self.version = load_index(self.path, self.dtype)
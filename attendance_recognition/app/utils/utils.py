@@ -1,10 +1,18 @@
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 import streamlit as st
 import numpy as np
 from PIL import Image
 import pickle
+import os
+import threading
+import functools
+from collections import OrderedDict, namedtuple
+import time as time_module
 import io
-import face_recognition
+import csv
+import tempfile
+import json
+import urllib.request
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine, text
 from datetime import time
@@ -13,5 +21,9 @@ import pytz
 import re
 import base64
 from io import BytesIO
-import pandas as pd
-from fpdf import FPDF
\ No newline at end of file
+from lazy_imports import LazyImport
+
+# Pila de reconocimiento (dlib) y de reportes: se importan en el primer uso
+face_recognition = LazyImport('face_recognition')
+pd = LazyImport('pandas')
+FPDF = LazyImport('fpdf', 'FPDF')
@@ -0,0 +1,30 @@
+#warmup.py
+from utils import *
+from database import warm_up_database
+from face_recognition_utils import warm_up_recognition
+
+# Con WARM_UP_ON_START=1 cada proceso de la app se calienta al arrancar, en segundo plano
+WARM_UP_ON_START = os.environ.get("WARM_UP_ON_START", "0") == "1"
+
+
+def warm_up(recognition=True, database=True):
+    """Carga por adelantado lo que pagaría la primera solicitud; devuelve los segundos de cada etapa."""
+    stages = []
+    if database:
+        stages.append(("base de datos", warm_up_database))
+    if recognition:
+        stages.append(("reconocimiento", warm_up_recognition))
+    timings = {}
+    for name, stage in stages:
+        start = time_module.perf_counter()
+        stage()
+        timings[name] = time_module.perf_counter() - start
+    return timings
+
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """Lanza warm_up una sola vez por proceso en un hilo; las sesiones no esperan a que termine."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -1,4 +1,5 @@
 import os
+import sys
 import cv2
 import numpy as np
 import face_recognition
@@ -10,6 +11,21 @@ from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_sc
 from flask import Flask, request, jsonify
 import boto3
 import tempfile
+import sqlite3
+import threading
+import queue
+import time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+# Módulos compartidos con la aplicación (formato de codificaciones)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_store import write_store, load_store, FILE_MODE
+from encoding_cache import EncodingCache
+from embedding_index import EmbeddingIndex, EMBEDDING_DIM, is_match
+from store_index import StoreIndex
+from detection import FaceDetector
+from metrics import METRICS_ENABLED, registry, timer, increment
 
 # Inicializar cliente de S3
 s3 = boto3.client('s3')
@@ -19,9 +35,12 @@ class S3Handler:
         self.bucket_name = bucket_name
 
     def list_folder_contents(self, folder_prefix):
-        """Lista los objetos en una carpeta de un bucket de S3."""
-        response = s3.list_objects_v2(Bucket=self.bucket_name, Prefix=folder_prefix)
-        return response.get('Contents', [])
+        """Lista todos los objetos en una carpeta de un bucket de S3, recorriendo todas las páginas."""
+        paginator = s3.get_paginator('list_objects_v2')
+        contents = []
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=folder_prefix):
+            contents.extend(page.get('Contents', []))
+        return contents
 
     def download_file(self, s3_key):
         """Descarga un archivo de S3 y devuelve su ruta local temporal."""
@@ -29,16 +48,108 @@ class S3Handler:
             s3.download_fileobj(self.bucket_name, s3_key, tmp_file)
             return tmp_file.name
 
+    def download_to(self, s3_key, local_path):
+        """Descarga un archivo de S3 a una ruta local fija, reemplazándolo de forma atómica."""
+        directory = os.path.dirname(os.path.abspath(local_path))
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp_file:
+            s3.download_fileobj(self.bucket_name, s3_key, tmp_file)
+        os.chmod(tmp_file.name, FILE_MODE)
+        os.replace(tmp_file.name, local_path)
+        return local_path
+
     def upload_file(self, local_path, s3_key):
         """Sube un archivo local a S3."""
         s3.upload_file(local_path, self.bucket_name, s3_key)
 
+def encode_image_file(image_path, detector):
+    """Procesa una imagen y retorna (ubicaciones, codificaciones) de sus caras.
+
+    Es una función de módulo para poder ejecutarla en un ProcessPoolExecutor.
+    """
+    image = face_recognition.load_image_file(image_path)
+    return detector.detect_and_encode(image)
+
+def person_label(person):
+    """Etiqueta de una carpeta de S3 (<prefijo>/<ID de usuario>/foto.jpg): el ID entero del estudiante.
+
+    Lanza ValueError si la carpeta no es un ID: el almacén sólo admite etiquetas enteras.
+    """
+    if not str(person).isdigit():
+        raise ValueError(f"La carpeta {person!r} no es un ID de usuario")
+    return int(person)
+
+def is_user_folder(key):
+    """True si la clave de S3 está dentro de una carpeta con ID de usuario."""
+    return os.path.basename(os.path.dirname(key)).isdigit()
+
+# Representación del índice en memoria del servicio (float32, float16 o int8, ver embedding_index)
+INDEX_DTYPE = os.environ.get('EMBEDDING_INDEX_DTYPE', 'float32')
+
+# Almacén de la aplicación (face_recognition_encodings.emb y sus deltas en un volumen compartido); si está
+# configurado, el servicio atiende desde él e incorpora las inscripciones nuevas en lugar de usar model.emb de S3
+SERVICE_STORE_PATH = os.environ.get('RECOGNITION_STORE_PATH')
+# Cada cuántos segundos se revisa si hay deltas nuevos en el almacén compartido
+SERVICE_REFRESH_INTERVAL = float(os.environ.get('RECOGNITION_REFRESH_INTERVAL', 5.0))
+
+class TrainingCheckpoint:
+    """Resultados por imagen (clave + ETag de S3) en SQLite, para reanudar o repetir un entrenamiento
+    procesando sólo las imágenes nuevas o modificadas."""
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "key TEXT PRIMARY KEY, etag TEXT NOT NULL, person TEXT NOT NULL, encoding BLOB)"
+        )
+
+    def processed(self):
+        """Devuelve un diccionario clave -> ETag de las imágenes ya procesadas."""
+        return dict(self.connection.execute("SELECT key, etag FROM images"))
+
+    def record(self, rows):
+        """Guarda (clave, etag, persona, codificación o None) y confirma la transacción."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO images (key, etag, person, encoding) VALUES (?, ?, ?, ?)",
+            [(key, etag, person, None if encoding is None else np.asarray(encoding, dtype=np.float64).tobytes())
+             for key, etag, person, encoding in rows]
+        )
+        self.connection.commit()
+
+    def encodings_for(self, keys):
+        """Matriz float32 de codificaciones y etiquetas de las claves indicadas que tienen cara, en orden de clave.
+
+        Las filas se acumulan en un solo búfer float32 (no una lista de arreglos float64) y cada persona
+        aporta un único objeto etiqueta, compartido por todas sus muestras.
+        """
+        keys = set(keys)
+        buffer, names, labels = bytearray(), [], {}
+        for key, person, blob in self.connection.execute(
+                "SELECT key, person, encoding FROM images WHERE encoding IS NOT NULL ORDER BY key"):
+            if key in keys:
+                buffer += np.frombuffer(blob, dtype=np.float64).astype(np.float32).tobytes()
+                if person not in labels:
+                    labels[person] = person_label(person)
+                names.append(labels[person])
+        return np.frombuffer(buffer, dtype=np.float32).reshape(len(names), EMBEDDING_DIM), names
+
+    def close(self):
+        self.connection.close()
+
 class FacialRecognitionSystem:
-    def __init__(self, model_path=None, s3_handler=None):
+    def __init__(self, model_path=None, s3_handler=None, cache_path="encoding_cache.db"):
         self.known_face_encodings = []
         self.known_face_names = []
-        self.model_path = model_path
+        self.model_version = 0
+        # Almacén base + deltas compartido con la aplicación (use_store); None si se usa el modelo de S3
+        self.store = None
+        # Ruta local del archivo .emb; se mapea en memoria y se comparte entre procesos
+        self.model_path = model_path or "model.emb"
         self.s3_handler = s3_handler
+        # Caché de codificaciones por contenido de la imagen, compartida con la inscripción
+        self.encoding_cache = EncodingCache(cache_path)
+        # Las fotos de entrenamiento tienen una sola persona: se conserva la cara más grande
+        self.training_detector = FaceDetector(largest_only=True)
+        self.detector = FaceDetector()
 
         # Configura MLflow para usar un URI de S3 para el tracking
         mlflow.set_tracking_uri("sqlite:///mlflow.db")
@@ -46,50 +157,97 @@ class FacialRecognitionSystem:
 
     def process_image(self, image_path):
         """Procesa una imagen y retorna sus codificaciones faciales."""
-        image = face_recognition.load_image_file(image_path)
-        face_locations = face_recognition.face_locations(image, model="hog")
-        if not face_locations:
-            return None
-        face_encodings = face_recognition.face_encodings(image, face_locations)
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+        _, face_encodings = self.encoding_cache.get_or_compute(
+            image_bytes, self.training_detector.settings, lambda: encode_image_file(image_path, self.training_detector))
         return face_encodings[0] if face_encodings else None
 
-    def prepare_data_from_s3(self, folder_prefix):
-        """Prepara los datos de entrenamiento desde S3."""
+    def prepare_data_from_s3(self, folder_prefix, checkpoint_path="training_checkpoint.db",
+                             download_workers=16, encode_workers=None, chunk_size=512):
+        """Prepara los datos de entrenamiento desde S3.
+
+        Las descargas se hacen en un pool de hilos y la detección/codificación en un pool de procesos
+        (todos los núcleos por defecto). Los resultados se guardan por lote en el checkpoint, de modo que
+        una ejecución interrumpida o repetida sólo procesa las imágenes nuevas o modificadas.
+        """
         print("Iniciando preparación de datos desde S3...")
+        objects = self.s3_handler.list_folder_contents(folder_prefix)
+        # Las carpetas con nombres (entrenamientos anteriores) no tienen ID de usuario y se descartan
+        rejected = sorted({os.path.dirname(obj['Key']) for obj in objects if not is_user_folder(obj['Key'])})
+        for folder in rejected:
+            print(f"✗ Carpeta sin ID de usuario, se omite: {folder}")
+        objects = [obj for obj in objects if is_user_folder(obj['Key'])]
+        checkpoint = TrainingCheckpoint(checkpoint_path)
+        try:
+            processed = checkpoint.processed()
+            pending = [obj for obj in objects if processed.get(obj['Key']) != obj['ETag']]
+            print(f"{len(objects)} imágenes en S3, {len(pending)} nuevas o modificadas")
 
-        for obj in self.s3_handler.list_folder_contents(folder_prefix):
-            file_key = obj['Key']
-            person_name = os.path.basename(os.path.dirname(file_key))
+            with ThreadPoolExecutor(download_workers) as downloads, ProcessPoolExecutor(encode_workers) as encoders:
+                for start in range(0, len(pending), chunk_size):
+                    chunk = pending[start:start + chunk_size]
+                    download_futures = {downloads.submit(self.s3_handler.download_file, obj['Key']): obj
+                                        for obj in chunk}
 
-            # Descarga la imagen desde S3
-            temp_image_path = self.s3_handler.download_file(file_key)
-            try:
-                face_encoding = self.process_image(temp_image_path)
-                if face_encoding is not None:
-                    self.known_face_encodings.append(face_encoding)
-                    self.known_face_names.append(person_name)
-                    print(f"✓ Procesada imagen para {person_name}")
-                else:
-                    print(f"✗ No se encontró cara en: {file_key}")
-            except Exception as e:
-                print(f"Error procesando {file_key}: {str(e)}")
-            finally:
-                os.remove(temp_image_path)
+                    # La codificación de cada imagen empieza en cuanto termina su descarga, salvo que
+                    # su contenido ya esté en la caché de codificaciones
+                    encode_futures = {}
+                    rows = []
+                    for future in as_completed(download_futures):
+                        obj = download_futures[future]
+                        try:
+                            temp_image_path = future.result()
+                            with open(temp_image_path, "rb") as f:
+                                cache_key = EncodingCache.make_key(f.read(), self.training_detector.settings)
+                        except Exception as e:
+                            print(f"Error descargando {obj['Key']}: {str(e)}")
+                            continue
+                        cached = self.encoding_cache.get(cache_key)
+                        if cached is not None:
+                            os.remove(temp_image_path)
+                            person_name = os.path.basename(os.path.dirname(obj['Key']))
+                            rows.append((obj['Key'], obj['ETag'], person_name, cached[1][0] if cached[1] else None))
+                            continue
+                        encode_futures[encoders.submit(encode_image_file, temp_image_path, self.training_detector)] = (obj, temp_image_path, cache_key)
+
+                    for future in as_completed(encode_futures):
+                        obj, temp_image_path, cache_key = encode_futures[future]
+                        file_key = obj['Key']
+                        person_name = os.path.basename(os.path.dirname(file_key))
+                        try:
+                            face_locations, face_encodings = future.result()
+                            self.encoding_cache.put(cache_key, face_locations, face_encodings)
+                            face_encoding = face_encodings[0] if face_encodings else None
+                            rows.append((file_key, obj['ETag'], person_name, face_encoding))
+                            if face_encoding is not None:
+                                print(f"✓ Procesada imagen para {person_name}")
+                            else:
+                                print(f"✗ No se encontró cara en: {file_key}")
+                        except Exception as e:
+                            print(f"Error procesando {file_key}: {str(e)}")
+                        finally:
+                            os.remove(temp_image_path)
+                    checkpoint.record(rows)
+
+            # El modelo se arma con todas las imágenes vigentes en S3, procesadas en esta u otras ejecuciones
+            self.known_face_encodings, self.known_face_names = checkpoint.encodings_for(
+                obj['Key'] for obj in objects)
+        finally:
+            checkpoint.close()
 
         print(f"Procesamiento completado. Total de caras encontradas: {len(self.known_face_encodings)}")
         return len(self.known_face_encodings)
 
-    def save_model_to_s3(self, s3_model_path):
-        """Guarda el modelo en un bucket de S3."""
-        data = {
-            "encodings": self.known_face_encodings,
-            "names": self.known_face_names
-        }
+    def save_model_to_s3(self, s3_model_path, version=None):
+        """Guarda el modelo en un bucket de S3 en formato .emb versionado."""
+        if version is None:
+            version = int(datetime.now().strftime("%Y%m%d%H%M%S"))
 
         # Crear archivo temporal para guardar el modelo
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            pickle.dump(data, temp_file)
+        with tempfile.NamedTemporaryFile(suffix=".emb", delete=False) as temp_file:
             temp_file_path = temp_file.name
+        write_store(temp_file_path, self.known_face_encodings, self.known_face_names, version=version)
 
         # Subir el archivo a S3
         self.s3_handler.upload_file(temp_file_path, s3_model_path)
@@ -97,56 +255,193 @@ class FacialRecognitionSystem:
 
     def load_model(self, s3_model_path):
         """Carga las codificaciones y nombres desde un bucket en S3."""
-        # Descargar archivo desde S3 a una ruta temporal
-        local_model_path = self.s3_handler.download_file(s3_model_path)
+        # Descargar el archivo a la ruta local del modelo; se conserva para poder mapearlo en memoria
+        local_model_path = self.s3_handler.download_to(s3_model_path, self.model_path)
 
-        # Cargar el modelo desde el archivo temporal
-        with open(local_model_path, 'rb') as f:
-            data = pickle.load(f)
+        # Cargar el modelo sin copiar la matriz de codificaciones
+        matrix, _, names, version = load_store(local_model_path)
+        self.known_face_encodings = matrix
+        self.known_face_names = names
+        self.model_version = version
 
-        # Asignar los datos cargados a las variables correspondientes
-        self.known_face_encodings = data["encodings"]
-        self.known_face_names = data["names"]
+    def use_store(self, path, refresh_interval=SERVICE_REFRESH_INTERVAL):
+        """Atiende desde un almacén base + deltas (el de la aplicación) en lugar del modelo de S3."""
+        self.store = StoreIndex(path, dtype=INDEX_DTYPE, refresh_interval=refresh_interval)
+        self.store.refresh(force=True)
+        self.model_version = self.store.version
 
-        # Eliminar archivo temporal después de cargar el modelo
-        os.remove(local_model_path)
+    @property
+    def includes_deltas(self):
+        """Si el índice incluye las inscripciones posteriores al último entrenamiento."""
+        return self.store is not None
+
+    def get_index(self):
+        """Índice vectorizado de las codificaciones conocidas; se reconstruye si cambiaron."""
+        if self.store is not None:
+            with timer("service.refresh_index"):
+                self.store.refresh()
+            self.model_version = self.store.version
+            return self.store.index
+        key = (id(self.known_face_encodings), len(self.known_face_encodings))
+        if getattr(self, "_index_key", None) != key:
+            self._index = EmbeddingIndex(self.known_face_encodings, self.known_face_names, dtype=INDEX_DTYPE,
+                                         exact=self.known_face_encodings)
+            self._index_key = key
+        return self._index
+
+    def predict_batch(self, images, tolerance=0.6, k=1):
+        """Reconoce todas las caras de varias imágenes (rutas o arreglos RGB).
+
+        Devuelve, por imagen, una lista de diccionarios con person (ID de usuario o None), confidence,
+        distance y box (top, right, bottom, left); las caras de todas las imágenes se comparan en una sola
+        búsqueda.
+        Cada identidad se acepta con su propio umbral (acotado por tolerance). Con k > 1 se agregan en
+        matches las k identidades más cercanas de cada cara como [persona, distancia, umbral].
+        """
+        images = [face_recognition.load_image_file(image) if isinstance(image, str) else image for image in images]
+        detections = self.detector.detect_and_encode_batch(images)
+
+        all_encodings = [encoding for _, face_encodings in detections for encoding in face_encodings]
+        with timer("service.match"):
+            all_matches = iter(self.get_index().match(all_encodings, k=k, tolerance=tolerance)
+                               if all_encodings else [])
+
+        results = []
+        for face_locations, face_encodings in detections:
+            faces = []
+            for location, matches in zip(face_locations, all_matches):
+                person, distance, threshold = matches[0] if matches else (None, 1.0, tolerance)
+                if not is_match(distance, threshold):
+                    person, confidence = None, 0.0
+                    increment("service.unknown")
+                else:
+                    confidence = 1 - distance
+                    increment("service.matches")
+                faces.append({
+                    'person': person,
+                    'confidence': float(confidence),
+                    'distance': float(distance),
+                    'box': [int(v) for v in location],
+                })
+                if k > 1:
+                    faces[-1]['matches'] = [[name, float(d), float(t)] for name, d, t in matches]
+            results.append(faces)
+        return results
 
     def predict(self, image_path, tolerance=0.6):
         """Realiza una predicción en una imagen."""
         try:
-            face_encoding = self.process_image(image_path)
-            if face_encoding is None:
+            faces = self.predict_batch([image_path], tolerance)[0]
+            if not faces:
                 return {'error': 'No se encontró cara en la imagen'}
 
-            # Comparar la codificación de la cara con las conocidas
-            matches = face_recognition.compare_faces(
-                self.known_face_encodings,
-                face_encoding,
-                tolerance=tolerance
-            )
-            face_distances = face_recognition.face_distance(
-                self.known_face_encodings,
-                face_encoding
-            )
-
-            if True in matches:
-                best_match_index = np.argmin(face_distances)
-                confidence = 1 - face_distances[best_match_index]
-                return {
-                    'person': self.known_face_names[best_match_index],
-                    'confidence': float(confidence)
-                }
-            else:
-                return {'person': 'Desconocido', 'confidence': 0.0}
+            # Se usa la primera cara detectada
+            return {'person': faces[0]['person'], 'confidence': faces[0]['confidence']}
 
         except Exception as e:
             return {'error': str(e)}
 
+class MicroBatcher:
+    """Agrupa las solicitudes concurrentes que llegan dentro de una ventana corta y las
+    reconoce en una sola llamada a predict_batch."""
+
+    def __init__(self, system, window=0.01, max_batch=32, k=5):
+        self.system = system
+        self.window = window
+        self.max_batch = max_batch
+        self.k = k
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, image, timeout=10):
+        """Encola una imagen y espera sus resultados."""
+        item = {'image': image, 'done': threading.Event()}
+        self.queue.put(item)
+        if not item['done'].wait(timeout):
+            raise TimeoutError("Tiempo de espera agotado en el reconocimiento")
+        if 'error' in item:
+            raise item['error']
+        return item['result']
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = self.system.predict_batch([item['image'] for item in batch], k=self.k)
+                for item, result in zip(batch, results):
+                    item['result'] = result
+            except Exception as e:
+                for item in batch:
+                    item['error'] = e
+            for item in batch:
+                item['done'].set()
+
+def create_app(system, window=0.01, max_batch=32):
+    """Servicio HTTP de inferencia: el modelo se carga una vez y las solicitudes se agrupan en lotes."""
+    app = Flask(__name__)
+    batcher = MicroBatcher(system, window=window, max_batch=max_batch)
+
+    @app.route("/health", methods=["GET"])
+    def health():
+        return jsonify({'status': 'ok', 'model_version': system.model_version,
+                        'encodings': len(system.get_index()), 'includes_deltas': system.includes_deltas})
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        # Contadores e histogramas de este proceso (vacíos con METRICS_ENABLED=0)
+        return jsonify(dict(registry.snapshot(), enabled=METRICS_ENABLED))
+
+    @app.route("/predict", methods=["POST"])
+    def predict():
+        # La imagen puede llegar como archivo de formulario (image) o como cuerpo binario
+        upload = request.files.get('image')
+        data = upload.read() if upload else request.get_data()
+        if not data:
+            return jsonify({'error': 'No se recibió ninguna imagen'}), 400
+        try:
+            with timer("service.decode"):
+                image = face_recognition.load_image_file(BytesIO(data))
+        except Exception as e:
+            return jsonify({'error': f'Imagen inválida: {str(e)}'}), 400
+        try:
+            with timer("service.predict"):
+                faces = batcher.submit(image)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 503
+        return jsonify({'faces': faces, 'model_version': system.model_version,
+                        'includes_deltas': system.includes_deltas})
+
+    return app
+
+def serve(host="0.0.0.0", port=8000):
+    """Carga el modelo (almacén compartido o S3) y atiende /predict. Debe ejecutarse en un solo proceso
+    (con hilos) para que las solicitudes concurrentes compartan el mismo lote."""
+    BUCKET_NAME = "images-by-users"
+    S3_MODEL_PATH = "model.emb"
+
+    system = FacialRecognitionSystem(s3_handler=S3Handler(BUCKET_NAME))
+    if SERVICE_STORE_PATH:
+        system.use_store(SERVICE_STORE_PATH)
+    else:
+        system.load_model(S3_MODEL_PATH)
+    print(f"Modelo versión {system.model_version} cargado: {len(system.get_index())} codificaciones")
+    create_app(system).run(host=host, port=port, threaded=True)
+
 # Ejemplo de uso
 def main():
     BUCKET_NAME = "images-by-users"  # Solo el nombre del bucket
-    S3_FOLDER_PREFIX = "face_recognition_images_fulllname/"
-    S3_MODEL_PATH = "model.pkl"
+    # Una carpeta por estudiante con su ID de usuario: <prefijo>/<ID>/foto.jpg
+    S3_FOLDER_PREFIX = os.environ.get("S3_FOLDER_PREFIX", "face_recognition_images_by_id/")
+    S3_MODEL_PATH = "model.emb"
 
     s3_handler = S3Handler(BUCKET_NAME)
     system = FacialRecognitionSystem(s3_handler=s3_handler)
@@ -160,4 +455,8 @@ def main():
     print(f"Modelo guardado en S3 en: s3://{BUCKET_NAME}/{S3_MODEL_PATH}")
 
 if __name__ == "__main__":
-    main()
+    # python model.py serve -> servicio de inferencia; sin argumentos -> entrenamiento
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve()
+    else:
+        main()
@@ -0,0 +1,55 @@
+#bench_detection.py
+"""Mide la latencia de detección + codificación por tamaño de imagen, con y sin reducción previa."""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from detection import FaceDetector
+
+SIZES = [(640, 480), (1280, 720), (1920, 1080), (4032, 3024)]
+
+
+def sample_images(path=None):
+    """Imagen de muestra reescalada a cada tamaño; sin ruta se usa ruido (sólo mide la detección)."""
+    if path:
+        base = Image.open(path).convert("RGB")
+    else:
+        base = Image.fromarray(np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8))
+    return [(size, np.asarray(base.resize(size, Image.BILINEAR))) for size in SIZES]
+
+
+def measure(detector, image_array, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        locations, _ = detector.detect_and_encode(image_array)
+    return (time.perf_counter() - start) / repeats * 1000, len(locations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("image", nargs="?", help="Fotografía con una cara (opcional)")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    detectors = {
+        "original": FaceDetector(max_side=0),
+        "640": FaceDetector(max_side=640),
+        "640+recorte": FaceDetector(max_side=640, largest_only=True),
+        "480": FaceDetector(max_side=480),
+    }
+    print(f"{'tamaño':>11} " + " ".join(f"{name:>14}" for name in detectors))
+    for (width, height), image_array in sample_images(args.image):
+        cells = []
+        for detector in detectors.values():
+            ms, faces = measure(detector, image_array, args.repeats)
+            cells.append(f"{ms:>9.1f}ms/{faces}")
+        print(f"{width:>5}x{height:<5} " + " ".join(f"{cell:>14}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#bench_index.py
+"""Compara el índice vectorizado (exacto, IVF y por centroides) contra el recorrido lineal de face_distance."""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_index import EmbeddingIndex, EMBEDDING_DIM
+
+
+def synthetic_roster(num_identities, samples_per_identity=3, seed=0):
+    """Genera codificaciones sintéticas agrupadas por identidad, con escala similar a dlib."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, size=(num_identities, EMBEDDING_DIM))
+    encodings = np.repeat(centers, samples_per_identity, axis=0)
+    encodings += rng.normal(0, 0.02, size=encodings.shape)
+    labels = np.repeat(np.arange(num_identities), samples_per_identity).tolist()
+    queries = centers[rng.choice(num_identities, 200)] + rng.normal(0, 0.02, size=(200, EMBEDDING_DIM))
+    return list(encodings), labels, queries
+
+
+def brute_force(encodings, labels, query):
+    """Réplica de face_recognition.face_distance sobre la lista de codificaciones."""
+    distances = np.linalg.norm(np.array(encodings) - query, axis=1)
+    return labels[int(np.argmin(distances))]
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    print(f"{'identidades':>12} {'modo':>10} {'ms/consulta':>12} {'recall@1':>9}")
+    for num_identities in (100, 1000, 5000, 20000):
+        encodings, labels, queries = synthetic_roster(num_identities)
+        expected, ms = timed(lambda q: brute_force(encodings, labels, q), queries)
+        print(f"{num_identities:>12} {'lineal':>10} {ms:>12.3f} {1.0:>9.3f}")
+
+        exact = EmbeddingIndex(encodings, labels)
+        found, ms = timed(lambda q: exact.search(q, k=1)[0][0][0], queries)
+        recall = np.mean([a == b for a, b in zip(found, expected)])
+        print(f"{num_identities:>12} {'exacto':>10} {ms:>12.3f} {recall:>9.3f}")
+
+        n_lists = int(np.sqrt(len(labels)))
+        for n_probe in (2, 8):
+            ivf = EmbeddingIndex(encodings, labels, n_lists=n_lists, n_probe=n_probe)
+            found, ms = timed(lambda q: ivf.search(q, k=1)[0][0][0], queries)
+            recall = np.mean([a == b for a, b in zip(found, expected)])
+            print(f"{num_identities:>12} {f'ivf/{n_probe}':>10} {ms:>12.3f} {recall:>9.3f}")
+
+        # Dos etapas: centroides de todas las identidades y luego las muestras de las preseleccionadas
+        exact.match(queries[:1])
+        found, ms = timed(lambda q: exact.match(q, k=1)[0][0][0], queries)
+        recall = np.mean([a == b for a, b in zip(found, expected)])
+        print(f"{num_identities:>12} {'centroides':>10} {ms:>12.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#bench_quantization.py
+"""Compara las representaciones del índice (float32, float16 e int8 con recálculo exacto) contra la línea
+base float64: la lista de arreglos float64 con nombres en texto del antiguo pickle, recorrida con
+face_distance.
+
+Por cada variante reporta la coincidencia de la identidad top-1 con la línea base, el error máximo de
+distancia, la memoria propia del proceso (tracemalloc), la parte del archivo .emb mapeado que el índice
+recorre (float32 usa la matriz mapeada; las cuantizadas sólo leen las filas que recalculan) y la
+latencia por consulta de match().
+
+    python scripts/bench_quantization.py --identities 100000 --samples 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_index import EmbeddingIndex, EMBEDDING_DIM
+from embedding_store import write_store, load_store
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def synthetic_store(path, num_identities, samples, num_queries, seed=0):
+    """Escribe un .emb con codificaciones agrupadas por identidad (escala similar a dlib) y devuelve consultas."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, size=(num_identities, EMBEDDING_DIM)).astype(np.float32)
+    encodings = np.repeat(centers, samples, axis=0)
+    encodings += rng.normal(0, 0.02, size=encodings.shape).astype(np.float32)
+    labels = np.repeat(np.arange(1, num_identities + 1), samples).tolist()
+    write_store(path, encodings, labels)
+    truth = rng.choice(num_identities, num_queries)
+    queries = centers[truth] + rng.normal(0, 0.02, size=(num_queries, EMBEDDING_DIM)).astype(np.float32)
+    return queries, truth + 1
+
+
+def measure_memory(build):
+    """Ejecuta build() y devuelve (resultado, MB retenidos según tracemalloc)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, retained / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--identities", type=int, default=20000)
+    parser.add_argument("--samples", type=int, default=5, help="Muestras por identidad")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--baseline-queries", type=int, default=50,
+                        help="Consultas contra la línea base float64 (recorrido lineal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.emb")
+        queries, truth = synthetic_store(path, args.identities, args.samples, args.queries)
+        matrix, sq_norms, labels, _ = load_store(path)
+        rows = len(labels)
+        print(f"{args.identities} identidades x {args.samples} muestras = {rows} codificaciones "
+              f"(archivo .emb: {os.path.getsize(path) / 2**20:.1f} MB)")
+
+        # Línea base: lista de arreglos float64 y un nombre en texto por muestra, como el pickle anterior
+        def build_baseline():
+            encodings = [np.array(row, dtype=np.float64) for row in matrix]
+            names = [f"Estudiante {label:06d}" for label in labels]
+            return encodings, names
+        (encodings, names), baseline_mb = measure_memory(build_baseline)
+        expected, expected_distance, latencies = [], [], []
+        for query in queries[:args.baseline_queries]:
+            start = time.perf_counter()
+            distances = np.linalg.norm(np.array(encodings) - query, axis=1)
+            best = int(np.argmin(distances))
+            latencies.append(time.perf_counter() - start)
+            expected.append(int(names[best].split()[-1]))
+            expected_distance.append(float(distances[best]))
+        del encodings, names
+        print(f"\n{'variante':<22}{'top-1':>8}{'correctas':>11}{'error dist':>12}{'memoria MB':>12}"
+              f"{'mapeado MB':>12}{'p50 ms':>9}{'p99 ms':>9}")
+        print(f"{'float64 (pickle)':<22}{1.0:>8.3f}"
+              f"{np.mean(np.array(expected) == truth[:args.baseline_queries]):>11.3f}{0.0:>12.4f}"
+              f"{baseline_mb:>12.1f}{0.0:>12.1f}{percentile(latencies, 50) * 1000:>9.2f}"
+              f"{percentile(latencies, 99) * 1000:>9.2f}")
+
+        variants = [
+            ("float32", dict(dtype='float32')),
+            ("float16 + exacto", dict(dtype='float16', exact=matrix)),
+            ("int8 + exacto", dict(dtype='int8', exact=matrix)),
+            ("int8 sin recálculo", dict(dtype='int8')),
+        ]
+        for name, options in variants:
+            def build():
+                index = EmbeddingIndex(matrix, labels, sq_norms=sq_norms, **options)
+                index.match(queries[:1])
+                return index
+            index, memory_mb = measure_memory(build)
+            found, distances, latencies = [], [], []
+            for query in queries:
+                start = time.perf_counter()
+                label, distance, _ = index.match(query, k=1)[0][0]
+                latencies.append(time.perf_counter() - start)
+                found.append(label)
+                distances.append(distance)
+            baseline_n = min(args.baseline_queries, len(found))
+            agreement = np.mean(np.array(found[:baseline_n]) == np.array(expected[:baseline_n]))
+            error = max(abs(a - b) for a, b in zip(distances[:baseline_n], expected_distance))
+            mapped_mb = 0.0 if index.matrix.flags.owndata else index.matrix.nbytes / 2**20
+            print(f"{name:<22}{agreement:>8.3f}{np.mean(np.array(found) == truth):>11.3f}{error:>12.4f}"
+                  f"{memory_mb:>12.1f}{mapped_mb:>12.1f}{percentile(latencies, 50) * 1000:>9.2f}"
+                  f"{percentile(latencies, 99) * 1000:>9.2f}")
+            del index
+        del matrix, sq_norms
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#bench_store.py
+"""Mide el tiempo de arranque y la memoria por proceso al cargar las codificaciones desde .pkl y desde .emb."""
+import os
+import pickle
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_index import EmbeddingIndex
+from embedding_store import write_store, load_store
+
+
+def memory_kb():
+    """Memoria residente del proceso: (anónima/privada, respaldada por archivo) en kB, según /proc."""
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            fields[key] = value.strip()
+    return int(fields['RssAnon'].split()[0]), int(fields['RssFile'].split()[0])
+
+
+def worker(path, queue):
+    """Simula el arranque de un proceso de Streamlit: carga el modelo y atiende una consulta."""
+    anon_before, file_before = memory_kb()
+    start = time.perf_counter()
+    if path.endswith('.pkl'):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        index = EmbeddingIndex(data['encodings'], data['names'])
+    else:
+        matrix, sq_norms, labels, _ = load_store(path)
+        index = EmbeddingIndex(matrix, labels, sq_norms=sq_norms)
+    load_ms = (time.perf_counter() - start) * 1000
+    index.search(np.zeros(128), k=1)
+    anon_after, file_after = memory_kb()
+    queue.put((load_ms, anon_after - anon_before, file_after - file_before))
+
+
+def measure(path, workers):
+    ctx = get_context('spawn')
+    queue = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(path, queue)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return np.mean(results, axis=0)
+
+
+def main(num_encodings=100000, workers=4):
+    rng = np.random.default_rng(0)
+    encodings = [rng.normal(0, 0.09, 128) for _ in range(num_encodings)]
+    names = [f"Estudiante {i // 3}" for i in range(num_encodings)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pkl_path = os.path.join(tmp_dir, 'encodings.pkl')
+        with open(pkl_path, 'wb') as f:
+            pickle.dump({'encodings': encodings, 'names': names}, f)
+        emb_path = os.path.join(tmp_dir, 'encodings.emb')
+        write_store(emb_path, encodings, names)
+
+        print(f"{num_encodings} codificaciones, {workers} procesos")
+        print(f"{'formato':>8} {'tamaño MB':>10} {'carga ms':>9} {'privada MB':>11} {'compartida MB':>14}")
+        for path in (pkl_path, emb_path):
+            load_ms, anon_kb, file_kb = measure(path, workers)
+            size_mb = os.path.getsize(path) / 2**20
+            print(f"{path.rsplit('.', 1)[1]:>8} {size_mb:>10.1f} {load_ms:>9.1f} {anon_kb / 1024:>11.1f} {file_kb / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#bench_suite.py
+"""Banco de pruebas de reconocimiento y registro de asistencia, sin servicios externos.
+
+Secciones:
+  matching   índices de codificaciones sintéticas (128-d) de 100 a 100k identidades: búsqueda exacta,
+             por identidad (centroides) y limitada a los candidatos de una clase
+  detection  detección y codificación por resolución de imagen (ruido, o una fotografía con --image)
+  checkin    cadena de registro contra una base SQLite generada con volúmenes realistas de Horarios y
+             Asistencias (o una MySQL local ya cargada con --database-url): consultas por registro,
+             check_in, estudiantes en clase, carga masiva y la ruta encolada que usa la app (lotes de
+             ingest_attendance y latencia de CheckInWriter.submit hasta la confirmación)
+
+Por cada medición se reportan p50/p99 (ms) y la memoria pico (tracemalloc); el resultado es JSON con
+claves ordenadas para compararlo entre versiones (--compare anterior.json).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_index import EmbeddingIndex, EMBEDDING_DIM
+
+ROSTER_SIZES = [100, 1000, 10000, 100000]
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+DAYS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
+SLOTS = [("07:00:00", "09:00:00"), ("09:00:00", "11:00:00"), ("11:00:00", "13:00:00"), ("13:00:00", "15:00:00")]
+# Primer lunes del semestre del fixture; los registros medidos se hacen el lunes siguiente al último
+FIXTURE_START = date(2026, 1, 5)
+
+
+def timings(fn, repeats):
+    """Ejecuta fn repeats veces y devuelve p50/p99/media en ms y la memoria pico en MB."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "n": repeats,
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "mean_ms": round(float(np.mean(samples)), 4),
+        "peak_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def synthetic_roster(num_identities, samples_per_identity=3, seed=0):
+    """Codificaciones agrupadas por identidad con escala similar a dlib, y consultas de identidades conocidas."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, size=(num_identities, EMBEDDING_DIM)).astype(np.float32)
+    encodings = np.repeat(centers, samples_per_identity, axis=0)
+    encodings += rng.normal(0, 0.02, size=encodings.shape).astype(np.float32)
+    labels = np.repeat(np.arange(num_identities), samples_per_identity).tolist()
+    return encodings, labels, centers, rng
+
+
+def bench_matching(sizes, repeats, class_size=40):
+    results = {}
+    for size in sizes:
+        encodings, labels, centers, rng = synthetic_roster(size)
+        queries = centers[rng.integers(0, size, repeats)] + rng.normal(0, 0.02, (repeats, EMBEDDING_DIM))
+        queries = iter(np.vstack([queries, queries]))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = EmbeddingIndex(encodings, labels)
+        index.match(centers[:1])
+        build_ms = (time.perf_counter() - start) * 1000
+        _, build_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        candidates = set(rng.choice(size, min(class_size, size), replace=False).tolist())
+        results[str(size)] = {
+            "build": {"ms": round(build_ms, 2), "peak_mb": round(build_peak / 2 ** 20, 2)},
+            "exact": timings(lambda: index.search(next(queries), k=1), repeats),
+            "two_stage": timings(lambda: index.match(next(queries), k=1), repeats),
+            "candidates": timings(lambda: index.match(centers[rng.integers(0, size)], k=1,
+                                                      candidates=candidates), repeats),
+        }
+        print(f"matching {size}: listo", file=sys.stderr)
+    return results
+
+
+def bench_detection(image_path, repeats):
+    try:
+        from PIL import Image
+        from detection import FaceDetector
+    except ImportError as e:
+        return {"skipped": str(e)}
+    if image_path:
+        base = Image.open(image_path).convert("RGB")
+    else:
+        base = Image.fromarray(np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8))
+    detector = FaceDetector()
+    results = {}
+    for width, height in RESOLUTIONS:
+        image = np.asarray(base.resize((width, height), Image.BILINEAR))
+        locations = detector.locate(image)
+        results[f"{width}x{height}"] = {
+            "faces": len(locations),
+            "detect": timings(lambda: detector.locate(image), repeats),
+            "encode": timings(lambda: detector.encode(image, locations), repeats) if locations else None,
+        }
+    return results
+
+
+def build_sqlite_fixture(path, students, group_size, weeks, seed=0):
+    """Base SQLite con el esquema de la aplicación, un semestre de horarios y sus asistencias."""
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE Usuarios (id INTEGER PRIMARY KEY, nombre TEXT, correo TEXT, rol TEXT);
+        CREATE TABLE Grupos (id INTEGER PRIMARY KEY, nombre TEXT);
+        CREATE TABLE Estudiantes (id INTEGER PRIMARY KEY, id_usuario INTEGER, matricula TEXT, grupo_id INTEGER);
+        CREATE TABLE Materias (id INTEGER PRIMARY KEY, nombre TEXT);
+        CREATE TABLE Horarios (id INTEGER PRIMARY KEY, grupo_id INTEGER, materia_id INTEGER, profesor_id INTEGER,
+                               dia TEXT, hora_inicio TEXT, hora_fin TEXT);
+        CREATE TABLE FechaDias (fecha TEXT PRIMARY KEY, dia TEXT);
+        CREATE TABLE Asistencias (id INTEGER PRIMARY KEY, estudiante_id INTEGER, materia_id INTEGER, fecha TEXT,
+                                  hora_registro TEXT, estado TEXT, UNIQUE (estudiante_id, materia_id, fecha));
+        CREATE TABLE ResumenAsistenciaDiaria (grupo_id INTEGER, materia_id INTEGER, fecha TEXT,
+                                              presentes INTEGER DEFAULT 0, retardos INTEGER DEFAULT 0,
+                                              ausentes INTEGER DEFAULT 0, esperados INTEGER DEFAULT 0,
+                                              actualizado TEXT, PRIMARY KEY (grupo_id, materia_id, fecha));
+        CREATE INDEX idx_usuarios_nombre_correo ON Usuarios (nombre, correo);
+        CREATE INDEX idx_grupos_nombre ON Grupos (nombre);
+        CREATE INDEX idx_estudiantes_id_usuario ON Estudiantes (id_usuario);
+        CREATE INDEX idx_asistencias_materia_fecha ON Asistencias (materia_id, fecha, estudiante_id);
+        CREATE INDEX idx_horarios_materia_dia ON Horarios (materia_id, dia, grupo_id, hora_inicio);
+    """)
+    groups = (students + group_size - 1) // group_size
+    connection.executemany("INSERT INTO Grupos VALUES (?, ?)", [(g, f"G{g}") for g in range(1, groups + 1)])
+    connection.executemany("INSERT INTO Materias VALUES (?, ?)", [(m, f"Materia {m}") for m in range(1, 9)])
+    connection.executemany("INSERT INTO Usuarios VALUES (?, ?, ?, ?)",
+                           [(u, f"Estudiante {u}", f"{u}@upy.edu.mx", "Estudiante") for u in range(1, students + 1)])
+    connection.executemany("INSERT INTO Estudiantes VALUES (?, ?, ?, ?)",
+                           [(u, u, str(u), (u - 1) // group_size + 1) for u in range(1, students + 1)])
+
+    # Cada grupo tiene una materia por bloque y día, rotando entre 8 materias
+    horarios = []
+    for g in range(1, groups + 1):
+        for d, dia in enumerate(DAYS):
+            for s, (inicio, fin) in enumerate(SLOTS):
+                horarios.append((g, (g + d + s) % 8 + 1, 1000 + g % 20, dia, inicio, fin))
+    connection.executemany("INSERT INTO Horarios (grupo_id, materia_id, profesor_id, dia, hora_inicio, hora_fin) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", horarios)
+
+    dates = [FIXTURE_START + timedelta(weeks=w, days=d) for w in range(weeks) for d in range(len(DAYS))]
+    dates.append(FIXTURE_START + timedelta(weeks=weeks))
+    connection.executemany("INSERT INTO FechaDias VALUES (?, ?)",
+                           [(str(day), DAYS[day.weekday()]) for day in dates])
+
+    by_group_day = {}
+    for g, materia_id, _, dia, inicio, _ in horarios:
+        by_group_day.setdefault((g, dia), []).append((materia_id, inicio))
+    rows = []
+    for day in dates[:-1]:
+        dia = DAYS[day.weekday()]
+        for u in range(1, students + 1):
+            for materia_id, inicio in by_group_day[((u - 1) // group_size + 1, dia)]:
+                if rng.random() < 0.9:
+                    rows.append((u, materia_id, str(day), f"{inicio[:3]}{rng.randrange(0, 20):02d}:00", "Presente"))
+            if len(rows) >= 100000:
+                connection.executemany("INSERT OR IGNORE INTO Asistencias (estudiante_id, materia_id, fecha, "
+                                       "hora_registro, estado) VALUES (?, ?, ?, ?, ?)", rows)
+                rows = []
+    connection.executemany("INSERT OR IGNORE INTO Asistencias (estudiante_id, materia_id, fecha, hora_registro, "
+                           "estado) VALUES (?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    counts = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("Usuarios", "Horarios", "FechaDias", "Asistencias")}
+    connection.close()
+    return str(dates[-1]), counts
+
+
+def bench_checkin(database_url, students, group_size, weeks, repeats):
+    fixture = {}
+    checkin_date = str(FIXTURE_START + timedelta(weeks=weeks))
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_suite_"), "fixture.db")
+        start = time.perf_counter()
+        checkin_date, counts = build_sqlite_fixture(path, students, group_size, weeks)
+        fixture = {"rows": counts, "build_s": round(time.perf_counter() - start, 2)}
+        database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SCHEDULE_CACHE_STAMP", os.path.join(tempfile.gettempdir(), "bench_suite.stamp"))
+    try:
+        from sqlalchemy import event
+        import database
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    statements = [0]
+    event.listen(database.engine, "before_cursor_execute", lambda *_: statements.__setitem__(0, statements[0] + 1))
+
+    day = database.get_day_of_week(checkin_date).dia
+    checkin_time = "07:05:00"
+    in_session = sorted(database.get_students_in_session(day, checkin_time))
+    user_ids = iter(in_session * (repeats // max(len(in_session), 1) + 2))
+
+    def count_queries(fn):
+        before = statements[0]
+        fn()
+        return statements[0] - before
+
+    results = {
+        "fixture": fixture,
+        "students_in_session": len(in_session),
+        "queries_per_checkin": count_queries(lambda: database.check_in(next(user_ids), day, checkin_date,
+                                                                       checkin_time)),
+        "check_in": timings(lambda: database.check_in(next(user_ids), day, checkin_date, checkin_time), repeats),
+        "students_in_session_lookup": timings(lambda: database.get_students_in_session(day, checkin_time), repeats),
+    }
+    batch = [(user_id, None, checkin_date, "09:05:00") for user_id in in_session]
+    start = time.perf_counter()
+    ingested = database.ingest_attendance(batch)
+    elapsed = time.perf_counter() - start
+    results["ingest"] = {"rows": len(batch), "accepted": ingested.accepted,
+                         "rows_per_s": round(len(batch) / elapsed, 1) if elapsed else None}
+    results["queued"] = bench_queued_checkin(database, in_session, checkin_date, checkin_time, repeats)
+    return results
+
+
+def bench_queued_checkin(database, in_session, checkin_date, checkin_time, repeats):
+    """Ruta de registro de la app: lotes de ingest_attendance del tamaño de CHECKIN_BATCH_SIZE y
+    CheckInWriter.submit (encolar y esperar la confirmación). Cada lote usa una fecha nueva (lunes
+    posteriores a checkin_date) para que los registros no sean duplicados."""
+    from checkin_queue import CheckInWriter, CHECKIN_BATCH_SIZE, REGISTERED
+    if not in_session:
+        return {"skipped": "sin estudiantes en clase"}
+    batch_size = min(CHECKIN_BATCH_SIZE, len(in_session))
+    first_day = date.fromisoformat(checkin_date)
+    weeks = iter(range(1, 10 ** 6))
+
+    def fresh_records(count):
+        """count registros (estudiante, fecha) sin repetir, recorriendo los lunes siguientes."""
+        records, week = [], next(weeks)
+        for i in range(count):
+            if i and i % len(in_session) == 0:
+                week = next(weeks)
+            records.append((in_session[i % len(in_session)], None, str(first_day + timedelta(weeks=week)),
+                            checkin_time))
+        return records
+
+    batch_repeats = max(repeats // 10, 3)
+    results = {
+        "batch_size": batch_size,
+        "ingest_batch": timings(lambda: database.ingest_attendance(fresh_records(batch_size)), batch_repeats),
+    }
+    duplicates = fresh_records(batch_size)
+    database.ingest_attendance(duplicates)
+    results["ingest_batch_duplicates"] = timings(lambda: database.ingest_attendance(duplicates), batch_repeats)
+
+    # Ráfaga de registros como la de una clase que llega a la vez: latencia de submit() (encolar) y de
+    # la confirmación (submit -> ticket terminado por el escritor)
+    writer = CheckInWriter()
+    pending, tickets = iter([(user_id, fecha) for user_id, _, fecha, _ in fresh_records(repeats)]), []
+    results["submit"] = timings(lambda: tickets.append(writer.submit(*next(pending), checkin_time, timeout=5)),
+                                repeats)
+    for ticket in tickets:
+        ticket.wait(30)
+    confirm = [(ticket.completed - ticket.submitted) * 1000 for ticket in tickets if ticket and ticket.done()]
+    results["confirm"] = {
+        "n": len(confirm),
+        "p50_ms": round(float(np.percentile(confirm, 50)), 4) if confirm else None,
+        "p99_ms": round(float(np.percentile(confirm, 99)), 4) if confirm else None,
+        "registered": sum(1 for ticket in tickets if ticket and ticket.status == REGISTERED),
+    }
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old, new, path=""):
+    """Imprime el cambio relativo de cada medición p50/p99 entre dos resultados."""
+    for key in sorted(set(old) & set(new)):
+        a, b = old[key], new[key]
+        if isinstance(a, dict) and isinstance(b, dict):
+            compare(a, b, f"{path}{key}.")
+        elif key in ("p50_ms", "p99_ms", "peak_mb") and a:
+            print(f"{path}{key}: {a} -> {b} ({(b - a) / a * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default="matching,detection,checkin")
+    parser.add_argument("--sizes", default=",".join(map(str, ROSTER_SIZES)), help="Identidades por índice")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--image", help="Fotografía con una cara para la sección detection")
+    parser.add_argument("--database-url", help="MySQL local ya cargada (por omisión se genera una SQLite)")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--group-size", type=int, default=40)
+    parser.add_argument("--weeks", type=int, default=16)
+    parser.add_argument("--output", help="Archivo JSON de salida (por omisión la salida estándar)")
+    parser.add_argument("--compare", help="Resultado anterior para comparar con éste")
+    args = parser.parse_args()
+
+    sections = set(args.sections.split(","))
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "sections": {},
+    }
+    if "matching" in sections:
+        report["sections"]["matching"] = bench_matching([int(s) for s in args.sizes.split(",")], args.repeats)
+    if "detection" in sections:
+        report["sections"]["detection"] = bench_detection(args.image, max(args.repeats // 20, 3))
+    if "checkin" in sections:
+        report["sections"]["checkin"] = bench_checkin(args.database_url, args.students, args.group_size,
+                                                      args.weeks, args.repeats)
+    report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    output = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
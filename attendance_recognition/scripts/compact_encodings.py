@@ -0,0 +1,22 @@
+#compact_encodings.py
+"""Integra en la base los deltas de inscripción incremental acumulados junto a un archivo .emb."""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_store import compact_store, read_header
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default="face_recognition_encodings.emb")
+    args = parser.parse_args()
+
+    compact_store(args.path)
+    header = read_header(args.path)
+    print(f"{args.path}: versión {header['version']}, {header['count']} codificaciones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+#convert_encodings.py
+"""Convierte un archivo de codificaciones .pkl heredado al formato .emb mapeable en memoria."""
+import argparse
+import os
+import pickle
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_store import write_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", help="Archivo .pkl con las claves 'encodings' y 'names'")
+    parser.add_argument("target", help="Archivo .emb de salida")
+    parser.add_argument("--version", type=int, default=1)
+    parser.add_argument("--fp16", action="store_true", help="Guardar la matriz en float16")
+    args = parser.parse_args()
+
+    with open(args.source, 'rb') as f:
+        data = pickle.load(f)
+    write_store(args.target, data['encodings'], data['names'], version=args.version,
+                dtype='float16' if args.fp16 else 'float32')
+    print(f"{len(data['names'])} codificaciones escritas en {args.target}")
+
+
+if __name__ == "__main__":
+    main()
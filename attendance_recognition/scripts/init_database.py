@@ -0,0 +1,41 @@
+#init_database.py
+"""Aplica en orden las migraciones de scripts/migrations que todavía no se han aplicado."""
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "mysql+pymysql://")
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def split_statements(sql):
+    """Separa un archivo SQL en sentencias, ignorando las líneas de comentario."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def main():
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS Migraciones ("
+            "nombre VARCHAR(255) PRIMARY KEY, aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = {row.nombre for row in connection.execute(text("SELECT nombre FROM Migraciones"))}
+
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not file_name.endswith(".sql") or file_name in applied:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, file_name), encoding="utf-8") as f:
+            statements = split_statements(f.read())
+        print(f"Aplicando {file_name} ({len(statements)} sentencias)...")
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO Migraciones (nombre) VALUES (:nombre)"), {"nombre": file_name})
+    print("Base de datos actualizada.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+#invalidate_cache.py
+"""Invalida la caché de horarios, calendario, grupos y materias en todos los procesos de la aplicación.
+
+Ejecutar después de editar Horarios, FechaDias, Grupos o Materias directamente en la base de datos.
+"""
+import os
+
+SCHEDULE_CACHE_STAMP = os.environ.get("SCHEDULE_CACHE_STAMP", "schedule_cache.stamp")
+
+
+def main():
+    with open(SCHEDULE_CACHE_STAMP, 'a'):
+        os.utime(SCHEDULE_CACHE_STAMP)
+    print(f"Caché invalidada ({os.path.abspath(SCHEDULE_CACHE_STAMP)})")
+
+
+if __name__ == "__main__":
+    main()
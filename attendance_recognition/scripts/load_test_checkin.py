@@ -0,0 +1,108 @@
+#load_test_checkin.py
+"""Simula la ráfaga de registros de un cambio de clase contra la cola de asistencia (checkin_queue).
+
+Todos los estudiantes con clase en la fecha y hora indicadas se registran desde varios kioscos dentro
+de la ventana de la ráfaga. Mide el tiempo de respuesta del kiosco (reconocimiento simulado + encolado),
+el tiempo hasta la confirmación y los rechazos por cola llena. Con --sync se mide el registro síncrono
+(check_in) como referencia y con --db-delay-ms se agrega latencia a cada sentencia SQL.
+
+Escribe en la base de datos de DATABASE_URL: usar sólo una base de pruebas.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from database import engine, check_in, get_day_of_week, get_students_in_session
+from checkin_queue import CheckInWriter, PENDING
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--date", required=True, help="Fecha del registro (AAAA-MM-DD)")
+    parser.add_argument("--time", required=True, help="Hora del registro (HH:MM:SS) dentro de una clase")
+    parser.add_argument("--students", type=int, default=0, help="Registros a simular (0 = uno por estudiante)")
+    parser.add_argument("--kiosks", type=int, default=8)
+    parser.add_argument("--burst-seconds", type=float, default=10.0)
+    parser.add_argument("--recognition-ms", type=float, default=150.0, help="Reconocimiento simulado por foto")
+    parser.add_argument("--db-delay-ms", type=float, default=0.0, help="Latencia agregada por sentencia SQL")
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--sync", action="store_true", help="Registrar con check_in síncrono")
+    args = parser.parse_args()
+
+    if args.db_delay_ms:
+        @event.listens_for(engine, "before_cursor_execute")
+        def delay(*_):
+            time.sleep(args.db_delay_ms / 1000)
+
+    day = get_day_of_week(args.date).dia
+    user_ids = sorted(get_students_in_session(day, args.time))
+    if not user_ids:
+        sys.exit(f"No hay estudiantes con clase el {args.date} ({day}) a las {args.time}")
+    count = args.students or len(user_ids)
+    rng = random.Random(0)
+    schedule = sorted((rng.uniform(0, args.burst_seconds), user_ids[i % len(user_ids)]) for i in range(count))
+
+    writer = None if args.sync else CheckInWriter(maxsize=args.queue_size)
+    turnaround, tickets, busy = [], [], [0]
+    lock = threading.Lock()
+    start = time.monotonic()
+
+    def kiosk(items):
+        for offset, user_id in items:
+            time.sleep(max(0.0, start + offset - time.monotonic()))
+            began = time.monotonic()
+            time.sleep(args.recognition_ms / 1000)
+            if writer is None:
+                check_in(user_id, day, args.date, args.time)
+                ticket = None
+            else:
+                ticket = writer.submit(user_id, args.date, args.time)
+            elapsed = time.monotonic() - began
+            with lock:
+                turnaround.append(elapsed)
+                if ticket is None and writer is not None:
+                    busy[0] += 1
+                elif ticket is not None:
+                    tickets.append(ticket)
+
+    threads = [threading.Thread(target=kiosk, args=(schedule[i::args.kiosks],)) for i in range(args.kiosks)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for ticket in tickets:
+        ticket.wait(120)
+    total = time.monotonic() - start
+
+    mode = "síncrono" if writer is None else "cola"
+    print(f"Modo {mode}: {count} registros desde {args.kiosks} kioscos en {args.burst_seconds:.0f} s "
+          f"(latencia SQL +{args.db_delay_ms:.0f} ms)")
+    print(f"Respuesta del kiosco: p50 {percentile(turnaround, 50) * 1000:.0f} ms, "
+          f"p99 {percentile(turnaround, 99) * 1000:.0f} ms")
+    if writer is not None:
+        confirmed = [ticket.completed - ticket.submitted for ticket in tickets if ticket.status != PENDING]
+        statuses = {}
+        for ticket in tickets:
+            statuses[ticket.status] = statuses.get(ticket.status, 0) + 1
+        print(f"Confirmación: p50 {percentile(confirmed, 50) * 1000:.0f} ms, "
+              f"p99 {percentile(confirmed, 99) * 1000:.0f} ms")
+        print("Estados: " + ", ".join(f"{status} {n}" for status, n in sorted(statuses.items())))
+        print(f"Rechazados por cola llena: {busy[0]}")
+    print(f"Tiempo total: {total:.1f} s ({count / total:.0f} registros/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#measure_startup.py
+"""Mide el arranque en frío de la app: tiempo de importación de handlers y latencia de la primera solicitud.
+
+Cada medición corre en un intérprete nuevo. La importación reporta la mediana de --runs ejecuciones y
+qué módulos pesados quedaron cargados; la primera solicitud mide un registro completo (candidatos en
+clase + reconocimiento local de --image) con y sin warm_up previo, seguido de una segunda solicitud como
+referencia. Usa la base de datos de DATABASE_URL y el almacén de codificaciones del directorio actual.
+
+    python scripts/measure_startup.py --runs 5 --image foto.jpg
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+UTILS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils')
+HEAVY_MODULES = ["face_recognition", "dlib", "pandas", "fpdf", "sqlalchemy", "PIL", "numpy"]
+
+
+def child_import():
+    start = time.perf_counter()
+    import handlers  # noqa: F401
+    elapsed = time.perf_counter() - start
+    return {'import_s': elapsed, 'loaded': [name for name in HEAVY_MODULES if name in sys.modules]}
+
+
+def child_request(image_path, warm):
+    start = time.perf_counter()
+    import handlers  # noqa: F401
+    from PIL import Image
+    from datetime import datetime
+    from database import get_day_of_week, get_students_in_session, get_student_directory
+    from face_recognition_utils import recognize_identity
+    from warmup import warm_up
+    result = {'import_s': time.perf_counter() - start}
+
+    if warm:
+        result['warm_up'] = warm_up()
+    image = Image.open(image_path).convert("RGB") if image_path else Image.new("RGB", (640, 480))
+    now = datetime.now()
+
+    def request():
+        start = time.perf_counter()
+        day = get_day_of_week(now.strftime('%Y-%m-%d'))
+        candidates = get_students_in_session(day.dia, now.time()) if day else None
+        user_id, _ = recognize_identity(image, candidates)
+        if user_id is not None:
+            get_student_directory().get(user_id)
+        return time.perf_counter() - start
+
+    result['first_s'] = request()
+    result['second_s'] = request()
+    return result
+
+
+def run_child(*args):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", *args],
+                            capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join(
+                                [p for p in [os.environ.get('PYTHONPATH')] if p] + [UTILS_DIR])))
+    if output.returncode != 0:
+        sys.exit(f"Falló la medición ({' '.join(args)}):\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--image", help="Fotografía para la primera solicitud (por defecto un cuadro vacío)")
+    parser.add_argument("--skip-request", action="store_true", help="Medir sólo la importación")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode = args.child[0]
+        if mode == "import":
+            print(json.dumps(child_import()))
+        else:
+            print(json.dumps(child_request(args.child[1] if len(args.child) > 1 else None, mode == "warm")))
+        return
+
+    imports = [run_child("import") for _ in range(args.runs)]
+    print(f"Importación de handlers: mediana {statistics.median(r['import_s'] for r in imports) * 1000:.0f} ms "
+          f"({args.runs} ejecuciones)")
+    print(f"Módulos pesados cargados: {', '.join(imports[0]['loaded']) or 'ninguno'}")
+    if args.skip_request:
+        return
+
+    image = [args.image] if args.image else []
+    for mode, label in (("cold", "sin warm_up"), ("warm", "con warm_up")):
+        result = run_child(mode, *image)
+        line = (f"Primera solicitud {label}: {result['first_s'] * 1000:.0f} ms, "
+                f"segunda: {result['second_s'] * 1000:.0f} ms")
+        if 'warm_up' in result:
+            line += " (warm_up: " + ", ".join(f"{name} {s * 1000:.0f} ms" for name, s in result['warm_up'].items()) + ")"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
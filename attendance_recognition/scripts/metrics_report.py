@@ -0,0 +1,54 @@
+#metrics_report.py
+"""Resume los archivos de métricas volcados por los procesos (METRICS_ENABLED=1, ver app/utils/metrics.py).
+
+Suma contadores y cubetas de todos los archivos indicados y muestra por etapa el número de mediciones,
+la media y los percentiles estimados a partir de las cubetas.
+
+    python scripts/metrics_report.py metrics-*.json
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from metrics import BUCKETS_MS, Histogram
+
+
+def merge(paths):
+    counters, timers = {}, {}
+    for path in paths:
+        with open(path) as f:
+            snapshot = json.load(f)
+        for name, value in snapshot['counters'].items():
+            counters[name] = counters.get(name, 0) + value
+        for name, data in snapshot['timers'].items():
+            histogram = timers.setdefault(name, Histogram())
+            for i, count in enumerate(data['buckets'].values()):
+                histogram.buckets[i] += count
+            histogram.count += data['count']
+            histogram.total += data['mean_ms'] * data['count']
+            histogram.max = max(histogram.max, data['max_ms'])
+    return counters, timers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Archivos de métricas (uno por proceso)")
+    args = parser.parse_args()
+
+    counters, timers = merge(args.paths)
+    print(f"{'etapa':<32}{'n':>8}{'media':>10}{'p50':>8}{'p90':>8}{'p99':>8}{'máx':>10}  (ms)")
+    for name, histogram in sorted(timers.items()):
+        stats = histogram.snapshot()
+        print(f"{name:<32}{stats['count']:>8}{stats['mean_ms']:>10.1f}{stats['p50_ms']:>8.1f}{stats['p90_ms']:>8.1f}"
+              f"{stats['p99_ms']:>8.1f}{stats['max_ms']:>10.1f}")
+    if counters:
+        print()
+        for name, value in sorted(counters.items()):
+            print(f"{name:<32}{value:>8}")
+    print(f"\nCubetas (ms): {', '.join(str(bound) for bound in BUCKETS_MS)}, más")
+
+
+if __name__ == "__main__":
+    main()
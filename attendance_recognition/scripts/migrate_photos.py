@@ -0,0 +1,77 @@
+#migrate_photos.py
+"""Migra las fotografías en base64 de Fotografias al almacén binario, por bloques y de forma reanudable.
+
+Cada imagen se decodifica, se guarda en el almacén por su hash y se registra en FotografiasObjetos
+(INSERT IGNORE sobre (estudiante_id, hash)), así que el script puede repetirse sin duplicar nada.
+Con --clear se vacían las columnas base64 de cada bloque ya migrado.
+"""
+import argparse
+import base64
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from photo_store import PhotoStore
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "mysql+pymysql://")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-size", type=int, default=100, help="Filas de Fotografias por bloque")
+    parser.add_argument("--clear", action="store_true", help="Vaciar las columnas base64 ya migradas")
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL)
+    insert_ignore = "INSERT OR IGNORE" if engine.dialect.name == "sqlite" else "INSERT IGNORE"
+    store = PhotoStore()
+    last_id, migrated = 0, 0
+
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text("""
+                    SELECT id, estudiante_id, imagen1, imagen2, imagen3
+                    FROM Fotografias
+                    WHERE id > :last_id
+                    ORDER BY id
+                    LIMIT :limit
+                """),
+                {'last_id': last_id, 'limit': args.chunk_size}
+            ).fetchall()
+        if not rows:
+            break
+
+        refs = []
+        for row in rows:
+            for encoded in (row.imagen1, row.imagen2, row.imagen3):
+                if not encoded:
+                    continue
+                data = base64.b64decode(encoded)
+                refs.append({'student_id': row.estudiante_id, 'hash': store.put(data),
+                             'size': len(data), 'mime': 'image/jpeg'})
+
+        with engine.begin() as connection:
+            if refs:
+                connection.execute(
+                    text(f"""
+                        {insert_ignore} INTO FotografiasObjetos (estudiante_id, hash, tamano, tipo)
+                        VALUES (:student_id, :hash, :size, :mime)
+                    """),
+                    refs
+                )
+            if args.clear:
+                connection.execute(
+                    text("UPDATE Fotografias SET imagen1 = NULL, imagen2 = NULL, imagen3 = NULL WHERE id = :id"),
+                    [{'id': row.id} for row in rows]
+                )
+
+        last_id = rows[-1].id
+        migrated += len(refs)
+        print(f"Procesadas {migrated} fotografías (hasta Fotografias.id = {last_id})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+-- Restricción única para el registro atómico de asistencias (INSERT IGNORE en database.check_in).
+-- Primero se eliminan los duplicados que pudieron quedar por registros concurrentes.
+DELETE a1 FROM Asistencias a1
+JOIN Asistencias a2
+  ON a1.estudiante_id = a2.estudiante_id
+ AND a1.materia_id = a2.materia_id
+ AND a1.fecha = a2.fecha
+ AND a1.id > a2.id;
+
+ALTER TABLE Asistencias
+  ADD CONSTRAINT uq_asistencias_estudiante_materia_fecha UNIQUE (estudiante_id, materia_id, fecha);
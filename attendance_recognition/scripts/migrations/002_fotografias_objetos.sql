@@ -0,0 +1,12 @@
+-- Referencias a las fotografías guardadas como archivos binarios (app/utils/photo_store.py).
+-- Fotografias (base64) se conserva hasta terminar scripts/migrate_photos.py.
+CREATE TABLE IF NOT EXISTS FotografiasObjetos (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  estudiante_id INT NOT NULL,
+  hash CHAR(64) NOT NULL,
+  tamano INT NOT NULL,
+  tipo VARCHAR(32) NOT NULL,
+  creado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE KEY uq_fotografias_objetos_estudiante_hash (estudiante_id, hash),
+  KEY idx_fotografias_objetos_hash (hash)
+);
@@ -0,0 +1,12 @@
+-- Índices de cobertura para los reportes y las métricas (app/utils/analytics.py).
+-- Por materia y rango de fechas (reportes y tendencias por semana).
+CREATE INDEX idx_asistencias_materia_fecha
+  ON Asistencias (materia_id, fecha, estudiante_id, hora_registro, estado);
+
+-- Por estudiante, materia y fecha (LEFT JOIN de sesiones esperadas contra registros).
+CREATE INDEX idx_asistencias_estudiante_materia_fecha
+  ON Asistencias (estudiante_id, materia_id, fecha, hora_registro);
+
+-- Expansión de Horarios x FechaDias en sesiones esperadas.
+CREATE INDEX idx_horarios_materia_dia ON Horarios (materia_id, dia, grupo_id, hora_inicio);
+CREATE INDEX idx_fechadias_dia_fecha ON FechaDias (dia, fecha);
@@ -0,0 +1,14 @@
+-- Resumen diario de asistencia por grupo, materia y fecha (app/utils/rollup.py).
+-- database.check_in lo actualiza en cada registro y scripts/rebuild_rollup.py lo recalcula cada noche.
+CREATE TABLE IF NOT EXISTS ResumenAsistenciaDiaria (
+  grupo_id INT NOT NULL,
+  materia_id INT NOT NULL,
+  fecha DATE NOT NULL,
+  presentes INT NOT NULL DEFAULT 0,
+  retardos INT NOT NULL DEFAULT 0,
+  ausentes INT NOT NULL DEFAULT 0,
+  esperados INT NOT NULL DEFAULT 0,
+  actualizado TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (grupo_id, materia_id, fecha),
+  KEY idx_resumen_materia_fecha (materia_id, fecha)
+);
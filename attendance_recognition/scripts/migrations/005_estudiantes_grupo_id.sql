@@ -0,0 +1,20 @@
+-- Estudiantes.grupo_id guardaba el nombre del grupo; se convierte en la llave foránea a Grupos.id.
+-- Los valores que no corresponden a ningún grupo quedan en NULL.
+UPDATE Estudiantes
+JOIN Grupos ON Grupos.nombre = Estudiantes.grupo_id
+SET Estudiantes.grupo_id = Grupos.id;
+
+UPDATE Estudiantes
+LEFT JOIN Grupos ON Grupos.id = Estudiantes.grupo_id
+SET Estudiantes.grupo_id = NULL
+WHERE Grupos.id IS NULL;
+
+ALTER TABLE Estudiantes MODIFY grupo_id INT NULL;
+
+ALTER TABLE Estudiantes
+  ADD CONSTRAINT fk_estudiantes_grupo FOREIGN KEY (grupo_id) REFERENCES Grupos (id);
+
+-- Búsquedas de inicio de sesión y registro, grupos por nombre y estudiante por usuario
+CREATE INDEX idx_usuarios_nombre_correo ON Usuarios (nombre, correo);
+CREATE INDEX idx_grupos_nombre ON Grupos (nombre);
+CREATE INDEX idx_estudiantes_id_usuario ON Estudiantes (id_usuario);
@@ -0,0 +1,46 @@
+#rebuild_rollup.py
+"""Recalcula ResumenAsistenciaDiaria a partir de Asistencias (tarea nocturna).
+
+Por omisión recalcula el día anterior, que ya quedó cerrado; con --days o --start/--end se puede
+reconstruir un periodo completo (por ejemplo después de corregir registros a mano).
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from rollup import local_today, rebuild_daily_rollup
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "mysql+pymysql://")
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=1, help="Días cerrados a recalcular hasta ayer")
+    parser.add_argument("--start", type=parse_date, help="Fecha inicial (AAAA-MM-DD)")
+    parser.add_argument("--end", type=parse_date, help="Fecha final (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    # "Ayer" según la zona horaria de la escuela, no la del servidor
+    end_date = args.end or local_today() - timedelta(days=1)
+    start_date = args.start or end_date - timedelta(days=args.days - 1)
+
+    engine = create_engine(DATABASE_URL)
+    # Un día por transacción para no bloquear el resumen de todo el periodo
+    current, total = start_date, 0
+    while current <= end_date:
+        with engine.begin() as connection:
+            total += rebuild_daily_rollup(connection, current, current)
+        current += timedelta(days=1)
+    print(f"Resumen recalculado del {start_date} al {end_date}: {total} filas.")
+
+
+if __name__ == "__main__":
+    main()
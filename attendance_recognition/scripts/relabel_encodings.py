@@ -0,0 +1,58 @@
+#relabel_encodings.py
+"""Cambia las etiquetas de un archivo de codificaciones (.emb) de nombres a IDs de usuario.
+
+Integra los deltas pendientes y escribe la base con una versión nueva en una sola compactación, bajo el
+bloqueo del almacén, para que los procesos la recarguen y ningún registro concurrente se pierda. Los nombres que no existen o que están repetidos en Usuarios se descartan y se
+listan al final. Los archivos .pkl se convierten antes con scripts/convert_encodings.py.
+"""
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_store import compact_store, read_header
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "mysql+pymysql://")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default="face_recognition_encodings.emb")
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as connection:
+        rows = connection.execute(text("""
+            SELECT Usuarios.nombre, MIN(Usuarios.id) AS id, COUNT(*) AS total
+            FROM Usuarios
+            JOIN Estudiantes ON Estudiantes.id_usuario = Usuarios.id
+            GROUP BY Usuarios.nombre
+        """)).fetchall()
+    ids = {row.nombre: row.id for row in rows if row.total == 1}
+    ambiguous = {row.nombre for row in rows if row.total > 1}
+
+    skipped = {}
+
+    def relabel(encodings, labels):
+        keep, new_labels = [], []
+        for row, label in enumerate(labels):
+            if isinstance(label, int):
+                keep.append(row)
+                new_labels.append(label)
+            elif label in ids:
+                keep.append(row)
+                new_labels.append(ids[label])
+            else:
+                skipped[label] = "repetido" if label in ambiguous else "no existe"
+        return encodings[keep], new_labels
+
+    version = compact_store(args.path, transform=relabel)
+    print(f"{read_header(args.path)['count']} codificaciones con ID de usuario en {args.path} (versión {version})")
+    for label, reason in sorted(skipped.items()):
+        print(f"✗ {label}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#train_model.py
+"""Reconstruye el archivo de codificaciones (.emb) a partir de las fotografías del almacén binario, etiquetadas
+con el ID de usuario de cada estudiante.
+
+Las referencias se leen de FotografiasObjetos por bloques y cada fotografía se lee del almacén una por
+una: en memoria sólo se conservan las codificaciones (128 valores por fotografía), no las imágenes. Las
+imágenes ya codificadas salen de la caché por contenido.
+
+La base se reemplaza con compact_store, bajo el bloqueo del almacén: las fotografías registradas durante el
+entrenamiento se codifican dentro del bloqueo y los deltas de inscripción existentes quedan integrados.
+"""
+import argparse
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from detection import FaceDetector
+from embedding_store import compact_store
+from encoding_cache import EncodingCache
+from photo_store import PhotoStore
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "mysql+pymysql://")
+
+
+def iter_photo_refs(engine, last_id=0, chunk_size=1000):
+    """Recorre por bloques (paginación por id) las fotografías posteriores a last_id con el ID y nombre de su
+    estudiante."""
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text("""
+                    SELECT FotografiasObjetos.id, FotografiasObjetos.estudiante_id, Usuarios.nombre,
+                           FotografiasObjetos.hash
+                    FROM FotografiasObjetos
+                    JOIN Usuarios ON FotografiasObjetos.estudiante_id = Usuarios.id
+                    WHERE FotografiasObjetos.id > :last_id
+                    ORDER BY FotografiasObjetos.id
+                    LIMIT :limit
+                """),
+                {'last_id': last_id, 'limit': chunk_size}
+            ).fetchall()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", default="face_recognition_encodings.emb")
+    parser.add_argument("--cache", default="encoding_cache.db")
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL)
+    store = PhotoStore()
+    cache = EncodingCache(args.cache)
+    detector = FaceDetector(largest_only=True)
+
+    encodings, labels = [], []
+
+    def encode_since(after_id):
+        """Codifica las fotografías posteriores a after_id; devuelve el último id leído."""
+        for ref in iter_photo_refs(engine, after_id):
+            with store.open(ref.hash) as f:
+                data = f.read()
+            _, face_encodings = cache.get_or_compute(
+                data, detector.settings,
+                lambda: detector.detect_and_encode(np.asarray(Image.open(BytesIO(data)).convert("RGB"))))
+            if face_encodings:
+                encodings.append(face_encodings[0])
+                labels.append(ref.estudiante_id)
+            else:
+                print(f"✗ No se encontró cara en la fotografía {ref.hash} de {ref.nombre}")
+            after_id = ref.id
+        return after_id
+
+    last_id = encode_since(0)
+
+    def rebuilt(_encodings, _labels):
+        # Dentro del bloqueo: toda inscripción con delta ya guardó sus fotografías, así que basta codificar
+        # las registradas durante el entrenamiento para que la base nueva sustituya a todos los deltas
+        encode_since(last_id)
+        return encodings, labels
+
+    version = compact_store(args.output, transform=rebuilt)
+    print(f"{len(labels)} codificaciones escritas en {args.output} (versión {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#test_database.py
+import os
+import sys
+from collections import namedtuple
+from datetime import time, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from schedule_index import ScheduleIndex, to_seconds
+
+Horario = namedtuple('Horario', ['grupo_id', 'dia', 'materia_id', 'materia_nombre', 'hora_inicio', 'hora_fin'])
+
+# Grupo 1: Matemáticas 08-10 y Física 10-12 el lunes; grupo 2: Física 09-11 el lunes y Química el martes
+# de medianoche a la 01:00 y de 23:00 a 23:59:59
+SCHEDULE = [
+    Horario(1, 'Lunes', 1, 'Matemáticas', '08:00:00', '10:00:00'),
+    Horario(1, 'Lunes', 2, 'Física', '10:00:00', '12:00:00'),
+    Horario(2, 'Lunes', 2, 'Física', timedelta(hours=9), timedelta(hours=11)),
+    Horario(2, 'Martes', 3, 'Química', time(0, 0), time(1, 0)),
+    Horario(2, 'Martes', 3, 'Química', '23:00', '23:59:59'),
+]
+
+
+def materia(index, group_id, day, current_time):
+    entry = index.current_class(group_id, day, current_time)
+    return entry.materia_id if entry is not None else None
+
+
+def test_to_seconds_accepts_mysql_time_and_text():
+    assert to_seconds(timedelta(hours=8, minutes=5)) == 8 * 3600 + 300
+    assert to_seconds(time(8, 5, 30)) == 8 * 3600 + 330
+    assert to_seconds('08:05') == 8 * 3600 + 300
+    assert to_seconds('8:05:30') == 8 * 3600 + 330
+
+
+def test_current_class_without_grace_is_inclusive():
+    index = ScheduleIndex(SCHEDULE)
+    assert materia(index, 1, 'Lunes', '07:59:59') is None
+    assert materia(index, 1, 'Lunes', '08:00:00') == 1
+    assert materia(index, 1, 'Lunes', '09:59:59') == 1
+    assert materia(index, 1, 'Lunes', '12:00:00') == 2
+    assert materia(index, 1, 'Lunes', '12:00:01') is None
+    assert materia(index, 3, 'Lunes', '09:00:00') is None
+
+
+def test_current_class_with_grace_periods():
+    index = ScheduleIndex(SCHEDULE, early_grace=600, late_grace=300)
+    assert materia(index, 1, 'Lunes', '07:49:59') is None
+    assert materia(index, 1, 'Lunes', '07:50:00') == 1
+    assert materia(index, 1, 'Lunes', '12:05:00') == 2
+    assert materia(index, 1, 'Lunes', '12:05:01') is None
+    entry = index.current_class(1, 'Lunes', '07:55:00')
+    assert (entry.hora_inicio, entry.hora_fin) == ('08:00:00', '10:00:00')
+
+
+def test_overlapping_classes_prefer_the_real_schedule():
+    index = ScheduleIndex(SCHEDULE, early_grace=900, late_grace=900)
+    # 09:50 cae en la tolerancia anticipada de Física, pero sigue dentro del horario de Matemáticas
+    assert materia(index, 1, 'Lunes', '09:50:00') == 1
+    # 10:10 cae en la tolerancia tardía de Matemáticas, pero ya es horario de Física
+    assert materia(index, 1, 'Lunes', '10:10:00') == 2
+    assert materia(index, 1, 'Lunes', time(10, 0)) == 2
+
+
+def test_current_class_finds_long_window_behind_several_overlaps():
+    # Un laboratorio de 08 a 12 con dos clases cortas que empiezan después y se traslapan con él
+    index = ScheduleIndex([
+        Horario(4, 'Jueves', 5, 'Laboratorio', '08:00:00', '12:00:00'),
+        Horario(4, 'Jueves', 6, 'Tutoría', '08:30:00', '09:00:00'),
+        Horario(4, 'Jueves', 7, 'Seminario', '09:00:00', '09:30:00'),
+    ], early_grace=300, late_grace=300)
+    assert materia(index, 4, 'Jueves', '08:45:00') == 6
+    assert materia(index, 4, 'Jueves', '09:15:00') == 7
+    # Ya terminaron las dos clases cortas (y su tolerancia): sigue el laboratorio, dos posiciones atrás
+    assert materia(index, 4, 'Jueves', '10:00:00') == 5
+    assert materia(index, 4, 'Jueves', '12:05:00') == 5
+    assert materia(index, 4, 'Jueves', '12:05:01') is None
+
+
+def test_day_boundaries():
+    index = ScheduleIndex(SCHEDULE, early_grace=600, late_grace=600)
+    assert materia(index, 2, 'Martes', '00:00:00') == 3
+    assert materia(index, 2, 'Martes', '23:59:59') == 3
+    assert materia(index, 2, 'Martes', '01:10:00') == 3
+    assert materia(index, 2, 'Martes', '01:10:01') is None
+    # Las clases de un día no se extienden al anterior ni al siguiente
+    assert materia(index, 2, 'Lunes', '23:59:59') is None
+    assert materia(index, 2, 'Miércoles', '00:05:00') is None
+    assert materia(index, 1, 'Martes', '09:00:00') is None
+
+
+def test_groups_in_session():
+    index = ScheduleIndex(SCHEDULE, late_grace=300)
+    assert index.groups_in_session('Lunes', '07:59:59') == frozenset()
+    assert index.groups_in_session('Lunes', '08:30:00') == {1}
+    assert index.groups_in_session('Lunes', '09:00:00') == {1, 2}
+    assert index.groups_in_session('Lunes', '11:05:00') == {1, 2}
+    assert index.groups_in_session('Lunes', '11:05:01') == {1}
+    assert index.groups_in_session('Lunes', '12:05:01') == frozenset()
+    assert index.groups_in_session('Martes', '00:00:00') == {2}
+    assert index.groups_in_session('Martes', '12:00:00') == frozenset()
+    assert index.groups_in_session('Domingo', '09:00:00') == frozenset()
+
+
+SCHEMA = [
+    "CREATE TABLE Usuarios (id INTEGER PRIMARY KEY, nombre TEXT, correo TEXT, rol TEXT)",
+    "CREATE TABLE Grupos (id INTEGER PRIMARY KEY, nombre TEXT)",
+    "CREATE TABLE Estudiantes (id INTEGER PRIMARY KEY, id_usuario INTEGER, matricula TEXT, grupo_id INTEGER)",
+    "CREATE TABLE Materias (id INTEGER PRIMARY KEY, nombre TEXT)",
+    """CREATE TABLE Horarios (id INTEGER PRIMARY KEY, grupo_id INTEGER, materia_id INTEGER, profesor_id INTEGER,
+                              dia TEXT, hora_inicio TEXT, hora_fin TEXT)""",
+    "CREATE TABLE FechaDias (fecha TEXT PRIMARY KEY, dia TEXT)",
+    """CREATE TABLE Asistencias (id INTEGER PRIMARY KEY, estudiante_id INTEGER, materia_id INTEGER, fecha TEXT,
+                                 hora_registro TEXT, estado TEXT, UNIQUE (estudiante_id, materia_id, fecha))""",
+    """CREATE TABLE ResumenAsistenciaDiaria (grupo_id INT NOT NULL, materia_id INT NOT NULL, fecha DATE NOT NULL,
+                                             presentes INT NOT NULL DEFAULT 0, retardos INT NOT NULL DEFAULT 0,
+                                             ausentes INT NOT NULL DEFAULT 0, esperados INT NOT NULL DEFAULT 0,
+                                             actualizado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                             PRIMARY KEY (grupo_id, materia_id, fecha))""",
+    "INSERT INTO Grupos VALUES (1, 'G1'), (2, 'G2')",
+    "INSERT INTO Estudiantes VALUES (1, 1, '1', 1), (2, 2, '2', 1), (3, 3, '3', 2)",
+    "INSERT INTO Materias VALUES (1, 'Matemáticas'), (2, 'Física')",
+    """INSERT INTO Horarios VALUES (1, 1, 1, 9, 'Lunes', '08:00:00', '10:00:00'),
+                                   (2, 1, 2, 9, 'Lunes', '10:00:00', '12:00:00'),
+                                   (3, 2, 2, 9, 'Martes', '08:00:00', '10:00:00')""",
+]
+
+# 2026-10-19 es lunes y 2026-10-20 martes (sin excepciones en FechaDias)
+MONDAY, TUESDAY = '2026-10-19', '2026-10-20'
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Módulo database apuntando a una base sqlite nueva con el esquema mínimo."""
+    pytest.importorskip("streamlit")
+    url = f"sqlite:///{tmp_path / 'asistencias.db'}"
+    os.environ.setdefault("DATABASE_URL", url)
+    import database
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "Session", sessionmaker(bind=engine))
+    database.schedule_cache.clear()
+    yield database
+    database.schedule_cache.clear()
+    engine.dispose()
+
+
+def attendance(database):
+    with database.Session() as session:
+        return session.execute(text(
+            "SELECT estudiante_id, materia_id, fecha, hora_registro FROM Asistencias ORDER BY estudiante_id, materia_id"
+        )).fetchall()
+
+
+def rollup(database):
+    with database.Session() as session:
+        return session.execute(text(
+            "SELECT grupo_id, materia_id, fecha, presentes, retardos FROM ResumenAsistenciaDiaria ORDER BY grupo_id, materia_id"
+        )).fetchall()
+
+
+def test_ingest_attendance_inserts_and_updates_rollup(database):
+    result = database.ingest_attendance([
+        (1, 1, MONDAY, '08:05'),
+        (2, '', MONDAY, '08:30:00'),
+        (1, None, MONDAY, '10:01:00'),
+    ])
+    assert result.accepted == 3
+    assert result.duplicates == 0
+    assert result.rejected == []
+    assert result.inserted == [0, 1, 2]
+    assert [tuple(row) for row in attendance(database)] == [
+        (1, 1, MONDAY, '08:05:00'), (1, 2, MONDAY, '10:01:00'), (2, 1, MONDAY, '08:30:00'),
+    ]
+    # 08:30 pasa la tolerancia de retardo (10 minutos) de la clase de las 08:00
+    assert [tuple(row) for row in rollup(database)] == [(1, 1, MONDAY, 2, 1), (1, 2, MONDAY, 1, 0)]
+
+
+def test_ingest_attendance_dedupes_within_batch_and_against_table(database):
+    database.ingest_attendance([(1, 1, MONDAY, '08:05')])
+    result = database.ingest_attendance([
+        (1, 1, MONDAY, '09:00'),
+        (2, 1, MONDAY, '08:10'),
+        (2, None, MONDAY, '08:20'),
+    ])
+    assert result.accepted == 1
+    assert result.duplicates == 2
+    assert result.inserted == [1]
+    assert [tuple(row) for row in attendance(database)] == [
+        (1, 1, MONDAY, '08:05:00'), (2, 1, MONDAY, '08:10:00'),
+    ]
+    assert [tuple(row) for row in rollup(database)] == [(1, 1, MONDAY, 2, 0)]
+
+
+def test_ingest_attendance_rejects_invalid_rows(database):
+    result = database.ingest_attendance([
+        (1, 1, 'ayer', '08:05'),
+        ('x', 1, MONDAY, '08:05'),
+        (99, 1, MONDAY, '08:05'),
+        (1, 1, MONDAY, '13:00'),
+        (1, 2, MONDAY, '08:05'),
+        (1, 1, TUESDAY, '08:05'),
+        (3, 2, TUESDAY, '08:05'),
+    ], classes={(1, 1), (2, 1)})
+    assert result.accepted == 0
+    assert result.inserted == []
+    assert result.rejected == [
+        (0, "formato inválido"),
+        (1, "formato inválido"),
+        (2, "estudiante desconocido"),
+        (3, "fuera de horario"),
+        (4, "fuera de horario"),
+        (5, "fuera de horario"),
+        # Física también se imparte al grupo 2, pero esa clase no está permitida
+        (6, "clase no permitida"),
+    ]
+    assert attendance(database) == []
+    assert rollup(database) == []
+
+
+def test_ingest_attendance_counts_rows_lost_to_a_concurrent_insert_as_duplicates(database, monkeypatch):
+    insert_ignore = database._insert_ignore
+
+    def insert_concurrently():
+        # Otro proceso registra al estudiante 2 entre la consulta de existentes y la inserción
+        with database.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO Asistencias (estudiante_id, materia_id, fecha, hora_registro, estado) "
+                "VALUES (2, 1, :fecha, '08:01:00', 'Presente')"
+            ), {'fecha': MONDAY})
+        return insert_ignore()
+
+    monkeypatch.setattr(database, "_insert_ignore", insert_concurrently)
+    result = database.ingest_attendance([(1, 1, MONDAY, '08:05'), (2, 1, MONDAY, '08:30')])
+    assert result.accepted == 1
+    assert result.duplicates == 1
+    assert result.inserted == [0]
+    assert [tuple(row) for row in attendance(database)] == [
+        (1, 1, MONDAY, '08:05:00'), (2, 1, MONDAY, '08:01:00'),
+    ]
+    assert [tuple(row) for row in rollup(database)] == [(1, 1, MONDAY, 1, 0)]
+
+
+def test_register_attendance_updates_rollup_only_once(database):
+    assert database.register_attendance(1, 1, MONDAY, '08:05:00') is True
+    assert database.register_attendance(1, 1, MONDAY, '08:06:00') is False
+    assert [tuple(row) for row in rollup(database)] == [(1, 1, MONDAY, 1, 0)]
+
+
+def test_insert_group_returns_the_new_id(database, monkeypatch):
+    monkeypatch.setattr(database, "invalidate_schedule_cache", database.schedule_cache.clear)
+    assert database.insert_group('G3') == 3
+    assert database.check_group_exists('G3').id == 3
+
+
+def test_attendance_reports_filter_by_group(database):
+    # Física se imparte al grupo 1 (lunes) y al grupo 2 (martes)
+    with database.Session() as session:
+        session.execute(text("INSERT INTO Usuarios (id, nombre) VALUES (1, 'Ana'), (2, 'Luis'), (3, 'Eva')"))
+        session.commit()
+    database.ingest_attendance([(1, 2, MONDAY, '10:05'), (2, 2, MONDAY, '10:06'), (3, 2, TUESDAY, '08:05')])
+
+    summary = database.get_attendance_summary(2, MONDAY, TUESDAY, grupo_id=2)
+    assert (summary.total, summary.estudiantes, summary.dias) == (1, 1, 1)
+    assert database.get_attendance_summary(2, MONDAY, TUESDAY).total == 3
+    page = database.get_attendance_page(2, MONDAY, TUESDAY, 0, page_size=1, grupo_id=1)
+    assert [row.estudiante_nombre for row in page] == ['Ana']
+    chunks = database.iter_attendance_by_date_range(2, MONDAY, TUESDAY, grupo_id=1)
+    assert [row.estudiante_nombre for chunk in chunks for row in chunk] == ['Ana', 'Luis']
@@ -0,0 +1,214 @@
+#test_face_recognition.py
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+from embedding_index import EmbeddingIndex, IdentityTable, EMBEDDING_DIM, MIN_TOLERANCE, THRESHOLD_MARGIN, is_match
+
+
+def axis(i, scale=1.0):
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    vector[i] = scale
+    return vector
+
+
+def cluster(center, radius, direction):
+    """Dos muestras a distancia radius del centro, en sentidos opuestos: radio medio exacto."""
+    return [center + axis(direction, radius), center - axis(direction, radius)]
+
+
+def synthetic_index(**options):
+    # Identidades separadas por 5 unidades: 1 dispersa, 2 compacta, 3 con una muestra, 4 muy dispersa
+    encodings = (cluster(axis(0, 5), 0.2, 10) + cluster(axis(1, 5), 0.01, 10) + [axis(2, 5)]
+                 + cluster(axis(3, 5), 0.4, 10))
+    labels = [1, 1, 2, 2, 3, 4, 4]
+    return EmbeddingIndex(np.array(encodings), labels, **options)
+
+
+def test_adaptive_thresholds_follow_cluster_spread():
+    index = synthetic_index()
+    index.match([axis(0, 5)])
+    thresholds = dict(zip(index.table.labels.tolist(), index.identity_thresholds.tolist()))
+    assert thresholds[1] == pytest.approx(2 * 0.2 + THRESHOLD_MARGIN, abs=1e-5)
+    assert thresholds[2] == pytest.approx(MIN_TOLERANCE)
+    assert thresholds[3] == np.inf
+    assert thresholds[4] == pytest.approx(2 * 0.4 + THRESHOLD_MARGIN, abs=1e-5)
+
+
+def test_match_caps_thresholds_at_tolerance():
+    index = synthetic_index()
+    queries = [axis(0, 5), axis(1, 5), axis(2, 5), axis(3, 5)]
+    thresholds = {matches[0][0]: matches[0][2] for matches in index.match(queries, tolerance=0.6)}
+    assert thresholds[1] == pytest.approx(0.55, abs=1e-5)
+    assert thresholds[2] == pytest.approx(MIN_TOLERANCE)
+    assert thresholds[3] == pytest.approx(0.6)
+    assert thresholds[4] == pytest.approx(0.6)
+    assert index.match([axis(3, 5)], tolerance=1.0)[0][0][2] == pytest.approx(0.95, abs=1e-5)
+
+
+def test_match_returns_python_labels_and_sorted_neighbours():
+    index = synthetic_index()
+    matches = index.match([axis(0, 5) + axis(10, 0.1)], k=3)[0]
+    assert [type(label) for label, _, _ in matches] == [int, int, int]
+    assert matches[0][0] == 1
+    assert matches[0][1] == pytest.approx(0.1, abs=1e-4)
+    assert [distance for _, distance, _ in matches] == sorted(distance for _, distance, _ in matches)
+
+
+def test_two_stage_match_uses_nearest_sample_of_shortlisted_identities():
+    # La identidad 1 tiene muestras en ±e0 (centroide en el origen); la 2 es compacta cerca de la consulta
+    encodings = [axis(0, 1), axis(0, -1), axis(0, 0.9) + axis(1, 0.3) + axis(2, 0.01),
+                 axis(0, 0.9) + axis(1, 0.3) - axis(2, 0.01)]
+    index = EmbeddingIndex(np.array(encodings), [1, 1, 2, 2])
+    query = axis(0, 0.9)
+    # Sólo la primera etapa (un centroide preseleccionado): gana el centroide más cercano
+    label, distance, _ = index.match([query], shortlist=1)[0][0]
+    assert label == 2
+    assert distance == pytest.approx(0.3, abs=1e-3)
+    # Con ambas identidades preseleccionadas decide la muestra más cercana
+    label, distance, _ = index.match([query], shortlist=2)[0][0]
+    assert label == 1
+    assert distance == pytest.approx(0.1, abs=1e-4)
+    # Los candidatos limitan las identidades consideradas
+    assert index.match([query], candidates=[2])[0][0][0] == 2
+    assert index.match([query], candidates=[99]) == [[]]
+
+
+def test_is_match_rejects_distance_equal_to_threshold():
+    assert is_match(0.49, 0.5)
+    assert not is_match(0.5, 0.5)
+    assert not is_match(0.51, 0.5)
+
+
+def synthetic_set(identities=300, samples=4, queries=100, seed=0):
+    """Codificaciones agrupadas por identidad con escala similar a dlib, y consultas con ruido."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, size=(identities, EMBEDDING_DIM)).astype(np.float32)
+    encodings = np.repeat(centers, samples, axis=0) + rng.normal(0, 0.02, size=(identities * samples, EMBEDDING_DIM))
+    labels = np.repeat(np.arange(1000, 1000 + identities), samples).tolist()
+    truth = rng.choice(identities, queries)
+    return encodings.astype(np.float32), labels, centers[truth] + rng.normal(0, 0.02, size=(queries, EMBEDDING_DIM))
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_index_with_rerank_matches_float32_top1(dtype):
+    encodings, labels, queries = synthetic_set()
+    reference = EmbeddingIndex(encodings, labels)
+    quantized = EmbeddingIndex(encodings, labels, dtype=dtype, exact=encodings)
+    assert quantized.matrix.dtype == np.dtype(dtype)
+    expected = reference.match(queries)
+    found = quantized.match(queries)
+    assert [m[0][0] for m in found] == [m[0][0] for m in expected]
+    # Con el recálculo exacto las distancias del top-1 son las de float32
+    np.testing.assert_allclose([m[0][1] for m in found], [m[0][1] for m in expected], atol=1e-5)
+    assert [r[0][0] for r in quantized.search(queries)] == [r[0][0] for r in reference.search(queries)]
+
+
+def test_identity_table_round_trips_integer_labels():
+    labels = [42, 7, 42, 1000000007, 7, 42]
+    table = IdentityTable(labels)
+    assert len(table) == 3
+    assert table.labels.dtype == np.int64
+    assert [table.label(code) for code in table.row_codes] == labels
+    assert all(type(table.label(code)) is int for code in range(len(table)))
+    assert table.row_codes.dtype == np.int32
+    for code in range(len(table)):
+        assert sorted(table.rows(code).tolist()) == [i for i, label in enumerate(labels) if label == table.label(code)]
+    codes = table.codes_for([7, 99, 1000000007, "42"])
+    assert [table.label(code) for code in codes] == [7, 1000000007]
+
+
+def test_identity_table_interns_text_labels():
+    labels = ["Ana", "Luis", "Ana", "Ana"]
+    table = IdentityTable(labels)
+    assert table.labels == ["Ana", "Luis"]
+    assert [table.label(code) for code in table.row_codes] == labels
+    assert table.rows(0).tolist() == [0, 2, 3]
+    assert table.codes_for(["Luis", "Eva"]).tolist() == [1]
+
+
+def test_index_labels_round_trip_through_the_table():
+    encodings, labels, _ = synthetic_set(identities=20, samples=3, queries=1)
+    index = EmbeddingIndex(encodings, labels, dtype="int8", exact=encodings)
+    assert [index.table.label(code) for code in index.table.row_codes] == labels
+    assert sorted(index.rows_for([1005]).tolist()) == [15, 16, 17]
+    assert index.match(encodings[16], k=1)[0][0][0] == 1005
+
+
+@pytest.fixture
+def recognition(monkeypatch):
+    """face_recognition_utils con un modelo cuyo índice es synthetic_index()."""
+    pytest.importorskip("streamlit")
+    import face_recognition_utils
+    model = SimpleNamespace(index=synthetic_index(), refresh=lambda: None)
+    monkeypatch.setattr(face_recognition_utils, "get_model", lambda: model)
+    return face_recognition_utils
+
+
+def test_candidate_hit_is_kept(recognition):
+    matches = recognition.match_encodings([axis(0, 5) + axis(10, 0.1)], candidates={1, 2})
+    assert matches[0][0][0] == 1
+
+
+def test_candidate_miss_falls_back_to_global_match(recognition):
+    # La cara es de la identidad 4, que no está entre los candidatos de la clase en curso
+    matches = recognition.match_encodings([axis(3, 5) + axis(10, 0.05)], candidates={1, 2})
+    label, distance, threshold = matches[0][0]
+    assert label == 4
+    assert is_match(distance, threshold)
+    # Candidatos sin codificaciones: también se busca en todo el índice
+    assert recognition.match_encodings([axis(1, 5)], candidates={99})[0][0][0] == 2
+
+
+def test_refresh_reloads_when_a_listed_delta_was_compacted(recognition, tmp_path, monkeypatch):
+    from embedding_store import write_store, append_delta, compact_store, list_deltas
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "codificaciones.emb")
+    write_store(path, np.array(cluster(axis(0, 5), 0.1, 10)), [1, 1])
+    model = recognition.RecognitionModel(path)
+    model.refresh(force=True)
+    append_delta(path, np.array(cluster(axis(1, 5), 0.1, 10)), [2, 2])
+
+    def list_then_compact(*args):
+        # Otro proceso compacta el almacén justo después de que refresh() lista los deltas
+        deltas = list_deltas(*args)
+        compact_store(path)
+        return deltas
+
+    import store_index
+    monkeypatch.setattr(store_index, "list_deltas", list_then_compact)
+    model.refresh(force=True)
+    assert model.base_version == 2
+    assert model.index.match([axis(1, 5)])[0][0][0] == 2
+
+
+def test_unknown_remote_faces_are_matched_locally_without_deltas(recognition, monkeypatch):
+    unknown = [{"user_id": None, "distance": 0.7, "confidence": 30, "box": (0, 1, 1, 0)}]
+    local = [{"user_id": 7, "distance": 0.2, "confidence": 80, "box": (0, 1, 1, 0)}]
+    monkeypatch.setattr(recognition, "RECOGNITION_SERVICE_URL", "http://servicio")
+    monkeypatch.setattr(recognition, "recognize_batch", lambda images, candidates=None: [local])
+    # Servicio con el modelo del último entrenamiento: la inscripción reciente sólo está en el índice local
+    monkeypatch.setattr(recognition, "recognize_remote", lambda image, candidates=None: (unknown, False))
+    assert recognition.recognize_identity(None) == (7, 80)
+    # Servicio con el almacén base + deltas: su "sin coincidencia" es definitivo
+    monkeypatch.setattr(recognition, "recognize_remote", lambda image, candidates=None: (unknown, True))
+    assert recognition.recognize_identity(None) == (None, 0)
+
+
+def test_encoding_cache_keeps_running_size_total(tmp_path):
+    from encoding_cache import EncodingCache
+    cache = EncodingCache(str(tmp_path / "cache.db"), max_bytes=3000)
+    location, encoding = [(1, 2, 3, 4)], [np.zeros(EMBEDDING_DIM)]
+    for i in range(5):
+        cache.put(f"k{i}", location, encoding)
+    cache.put("k4", [], [])
+    stored = cache.connection.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM encodings").fetchone()
+    assert cache.total_size() == stored[0] <= 3000
+    assert cache.get("k4") == ([], [])
+    assert cache.get("k0") is None
+    cache.close()
+    assert EncodingCache(str(tmp_path / "cache.db")).total_size() == stored[0]